@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from qdrant_client import grpc as qdrant_grpc
+from qdrant_client.http import models
+from qdrant_client.conversions.conversion import RestToGrpc
+
+from commons.qdrant_helper import QdrantHelper
+from benchmarks.fakes import deterministic_embedding
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description="Compare the serialization and round-trip cost of Qdrant's REST and gRPC transports.")
+
+    parser.add_argument("--qdrant-url", default=None, help="Also measure round trips against this Qdrant server")
+    parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--vector-size", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+
+    return parser.parse_args()
+
+def synthetic_points(count:int, vector_size:int) -> list:
+
+    return [
+        models.PointStruct(
+            id=str(uuid.uuid4()),
+            vector=deterministic_embedding(f"point {idx}", vector_size),
+            payload={
+                "content": "the seller shall deliver energy to the buyer at the delivery point " * 40,
+                "metadata": {"project_code": "1001", "project_name": "Ford", "filename": "ford_ppa_1.pdf", "page_number": idx}
+            }
+        )
+        for idx in range(count)
+    ]
+
+def time_per_call_ms(function, repeats:int) -> tuple:
+
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+
+    return (time.perf_counter() - started_at) / repeats * 1000, result
+
+def compare_serialization(args) -> dict:
+
+    points = synthetic_points(count=args.batch_size, vector_size=args.vector_size)
+    query = models.QueryRequest(query=points[0].vector, limit=args.top_k, with_payload=True)
+
+    # What each transport puts on the wire for one upsert batch and one query
+    rest_upsert_ms, rest_upsert_body = time_per_call_ms(lambda: models.PointsList(points=points).model_dump_json(exclude_unset=True).encode("utf-8"), args.batches)
+    grpc_upsert_ms, grpc_upsert_body = time_per_call_ms(lambda: qdrant_grpc.UpsertPoints(collection_name="ppa", points=[RestToGrpc.convert_point_struct(point) for point in points]).SerializeToString(), args.batches)
+    rest_query_ms, rest_query_body = time_per_call_ms(lambda: query.model_dump_json(exclude_unset=True).encode("utf-8"), args.queries)
+    grpc_query_ms, grpc_query_body = time_per_call_ms(lambda: RestToGrpc.convert_query_request(query, collection_name="ppa").SerializeToString(), args.queries)
+
+    return {
+        "rest": {
+            "upsert_batch_encode_ms": round(rest_upsert_ms, 3),
+            "upsert_batch_bytes": len(rest_upsert_body),
+            "query_encode_ms": round(rest_query_ms, 4),
+            "query_bytes": len(rest_query_body)
+        },
+        "grpc": {
+            "upsert_batch_encode_ms": round(grpc_upsert_ms, 3),
+            "upsert_batch_bytes": len(grpc_upsert_body),
+            "query_encode_ms": round(grpc_query_ms, 4),
+            "query_bytes": len(grpc_query_body)
+        }
+    }
+
+def compare_round_trips(args, prefer_grpc:bool) -> dict:
+
+    qdrant_helper = QdrantHelper(
+        url=args.qdrant_url,
+        api_key=args.api_key,
+        prefer_grpc=prefer_grpc,
+        grpc_port=args.grpc_port
+    )
+    collection_name = f"transport_benchmark_{uuid.uuid4().hex[:8]}"
+
+    qdrant_helper.create_collection(collection_name=collection_name, vector_size=args.vector_size, force_recreation=True)
+
+    try:
+
+        upsert_latencies = []
+        for batch_idx in range(args.batches):
+            points = synthetic_points(count=args.batch_size, vector_size=args.vector_size)
+            started_at = time.perf_counter()
+            qdrant_helper.upsert_batch(collection_name=collection_name, points=points, wait=True)
+            upsert_latencies.append(time.perf_counter() - started_at)
+
+        query_latencies = []
+        for query_idx in range(args.queries):
+            query_vector = deterministic_embedding(f"query {query_idx}", args.vector_size)
+            started_at = time.perf_counter()
+            qdrant_helper.query_vector_store(collection_name=collection_name, query_vector=query_vector, top_k=args.top_k)
+            query_latencies.append(time.perf_counter() - started_at)
+
+    finally:
+        qdrant_helper.client.delete_collection(collection_name=collection_name)
+
+    upsert_p50, upsert_p95 = np.percentile(np.array(upsert_latencies) * 1000, [50, 95])
+    query_p50, query_p95, query_p99 = np.percentile(np.array(query_latencies) * 1000, [50, 95, 99])
+
+    return {
+        "upsert_batch_p50_ms": round(float(upsert_p50), 2),
+        "upsert_batch_p95_ms": round(float(upsert_p95), 2),
+        "query_p50_ms": round(float(query_p50), 2),
+        "query_p95_ms": round(float(query_p95), 2),
+        "query_p99_ms": round(float(query_p99), 2)
+    }
+
+def main():
+
+    args = parse_args()
+
+    report = {
+        "vector_size": args.vector_size,
+        "batch_size": args.batch_size,
+        "serialization": compare_serialization(args)
+    }
+
+    if args.qdrant_url:
+        report["round_trips"] = {
+            "rest": compare_round_trips(args, prefer_grpc=False),
+            "grpc": compare_round_trips(args, prefer_grpc=True)
+        }
+
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
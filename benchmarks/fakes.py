@@ -0,0 +1,236 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+import numpy as np
+from google.genai import types
+
+# Projects referenced by example_ppa_prompts.md, so the seeded queries resolve to documents in the corpus
+BENCHMARK_PROJECTS = [
+    {"project_code": "1001", "project_name": "Ford"},
+    {"project_code": "1002", "project_name": "Procter and Gamble (P&G)"},
+    {"project_code": "1003", "project_name": "Ezee Tile"},
+    {"project_code": "1004", "project_name": "Blue Valley"},
+    {"project_code": "1005", "project_name": "Sovereign Foods Kelvin Street"},
+    {"project_code": "1006", "project_name": "Yanfeng East London"}
+]
+
+CLAUSE_VOCABULARY = (
+    "the seller shall deliver energy to the buyer at the delivery point and the buyer shall pay the tariff "
+    "for each kilowatt hour measured by the metering equipment the performance warranty guarantees that the "
+    "system yield will not fall below the guaranteed percentage of the expected annual energy output "
+    "either party may terminate this agreement upon a material breach that remains unremedied for thirty days "
+    "the buyout price is calculated from the termination schedule for the relevant contract year "
+    "force majeure events suspend the obligations of the affected party for the duration of the event "
+    "the operations and maintenance contractor shall remedy underperformance within the agreed response time"
+).split()
+
+PROMPT_PATTERN = re.compile(r"```\n(.*?)\n```", re.DOTALL)
+
+def load_prompts(prompts_path:str) -> list:
+
+    with open(prompts_path) as prompts_file:
+        return [prompt.strip() for prompt in PROMPT_PATTERN.findall(prompts_file.read()) if prompt.strip()]
+
+def synthetic_corpus(documents_per_project:int = 2, pages_per_document:int = 20, words_per_page:int = 300, boilerplate_fraction:float = 0.0, boilerplate_pages:int = 10, seed:int = 42) -> dict:
+
+    rng = random.Random(seed)
+    corpus = {}
+
+    # Shared clauses (definitions, force majeure, governing law) that recur across contracts with the party name swapped
+    boilerplate = [" ".join(rng.choice(CLAUSE_VOCABULARY) for _ in range(words_per_page)) for _ in range(boilerplate_pages)]
+
+    for project in BENCHMARK_PROJECTS:
+
+        for document_idx in range(documents_per_project):
+
+            filename = f"{project['project_name'].split()[0].lower()}_ppa_{document_idx + 1}.pdf"
+            pages = []
+
+            for page_number in range(1, pages_per_document + 1):
+                banner = f"<PAGE NUMBER: {page_number}, PROJECT CODE: {project['project_code']}, PROJECT NAME: {project['project_name']}, DOCUMENT NAME: {filename}>"
+                if rng.random() < boilerplate_fraction:
+                    text = rng.choice(boilerplate)
+                else:
+                    text = " ".join(rng.choice(CLAUSE_VOCABULARY) for _ in range(words_per_page))
+                pages.append(f"{banner}\n{project['project_name']} {text}\n")
+
+            corpus[f"ppa-documents/{filename.replace('.pdf', '.txt')}"] = "\n".join(pages)
+
+    return corpus
+
+def deterministic_embedding(text:str, dimensions:int) -> list:
+
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def text_response(text:str) -> types.GenerateContentResponse:
+
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))]
+    )
+
+class FakeVertexResponder:
+
+    def __init__(self, embed_latency_ms:float = 50, llm_latency_ms:float = 400, token_latency_ms:float = 5, answer_tokens:int = 60):
+        self.embed_latency = embed_latency_ms / 1000
+        self.llm_latency = llm_latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.answer_tokens = answer_tokens
+        self.calls = {"embed_content": 0, "generate_content": 0, "generate_content_stream": 0}
+        self.lock = threading.Lock()
+
+    def record(self, call:str):
+        with self.lock:
+            self.calls[call] += 1
+
+    def embed_response(self, contents, config) -> types.EmbedContentResponse:
+
+        contents = [contents] if isinstance(contents, str) else contents
+
+        return types.EmbedContentResponse(embeddings=[
+            types.ContentEmbedding(
+                values=deterministic_embedding(content, config.output_dimensionality or 3072),
+                statistics=types.ContentEmbeddingStatistics(token_count=len(content) // 4, truncated=False)
+            )
+            for content in contents
+        ])
+
+    def content_response(self, contents:str, config) -> types.GenerateContentResponse:
+
+        if config is not None and config.response_mime_type == "application/json":
+
+            # Metadata extraction finds the first known project named in the query
+            for project in BENCHMARK_PROJECTS:
+                if project["project_name"].lower() in contents.lower():
+                    return text_response(json.dumps({"project_code": int(project["project_code"]), "project_name": project["project_name"]}))
+
+            return text_response(json.dumps({"project_code": -1, "project_name": ""}))
+
+        words = contents.split()
+        return text_response("Summary: " + " ".join(words[:25]))
+
+    def answer_tokens_for(self, contents:str) -> list:
+
+        words = (contents.split() or ["answer"]) * (self.answer_tokens // max(1, len(contents.split())) + 1)
+        return [f"{word} " for word in words[:self.answer_tokens]]
+
+class FakeModels:
+
+    def __init__(self, responder:FakeVertexResponder):
+        self.responder = responder
+
+    def embed_content(self, model:str, contents, config = None):
+        self.responder.record("embed_content")
+        time.sleep(self.responder.embed_latency)
+        return self.responder.embed_response(contents=contents, config=config)
+
+    def generate_content(self, model:str, contents, config = None):
+        self.responder.record("generate_content")
+        time.sleep(self.responder.llm_latency)
+        return self.responder.content_response(contents=contents, config=config)
+
+class FakeAsyncModels:
+
+    def __init__(self, responder:FakeVertexResponder):
+        self.responder = responder
+
+    async def embed_content(self, model:str, contents, config = None):
+        self.responder.record("embed_content")
+        await asyncio.sleep(self.responder.embed_latency)
+        return self.responder.embed_response(contents=contents, config=config)
+
+    async def generate_content(self, model:str, contents, config = None):
+        self.responder.record("generate_content")
+        await asyncio.sleep(self.responder.llm_latency)
+        return self.responder.content_response(contents=contents, config=config)
+
+    async def generate_content_stream(self, model:str, contents, config = None):
+
+        self.responder.record("generate_content_stream")
+
+        async def stream():
+            await asyncio.sleep(self.responder.llm_latency)
+            for token in self.responder.answer_tokens_for(contents):
+                await asyncio.sleep(self.responder.token_latency)
+                yield text_response(token)
+
+        return stream()
+
+class FakeGenaiClient:
+
+    def __init__(self, responder:FakeVertexResponder):
+        self.models = FakeModels(responder)
+        self.aio = type("FakeAsyncClient", (), {"models": FakeAsyncModels(responder)})()
+
+class FakeStreamingBody:
+
+    def __init__(self, content:bytes):
+        self.content = content
+
+    def read(self) -> bytes:
+        return self.content
+
+    def iter_chunks(self, chunk_size:int = 1024):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+class FakeS3Client:
+
+    def __init__(self, corpus:dict, get_latency_ms:float = 20, page_size:int = 1000):
+        self.objects = {key: text.encode("utf-8") for key, text in corpus.items()}
+        self.get_latency = get_latency_ms / 1000
+        self.page_size = page_size
+
+    def etag(self, key:str) -> str:
+        return f'"{hashlib.md5(self.objects[key]).hexdigest()}"'
+
+    def get_paginator(self, operation_name:str):
+
+        s3_client = self
+
+        class Paginator:
+
+            def paginate(self, Bucket:str, Prefix:str = ""):
+
+                keys = sorted(key for key in s3_client.objects if key.startswith(Prefix))
+
+                for start in range(0, len(keys), s3_client.page_size):
+                    yield {"Contents": [
+                        {"Key": key, "ETag": s3_client.etag(key), "LastModified": None, "Size": len(s3_client.objects[key])}
+                        for key in keys[start:start + s3_client.page_size]
+                    ]}
+
+        return Paginator()
+
+    def get_object(self, Bucket:str, Key:str):
+        time.sleep(self.get_latency)
+        return {"Body": FakeStreamingBody(self.objects[Key]), "ETag": self.etag(Key)}
+
+class ThreadedAsyncQdrantClient:
+
+    # In-memory and on-disk local Qdrant can't be opened by a second client,
+    # so the API's async calls run on the loader's sync client in a worker thread
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name:str):
+
+        method = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+
+            def locked_call():
+                with self.lock:
+                    return method(*args, **kwargs)
+
+            return await asyncio.to_thread(locked_call)
+
+        return call
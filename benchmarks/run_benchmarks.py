@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import runpy
+import asyncio
+import argparse
+import tempfile
+import importlib.util
+
+import httpx
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import commons.rate_limiter as rate_limiter_module
+import commons.aws_s3_helper as aws_s3_helper_module
+import commons.qdrant_helper as qdrant_helper_module
+import commons.google_genai_helper as google_genai_helper_module
+import commons.aws_secrets_manager_helper as aws_secrets_manager_helper_module
+from commons.telemetry import STAGE_DURATION_SECONDS
+from benchmarks.fakes import (
+    FakeVertexResponder, FakeGenaiClient, FakeS3Client, ThreadedAsyncQdrantClient,
+    synthetic_corpus, load_prompts
+)
+
+COLLECTION_NAME = "ppa_benchmark"
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description="Offline ingestion throughput and query latency benchmarks against local stand-ins.")
+
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory", help="In-memory Qdrant or the NumPy local vector store")
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark against a real Qdrant server instead of --backend")
+    parser.add_argument("--workdir", default=None, help="Directory for caches, manifests and snapshots (a temporary one by default)")
+
+    parser.add_argument("--documents-per-project", type=int, default=2)
+    parser.add_argument("--pages-per-document", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--boilerplate-fraction", type=float, default=0.3, help="Fraction of pages drawn from clauses shared across contracts")
+
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--token-latency-ms", type=float, default=5)
+    parser.add_argument("--s3-latency-ms", type=float, default=20)
+    parser.add_argument("--content-store", action="store_true", help="Keep page text in the compressed content store instead of the payloads")
+    parser.add_argument("--respect-quota", action="store_true", help="Keep the production Vertex AI requests-per-minute limits")
+
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels of the query workload")
+    parser.add_argument("--requests-per-level", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--cache-hits", action="store_true", help="Repeat the example prompts verbatim so the result cache can serve them")
+    parser.add_argument("--skip-ingestion", action="store_true", help="Query the collection a previous run left in --workdir")
+
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+
+    return parser.parse_args()
+
+def stage_totals(pipeline:str) -> dict:
+
+    with STAGE_DURATION_SECONDS.lock:
+        return {
+            stage: (total, count)
+            for (stage_pipeline, stage), (_, total, count) in STAGE_DURATION_SECONDS.values.items()
+            if stage_pipeline == pipeline
+        }
+
+def stage_means_ms(before:dict, after:dict) -> dict:
+
+    means = {}
+
+    for stage, (total, count) in after.items():
+        previous_total, previous_count = before.get(stage, (0.0, 0))
+        if count > previous_count:
+            means[stage] = round((total - previous_total) / (count - previous_count) * 1000, 2)
+
+    return means
+
+def install_fakes(args, responder:FakeVertexResponder, corpus:dict):
+
+    aws_secrets_manager_helper_module.AWSSecretManagerHelper.get_secret = lambda self, secret_name: {
+        "GOOGLE_CLOUD_SERVICE_CREDENTIAL": "{}",
+        "QDRANT_CLOUD_API_KEY": None
+    }
+
+    s3_client = FakeS3Client(corpus=corpus, get_latency_ms=args.s3_latency_ms)
+    aws_s3_helper_module.boto3.client = lambda *_, **__: s3_client
+
+    google_genai_helper_module.Credentials.from_service_account_info = staticmethod(lambda *_, **__: None)
+    google_genai_helper_module.genai.Client = lambda **_: FakeGenaiClient(responder)
+
+    # The fakes have no quota, so by default the limiter only bounds concurrency
+    if not args.respect_quota:
+        for model in rate_limiter_module.DEFAULT_MODEL_REQUESTS_PER_MINUTE:
+            rate_limiter_module.DEFAULT_MODEL_REQUESTS_PER_MINUTE[model] = 1_000_000
+
+    if args.qdrant_url is None and args.backend == "memory":
+
+        from qdrant_client import QdrantClient
+        shared_client = QdrantClient(location=":memory:")
+
+        # The loader and the API server share one in-memory Qdrant within this process
+        def in_memory_init(self, url:str, api_key:str, **_):
+            self.client = shared_client
+            self.async_client = ThreadedAsyncQdrantClient(shared_client)
+
+        async def in_memory_close_async(self):
+            pass
+
+        qdrant_helper_module.QdrantHelper.__init__ = in_memory_init
+        qdrant_helper_module.QdrantHelper.close_async = in_memory_close_async
+
+def configure_environment(args, workdir:str):
+
+    backend = "local" if args.qdrant_url is None and args.backend == "local" else "qdrant"
+
+    os.environ.update({
+        "AWS_SECRET_NAME": "benchmark",
+        "GOOGLE_CLOUD_PROJECT": "benchmark",
+        "GOOGLE_CLOUD_LOCATION": "benchmark",
+        "QDRANT_URL": args.qdrant_url or "http://localhost:6333",
+        "QDRANT_PPA_COLLECTION_NAME": COLLECTION_NAME,
+        "VECTOR_STORE_BACKEND": backend,
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "local_vector_store"),
+        "INGESTION_MANIFEST_PATH": os.path.join(workdir, "ingestion_manifest.json"),
+        "PROJECT_RESOLVER_SNAPSHOT_PATH": os.path.join(workdir, "project_resolver.json"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "INGESTION_QUEUE_PATH": os.path.join(workdir, "ingestion_queue.sqlite3"),
+        "NEAR_DUPLICATE_INDEX_PATH": os.path.join(workdir, "near_duplicates.sqlite3")
+    })
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("RESULT_CACHE_TTL_SECONDS", "300" if args.cache_hits else "0")
+
+    if args.content_store:
+        os.environ["CONTENT_STORE_PATH"] = os.path.join(workdir, "content_store")
+
+    if not args.skip_ingestion:
+        os.environ["QDRANT_RECREATE_COLLECTION"] = "true"
+
+def run_ingestion(corpus:dict, responder:FakeVertexResponder) -> dict:
+
+    pages = sum(document.count("<PAGE NUMBER:") for document in corpus.values())
+    before = stage_totals("ingestion")
+
+    started_at = time.perf_counter()
+    runpy.run_path(os.path.join(REPO_ROOT, "document-loader", "qdrant_document_uploader.py"), run_name="__main__")
+    duration = time.perf_counter() - started_at
+
+    return {
+        "documents": len(corpus),
+        "pages": pages,
+        "duration_seconds": round(duration, 3),
+        "pages_per_second": round(pages / duration, 2),
+        "stage_mean_ms": stage_means_ms(before, stage_totals("ingestion")),
+        "vertex_ai_calls": dict(responder.calls)
+    }
+
+def load_app():
+
+    spec = importlib.util.spec_from_file_location("ppa_benchmark_app", os.path.join(REPO_ROOT, "fastapi-server", "app.py"))
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+
+    return app_module.app
+
+def query_workload(prompts:list, requests:int, level:int, cache_hits:bool) -> list:
+
+    if cache_hits:
+        return [prompts[idx % len(prompts)] for idx in range(requests)]
+
+    # A unique suffix keeps every request off the result and embedding caches
+    return [f"{prompts[idx % len(prompts)]} (benchmark request {level}-{idx})" for idx in range(requests)]
+
+async def run_query_level(client:httpx.AsyncClient, queries:list, concurrency:int, top_k:int) -> dict:
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    rejected = 0
+
+    async def send(query:str):
+
+        nonlocal errors, rejected
+
+        async with semaphore:
+
+            started_at = time.perf_counter()
+            response = await client.post("/query_ppa_knowledge_base", json={"query": query, "top_k": top_k})
+            latencies.append(time.perf_counter() - started_at)
+
+            # Load shedding answers 429 or 503 with Retry-After, anything else is an error
+            if response.status_code in (429, 503):
+                rejected += 1
+            elif response.status_code != 200:
+                errors += 1
+
+    before = stage_totals("query")
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[send(query) for query in queries])
+    duration = time.perf_counter() - started_at
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "rejected": rejected,
+        "queries_per_second": round(len(queries) / duration, 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "stage_mean_ms": stage_means_ms(before, stage_totals("query"))
+    }
+
+async def run_queries(args, prompts:list) -> list:
+
+    app = load_app()
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = []
+
+    async with app.router.lifespan_context(app):
+
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+            # Wait for the lifespan hook's background client initialization
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+
+            for level in levels:
+                queries = query_workload(prompts=prompts, requests=args.requests_per_level, level=level, cache_hits=args.cache_hits)
+                results.append(await run_query_level(client=client, queries=queries, concurrency=level, top_k=args.top_k))
+
+    return results
+
+def print_report(report:dict):
+
+    if report.get("ingestion"):
+
+        ingestion = report["ingestion"]
+        print(f"\nIngestion: {ingestion['pages']} pages in {ingestion['documents']} documents, {ingestion['duration_seconds']}s, {ingestion['pages_per_second']} pages/sec")
+
+        for stage, mean_ms in ingestion["stage_mean_ms"].items():
+            print(f"    {stage:<24} {mean_ms:>10.2f} ms per call")
+
+        print("    Vertex AI calls: " + ", ".join(f"{call} {count}" for call, count in ingestion["vertex_ai_calls"].items()))
+
+    print(f"\n{'concurrency':>11} {'requests':>9} {'errors':>7} {'rejected':>9} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+
+    for level in report["queries"]:
+        print(f"{level['concurrency']:>11} {level['requests']:>9} {level['errors']:>7} {level['rejected']:>9} {level['queries_per_second']:>9.2f} {level['p50_ms']:>9.2f} {level['p95_ms']:>9.2f} {level['p99_ms']:>9.2f}")
+
+    print("\nQuery stage means (ms):")
+    for level in report["queries"]:
+        print(f"    concurrency {level['concurrency']}: " + ", ".join(f"{stage} {mean_ms}" for stage, mean_ms in level["stage_mean_ms"].items()))
+
+def main():
+
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ppa_benchmark_"))
+    os.makedirs(workdir, exist_ok=True)
+
+    responder = FakeVertexResponder(
+        embed_latency_ms=args.embed_latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        token_latency_ms=args.token_latency_ms
+    )
+    corpus = synthetic_corpus(
+        documents_per_project=args.documents_per_project,
+        pages_per_document=args.pages_per_document,
+        words_per_page=args.words_per_page,
+        boilerplate_fraction=args.boilerplate_fraction
+    )
+    prompts = load_prompts(os.path.join(REPO_ROOT, "example_ppa_prompts.md"))
+
+    install_fakes(args=args, responder=responder, corpus=corpus)
+    configure_environment(args=args, workdir=workdir)
+
+    # The loader and the API server resolve their relative .cache paths against the working directory
+    os.chdir(workdir)
+
+    report = {
+        "backend": args.qdrant_url or args.backend,
+        "workdir": workdir,
+        "fake_latency_ms": {
+            "embedding": args.embed_latency_ms,
+            "llm": args.llm_latency_ms,
+            "token": args.token_latency_ms,
+            "s3_get_object": args.s3_latency_ms
+        },
+        "ingestion": None if args.skip_ingestion else run_ingestion(corpus=corpus, responder=responder)
+    }
+
+    report["queries"] = asyncio.run(run_queries(args=args, prompts=prompts))
+    report["vertex_ai_calls"] = dict(responder.calls)
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
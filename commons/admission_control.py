@@ -0,0 +1,272 @@
+import math
+import time
+import asyncio
+import threading
+from contextvars import ContextVar
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from commons.rate_limiter import TokenBucket
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Monotonic time by which the current request has to be answered, set per request by the API server
+request_deadline_var = ContextVar("request_deadline", default=None)
+
+def remaining_seconds() -> float:
+
+    deadline = request_deadline_var.get()
+
+    return math.inf if deadline is None else deadline - time.monotonic()
+
+class Overloaded(Exception):
+
+    def __init__(self, message:str, status_code:int = 503, retry_after:float = 1.0, upstream:str = None, reason:str = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.upstream = upstream
+        self.reason = reason
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold:int = 5, reset_seconds:float = 30, half_open_max_calls:int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+
+        with self.lock:
+
+            if self.state == "open":
+
+                if self.retry_after() > 0:
+                    return False
+
+                # The reset period is over, a few probe calls decide whether the upstream has recovered
+                self.state = "half_open"
+                self.half_open_calls = 0
+
+            if self.state == "half_open":
+
+                if self.half_open_calls >= self.half_open_max_calls:
+                    return False
+
+                self.half_open_calls += 1
+
+            return True
+
+    def on_abandoned(self):
+
+        # A probe that ended without an answer from the upstream frees its place for the next one
+        with self.lock:
+            if self.state == "half_open":
+                self.half_open_calls = max(0, self.half_open_calls - 1)
+
+    def on_success(self):
+
+        with self.lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def on_failure(self):
+
+        with self.lock:
+
+            self.consecutive_failures += 1
+
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+
+                if self.state != "open":
+                    logger.warning("Circuit opened", consecutive_failures=self.consecutive_failures, reset_seconds=self.reset_seconds)
+
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class UpstreamLimiter:
+
+    def __init__(self, name:str, max_concurrency:int = 8, max_queue:int = 32, call_timeout_seconds:float = None, min_remaining_seconds:float = 0.1, circuit_breaker:CircuitBreaker = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.call_timeout_seconds = call_timeout_seconds
+        # A call admitted with less time than this left before the request deadline could not finish anyway
+        self.min_remaining_seconds = min_remaining_seconds
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        # Moving average of the time a call holds its slot, used to predict queueing delay
+        self.service_seconds = 0.0
+        self.counters = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "rejected_circuit_open": 0,
+            "timeouts": 0,
+            "failures": 0
+        }
+
+    def expected_wait_seconds(self) -> float:
+
+        if self.in_flight < self.max_concurrency:
+            return 0.0
+
+        return (self.waiting + 1) / self.max_concurrency * self.service_seconds
+
+    def reject(self, reason:str, message:str, retry_after:float):
+
+        self.counters[f"rejected_{reason}"] += 1
+
+        logger.warning("Upstream call rejected", upstream=self.name, reason=reason, in_flight=self.in_flight, waiting=self.waiting)
+
+        raise Overloaded(f"{self.name} {message}", status_code=503, retry_after=retry_after, upstream=self.name, reason=reason)
+
+    def check(self):
+
+        # Fails fast before any work starts, without taking a slot
+        if self.circuit_breaker.state == "open" and self.circuit_breaker.retry_after() > 0:
+            self.reject("circuit_open", "is degraded, failing fast", self.circuit_breaker.retry_after())
+
+        if self.in_flight >= self.max_concurrency and self.waiting >= self.max_queue:
+            self.reject("queue_full", "wait queue is full", self.expected_wait_seconds())
+
+    async def acquire(self):
+
+        self.check()
+
+        remaining = remaining_seconds()
+        expected_wait = self.expected_wait_seconds()
+
+        # A request that would still be queued at its deadline, or left without time to make the call, is rejected now instead of timing out later
+        if expected_wait + self.min_remaining_seconds > remaining:
+            self.reject("deadline", "cannot be reached before the request deadline", expected_wait)
+
+        self.waiting += 1
+
+        try:
+            async with asyncio.timeout(remaining if remaining != math.inf else None):
+                await self.semaphore.acquire()
+        except TimeoutError:
+            self.reject("deadline", "cannot be reached before the request deadline", self.expected_wait_seconds())
+        finally:
+            self.waiting -= 1
+
+        # Checked once a slot is free, so a half-open probe is only counted when it actually runs
+        if not self.circuit_breaker.allow():
+            self.semaphore.release()
+            self.reject("circuit_open", "is degraded, failing fast", self.circuit_breaker.retry_after())
+
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+
+    def release(self, started_at:float):
+
+        self.in_flight -= 1
+        self.semaphore.release()
+        self.service_seconds = 0.8 * self.service_seconds + 0.2 * (time.monotonic() - started_at) if self.service_seconds else time.monotonic() - started_at
+
+    @asynccontextmanager
+    async def slot(self, bounded:bool = True):
+
+        await self.acquire()
+        started_at = time.monotonic()
+
+        # Streamed responses hold the slot across yields to the client, so only bounded calls get a timeout
+        call_timeout = (self.call_timeout_seconds or math.inf) if bounded else math.inf
+        remaining = remaining_seconds() if bounded else math.inf
+        timeout = min(call_timeout, remaining)
+
+        try:
+            async with asyncio.timeout(timeout if timeout != math.inf else None):
+                yield
+        except TimeoutError:
+
+            # Running out of request time says nothing about the upstream, so only the call timeout counts against the breaker
+            if remaining < call_timeout:
+                self.circuit_breaker.on_abandoned()
+                self.reject("deadline", "did not answer before the request deadline", self.service_seconds)
+
+            self.counters["timeouts"] += 1
+            self.circuit_breaker.on_failure()
+            raise Overloaded(f"{self.name} did not answer within {call_timeout}s", status_code=503, retry_after=self.service_seconds, upstream=self.name, reason="timeout")
+        except (Overloaded, asyncio.CancelledError):
+            self.circuit_breaker.on_abandoned()
+            raise
+        except Exception:
+            self.counters["failures"] += 1
+            self.circuit_breaker.on_failure()
+            raise
+        else:
+            self.circuit_breaker.on_success()
+        finally:
+            self.release(started_at=started_at)
+
+    async def call(self, request):
+
+        async with self.slot():
+            return await request()
+
+    def stats(self) -> dict:
+
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "service_seconds": round(self.service_seconds, 4),
+            "circuit_open": int(self.circuit_breaker.state != "closed")
+        }
+
+class ClientRateLimiter:
+
+    def __init__(self, requests_per_minute:float = 120, burst:int = None, max_clients:int = 10000):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst or max(1, int(requests_per_minute / 6))
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "allowed": 0,
+            "rejected": 0
+        }
+
+    def bucket(self, client_id:str) -> TokenBucket:
+
+        with self.lock:
+
+            bucket = self.buckets.get(client_id)
+
+            if bucket is None:
+                bucket = TokenBucket(requests_per_minute=self.requests_per_minute, burst=self.burst)
+                self.buckets[client_id] = bucket
+
+            # Least recently seen clients are dropped first, their buckets would be full again anyway
+            self.buckets.move_to_end(client_id)
+
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+
+            return bucket
+
+    def check(self, client_id:str):
+
+        retry_after = self.bucket(client_id=client_id).try_acquire()
+
+        if retry_after > 0:
+            self.counters["rejected"] += 1
+            raise Overloaded("Client rate limit exceeded", status_code=429, retry_after=retry_after, reason="client_rate_limit")
+
+        self.counters["allowed"] += 1
+
+    def stats(self) -> dict:
+        return {**self.counters, "clients": len(self.buckets)}
@@ -1,26 +1,105 @@
+import codecs
 import boto3
+from collections import deque
+from itertools import islice
+from datetime import datetime
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
 
 class AWSS3Helper:
 
-    def __init__(self, s3_bucket: str = "ppa-chatbot-knowledge-base", prefix: str = ""):
+    def __init__(self, s3_bucket: str = "ppa-chatbot-knowledge-base", prefix: str = "", max_workers: int = 8):
         self.s3_bucket = s3_bucket
         self.prefix = prefix
-        self.s3_client = boto3.client('s3')
+        self.max_workers = max_workers
+        self.s3_client = boto3.client('s3', config=Config(max_pool_connections=max(10, max_workers)))
+
+    def list_documents(self, suffix: str = "", modified_since: datetime = None) -> list:
+
+        documents = []
+
+        # Paginate through every object under the prefix, list_objects_v2 returns at most 1000 keys per call
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=self.prefix):
+
+            for obj in page.get('Contents', []):
+
+                if suffix and not obj['Key'].endswith(suffix):
+                    continue
+
+                if modified_since and obj['LastModified'] < modified_since:
+                    continue
+
+                documents.append({
+                    'key': obj['Key'],
+                    'etag': obj['ETag'].strip('"'),
+                    'last_modified': obj['LastModified'],
+                    'size': obj['Size']
+                })
+
+        logger.info("Listed S3 documents", bucket=self.s3_bucket, prefix=self.prefix, documents=len(documents))
+
+        return documents
+
+    def download_document(self, key: str) -> dict:
+
+        file_obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+
+        content = file_obj['Body'].read().decode('utf-8')
+
+        return {'key': key, 'etag': file_obj['ETag'].strip('"'), 'content': content}
+
+    def open_document_stream(self, key: str, chunk_size: int = 64 * 1024) -> dict:
+
+        file_obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+
+        def stream_content():
+
+            # Incremental decoding keeps multi-byte characters split across chunks intact
+            decoder = codecs.getincrementaldecoder('utf-8')()
+
+            for chunk in file_obj['Body'].iter_chunks(chunk_size=chunk_size):
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+
+        return {'key': key, 'etag': file_obj['ETag'].strip('"'), 'content_stream': stream_content()}
+
+    def get_documents(self, documents: list = None, stream: bool = False, prefetch: int = None, suffix: str = "", modified_since: datetime = None):
+
+        logger.info("Reading S3 documents", bucket=self.s3_bucket, prefix=self.prefix)
+
+        if documents is None:
+            documents = self.list_documents(suffix=suffix, modified_since=modified_since)
+
+        # Streamed bodies are read lazily by the caller, so only the GetObject calls run ahead
+        fetch_document = self.open_document_stream if stream else self.download_document
+        prefetch = prefetch or self.max_workers
 
-    def get_documents(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
 
-        print(f"\nRead documents from AWS S3 bucket: {self.s3_bucket}/{self.prefix}\n")
+            in_flight = deque()
+            pending = iter(documents)
 
-        # List objects in the bucket
-        response = self.s3_client.list_objects_v2(Bucket=self.s3_bucket, Prefix=self.prefix)
+            for document in islice(pending, prefetch):
+                in_flight.append(executor.submit(fetch_document, document['key']))
 
-        for obj in response.get('Contents', []):
+            # Keep the next N objects in flight while yielding in listing order
+            while in_flight:
 
-            key = obj['Key']
+                document_result = in_flight.popleft().result()
 
-            # Download object content
-            file_obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+                next_document = next(pending, None)
+                if next_document is not None:
+                    in_flight.append(executor.submit(fetch_document, next_document['key']))
 
-            content = file_obj['Body'].read().decode('utf-8')
-            
-            yield {'key': key, 'content': content}
\ No newline at end of file
+                yield document_result
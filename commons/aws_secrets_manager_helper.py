@@ -1,24 +1,43 @@
 import json
+import time
 import boto3
+import threading
 from botocore.exceptions import ClientError
 
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
 class AWSSecretManagerHelper:
 
-    def __init__(self, region_name:str = "eu-central-1"):
+    def __init__(self, region_name:str = "eu-central-1", ttl_seconds:float = 3600, refresh_ahead_seconds:float = 300):
         self.region_name = region_name
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.client = None
+        self.secrets = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
 
-    def get_secret(self, secret_name: str):
+    def secrets_client(self):
+
+        # One Secrets Manager client per helper, boto3 clients are thread-safe
+        with self.lock:
 
-        # Create a Secrets Manager client
-        session = boto3.session.Session()
-        client = session.client(
-            service_name='secretsmanager',
-            region_name=self.region_name
-        )
+            if self.client is None:
+                session = boto3.session.Session()
+                self.client = session.client(
+                    service_name='secretsmanager',
+                    region_name=self.region_name
+                )
+
+            return self.client
+
+    def fetch_secret(self, secret_name: str) -> dict:
 
         try:
 
-            get_secret_value_response = client.get_secret_value(
+            get_secret_value_response = self.secrets_client().get_secret_value(
                 SecretId=secret_name
             )
 
@@ -27,4 +46,57 @@ class AWSSecretManagerHelper:
 
         secret_result_json = json.loads(get_secret_value_response['SecretString'])
 
+        with self.lock:
+            self.secrets[secret_name] = (secret_result_json, time.monotonic())
+
+        return secret_result_json
+
+    def refresh_in_background(self, secret_name: str):
+
+        with self.lock:
+
+            if secret_name in self.refreshing:
+                return
+
+            self.refreshing.add(secret_name)
+
+        def refresh():
+
+            try:
+                self.fetch_secret(secret_name=secret_name)
+            except Exception as ex:
+                logger.warning("Background secret refresh failed, serving the cached value", secret_name=secret_name, error=str(ex))
+            finally:
+                with self.lock:
+                    self.refreshing.discard(secret_name)
+
+        threading.Thread(target=refresh, name=f"secret-refresh-{secret_name}", daemon=True).start()
+
+    def get_secret(self, secret_name: str):
+
+        with self.lock:
+            cached_secret = self.secrets.get(secret_name)
+
+        if cached_secret is None:
+            return self.fetch_secret(secret_name=secret_name)
+
+        secret_result_json, fetched_at = cached_secret
+        age = time.monotonic() - fetched_at
+
+        if age > self.ttl_seconds:
+            return self.fetch_secret(secret_name=secret_name)
+
+        # Refresh shortly before expiry so callers never wait on Secrets Manager for a known secret
+        if age > self.ttl_seconds - self.refresh_ahead_seconds:
+            self.refresh_in_background(secret_name=secret_name)
+
         return secret_result_json
+
+    def invalidate(self, secret_name: str = None):
+
+        with self.lock:
+
+            if secret_name is None:
+                self.secrets.clear()
+            else:
+                self.secrets.pop(secret_name, None)
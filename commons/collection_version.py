@@ -0,0 +1,50 @@
+import os
+import time
+import uuid
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+class CollectionVersionStamp:
+
+    def __init__(self, collection_name:str, stamp_dir:str = ".cache/collection_versions"):
+        self.collection_name = collection_name
+        self.stamp_path = os.path.join(stamp_dir, f"{collection_name}.version")
+        self.stamp_mtime = None
+        self.version = "0"
+
+    def bump(self) -> str:
+
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+
+        version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+
+        temp_path = f"{self.stamp_path}.tmp"
+        with open(temp_path, "w") as stamp_file:
+            stamp_file.write(version)
+
+        os.replace(temp_path, self.stamp_path)
+
+        self.version = version
+        self.stamp_mtime = os.stat(self.stamp_path).st_mtime_ns
+
+        logger.info("Collection version bumped", collection=self.collection_name, version=version)
+
+        return version
+
+    def current(self) -> str:
+
+        try:
+            stamp_mtime = os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return self.version
+
+        if stamp_mtime != self.stamp_mtime:
+
+            with open(self.stamp_path) as stamp_file:
+                self.version = stamp_file.read().strip() or "0"
+
+            self.stamp_mtime = stamp_mtime
+
+        return self.version
@@ -0,0 +1,171 @@
+import os
+import mmap
+import zlib
+import fcntl
+import struct
+import threading
+
+from commons.telemetry import get_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = get_logger(__name__)
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Record header: compressed length, codec, point ID length; followed by the point ID and the compressed text
+RECORD_HEADER = struct.Struct("<IBH")
+
+class ContentStore:
+
+    def __init__(self, store_dir:str = ".cache/content_store", compression_level:int = None):
+        self.store_dir = store_dir
+        self.data_path = os.path.join(store_dir, "content.bin")
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self.compression_level = compression_level or (3 if self.codec == CODEC_ZSTD else 6)
+        self.lock = threading.Lock()
+        self.mapped_file = None
+        self.mapped_size = 0
+        self.mapped_inode = None
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        open(self.data_path, "ab").close()
+
+    def compress(self, text:str) -> bytes:
+
+        data = text.encode("utf-8")
+
+        if self.codec == CODEC_ZSTD:
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+
+        return zlib.compress(data, self.compression_level)
+
+    @staticmethod
+    def decompress(codec:int, data:bytes) -> str:
+
+        if codec == CODEC_ZSTD:
+
+            if zstandard is None:
+                raise RuntimeError("The content store holds zstd-compressed records, install the zstandard package to read them.")
+
+            return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+
+        return zlib.decompress(data).decode("utf-8")
+
+    def append_many(self, items:list) -> dict:
+
+        records = []
+        for point_id, text in items:
+            point_id_bytes = str(point_id).encode("utf-8")
+            compressed = self.compress(text)
+            records.append((point_id, RECORD_HEADER.pack(len(compressed), self.codec, len(point_id_bytes)) + point_id_bytes + compressed))
+
+        content_refs = {}
+
+        # Worker processes append to the same file, the exclusive lock keeps each batch contiguous
+        with open(self.data_path, "ab") as data_file:
+
+            fcntl.flock(data_file, fcntl.LOCK_EX)
+
+            try:
+
+                offset = data_file.seek(0, os.SEEK_END)
+
+                for point_id, record in records:
+                    content_refs[point_id] = {"offset": offset, "length": len(record)}
+                    offset += len(record)
+
+                data_file.write(b"".join(record for _, record in records))
+                data_file.flush()
+                os.fsync(data_file.fileno())
+
+            finally:
+                fcntl.flock(data_file, fcntl.LOCK_UN)
+
+        return content_refs
+
+    def mapped(self, end:int) -> mmap.mmap:
+
+        with self.lock:
+
+            # The file only grows until it is reset, so it is remapped once a pointer reaches past the current mapping
+            # or the file was replaced. The superseded mapping is not closed, readers still slicing it keep it alive until they drop it.
+            if end > self.mapped_size or os.stat(self.data_path).st_ino != self.mapped_inode:
+
+                with open(self.data_path, "rb") as data_file:
+                    stat = os.fstat(data_file.fileno())
+                    self.mapped_file = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else None
+                    self.mapped_size = stat.st_size
+                    self.mapped_inode = stat.st_ino
+
+                if end > self.mapped_size:
+                    raise ValueError(f"Content reference ends at byte {end}, past the end of {self.data_path} ({self.mapped_size} bytes).")
+
+            return self.mapped_file
+
+    def read_many(self, point_ids:list, content_refs:list) -> list:
+
+        if not content_refs:
+            return []
+
+        mapped_file = self.mapped(max(content_ref["offset"] + content_ref["length"] for content_ref in content_refs))
+        texts = []
+
+        for point_id, content_ref in zip(point_ids, content_refs):
+
+            record = mapped_file[content_ref["offset"]:content_ref["offset"] + content_ref["length"]]
+            compressed_length, codec, point_id_length = RECORD_HEADER.unpack_from(record)
+            record_point_id = record[RECORD_HEADER.size:RECORD_HEADER.size + point_id_length].decode("utf-8")
+
+            if record_point_id != str(point_id):
+                raise ValueError(f"Content reference of point {point_id} points at the record of point {record_point_id}.")
+
+            texts.append(self.decompress(codec, record[RECORD_HEADER.size + point_id_length:RECORD_HEADER.size + point_id_length + compressed_length]))
+
+        return texts
+
+    def hydrate(self, points:list) -> list:
+
+        # Points stored before the content store was enabled still carry their text inline
+        pending_points = [point for point in points if point.payload and point.payload.get("content_ref") and not point.payload.get("content")]
+
+        texts = self.read_many(
+            point_ids=[point.id for point in pending_points],
+            content_refs=[point.payload["content_ref"] for point in pending_points]
+        )
+
+        for point, text in zip(pending_points, texts):
+            point.payload["content"] = text
+
+        return points
+
+    def reset(self):
+
+        # The file is replaced rather than truncated, processes still mapping it would fault on the truncated pages
+        reset_path = f"{self.data_path}.reset"
+        open(reset_path, "wb").close()
+        os.replace(reset_path, self.data_path)
+
+        with self.lock:
+            self.mapped_file = None
+            self.mapped_size = 0
+            self.mapped_inode = None
+
+        logger.info("Content store reset", path=self.data_path)
+
+    def stats(self) -> dict:
+        return {"codec": "zstd" if self.codec == CODEC_ZSTD else "zlib", "size_bytes": os.path.getsize(self.data_path)}
+
+    def close(self):
+
+        with self.lock:
+
+            if self.mapped_file is not None:
+                self.mapped_file.close()
+
+            self.mapped_file = None
+            self.mapped_size = 0
@@ -0,0 +1,182 @@
+import re
+
+from commons.utils import HelperUtils
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Payload fields the context needs, everything else stays on the Qdrant side
+CONTEXT_PAYLOAD_FIELDS = [
+    "content",
+    "content_ref",
+    "metadata.project_code",
+    "metadata.project_name",
+    "metadata.filename",
+    "metadata.page_number",
+    "metadata.page_end",
+    "metadata.chunk_index",
+    "metadata.summary"
+]
+
+WORD_PATTERN = re.compile(r"\w+")
+
+class ContextAssembler:
+
+    def __init__(self, max_context_tokens:int = 8000, duplicate_threshold:float = 0.9, shingle_size:int = 5, min_truncated_tokens:int = 200):
+        self.max_context_tokens = max_context_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def section_from_point(self, point) -> dict:
+
+        payload = point.payload or {}
+        metadata = payload.get("metadata") or {}
+        page_number = metadata.get("page_number")
+
+        return {
+            "project_code": metadata.get("project_code"),
+            "project_name": metadata.get("project_name"),
+            "filename": metadata.get("filename"),
+            "page_start": page_number,
+            "page_end": metadata.get("page_end") or page_number,
+            "chunk_index": metadata.get("chunk_index"),
+            "summaries": [metadata.get("summary")] if metadata.get("summary") else [],
+            "content": payload.get("content") or "",
+            "score": point.score
+        }
+
+    @staticmethod
+    def is_adjacent(previous:dict, section:dict) -> bool:
+
+        if previous["page_end"] is None or section["page_start"] is None:
+            return False
+
+        # Consecutive pages, or consecutive chunks of one long page
+        if section["page_start"] == previous["page_end"] + 1:
+            return section["chunk_index"] in (None, 0)
+
+        if section["page_start"] == previous["page_end"] and None not in (previous["chunk_index"], section["chunk_index"]):
+            return section["chunk_index"] == previous["chunk_index"] + 1
+
+        return False
+
+    def merge_adjacent(self, sections:list) -> list:
+
+        documents = {}
+        for section in sections:
+            documents.setdefault((section["project_code"], section["filename"]), []).append(section)
+
+        merged_sections = []
+
+        for document_sections in documents.values():
+
+            document_sections.sort(key=lambda section: (section["page_start"] is None, section["page_start"] or 0, section["chunk_index"] or 0))
+            current = None
+
+            for section in document_sections:
+
+                if current is not None and self.is_adjacent(current, section):
+                    current = {
+                        **current,
+                        "page_end": section["page_end"],
+                        "chunk_index": section["chunk_index"],
+                        "summaries": current["summaries"] + [summary for summary in section["summaries"] if summary not in current["summaries"]],
+                        "content": f"{current['content']}\n\n{section['content']}",
+                        "score": max(current["score"], section["score"])
+                    }
+                else:
+                    if current is not None:
+                        merged_sections.append(current)
+                    current = section
+
+            merged_sections.append(current)
+
+        # Merged runs rank by their best hit
+        return sorted(merged_sections, key=lambda section: section["score"], reverse=True)
+
+    def shingles(self, text:str) -> set:
+
+        words = WORD_PATTERN.findall(text.lower())
+
+        if len(words) <= self.shingle_size:
+            return {tuple(words)}
+
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def remove_near_duplicates(self, sections:list) -> list:
+
+        kept_sections = []
+        kept_shingles = []
+
+        # Sections arrive best first, so the lower scored copy is the one dropped
+        for section in sections:
+
+            section_shingles = self.shingles(section["content"])
+
+            is_duplicate = any(
+                len(section_shingles & shingles) / max(1, min(len(section_shingles), len(shingles))) >= self.duplicate_threshold
+                for shingles in kept_shingles
+            )
+
+            if not is_duplicate:
+                kept_sections.append(section)
+                kept_shingles.append(section_shingles)
+
+        return kept_sections
+
+    def format_section(self, idx:int, section:dict) -> str:
+
+        pages = section["page_start"] if section["page_start"] == section["page_end"] else f"{section['page_start']}-{section['page_end']}"
+        summaries = "\n    ".join(section["summaries"])
+
+        return f"""
+    Document Result Number: {idx + 1}
+    Project Code: {section['project_code']}
+    Project Name: {section['project_name']}
+    Filename: {section['filename']}
+    Pages: {pages}
+
+    Section Summary: {summaries}
+
+    Section Content: \n{section['content']}\n
+    """
+
+    def pack(self, sections:list) -> list:
+
+        packed_sections = []
+        used_tokens = 0
+
+        for section in sections:
+
+            section_tokens = HelperUtils.estimate_tokens(self.format_section(len(packed_sections), section))
+            remaining_tokens = self.max_context_tokens - used_tokens
+
+            if section_tokens <= remaining_tokens:
+                packed_sections.append(section)
+                used_tokens += section_tokens
+                continue
+
+            # Cut an oversized section to the budget left instead of dropping the best remaining hit
+            overhead_tokens = section_tokens - HelperUtils.estimate_tokens(section["content"])
+            content_budget = remaining_tokens - overhead_tokens
+
+            if content_budget >= self.min_truncated_tokens:
+                content = section["content"][:content_budget * 4]
+                cut = content.rfind(" ")
+                packed_sections.append({**section, "content": content[:cut if cut > 0 else len(content)].rstrip() + " ..."})
+                break
+
+        return packed_sections
+
+    def assemble(self, points:list) -> str:
+
+        sections = self.merge_adjacent([self.section_from_point(point) for point in points])
+        sections = self.remove_near_duplicates(sections)
+        packed_sections = self.pack(sections)
+
+        context = "\n".join(self.format_section(idx, section) for idx, section in enumerate(packed_sections))
+
+        logger.debug("Context assembled", sections=len(packed_sections), document_results=len(points), estimated_tokens=HelperUtils.estimate_tokens(context) if context else 0)
+
+        return context
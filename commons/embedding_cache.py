@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+class EmbeddingCache:
+
+    def __init__(self, db_path:str = ".cache/embeddings.sqlite3", max_entries:int = 10000, ttl_seconds:float = 86400, max_disk_entries:int = 100000, prune_interval:int = 256):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.prune_interval = prune_interval
+        self.disk_writes = 0
+        self.lock = threading.Lock()
+        self.memory_cache = OrderedDict()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0
+        }
+
+        self.connection = None
+
+        if self.db_path:
+
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    cache_key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    statistics TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_by_created_at ON embeddings (created_at)")
+            self.connection.commit()
+
+    @staticmethod
+    def normalize_text(text:str) -> str:
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+    def cache_key(self, model:str, task_type:str, title:str, output_dimensionality:int, text:str) -> str:
+
+        text_hash = hashlib.sha256(self.normalize_text(text).encode("utf-8")).hexdigest()
+        key_fields = json.dumps([model, task_type, title or "", output_dimensionality, text_hash])
+
+        return hashlib.sha256(key_fields.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key:str):
+
+        with self.lock:
+
+            entry = self.memory_cache.get(cache_key)
+
+            if entry is not None:
+
+                values, statistics, cached_at = entry
+
+                if (time.monotonic() - cached_at) <= self.ttl_seconds:
+                    self.memory_cache.move_to_end(cache_key)
+                    self.counters["memory_hits"] += 1
+                    return values, statistics
+
+                del self.memory_cache[cache_key]
+
+            if self.connection is not None:
+
+                row = self.connection.execute(
+                    "SELECT vector, statistics, created_at FROM embeddings WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+
+                age_seconds = time.time() - row[2] if row is not None else None
+
+                if row is not None and age_seconds > self.ttl_seconds:
+                    self.connection.execute("DELETE FROM embeddings WHERE cache_key = ?", (cache_key,))
+                    self.connection.commit()
+                    row = None
+
+                if row is not None:
+
+                    values = array("f", row[0]).tolist()
+                    statistics = json.loads(row[1]) if row[1] else None
+
+                    # The memory copy expires together with the row it was read from
+                    self.put_memory(cache_key=cache_key, values=values, statistics=statistics, cached_at=time.monotonic() - age_seconds)
+                    self.counters["disk_hits"] += 1
+
+                    return values, statistics
+
+            self.counters["misses"] += 1
+
+        return None
+
+    def put_memory(self, cache_key:str, values:list, statistics:dict, cached_at:float = None):
+
+        self.memory_cache[cache_key] = (values, statistics, time.monotonic() if cached_at is None else cached_at)
+        self.memory_cache.move_to_end(cache_key)
+
+        while len(self.memory_cache) > self.max_entries:
+            self.memory_cache.popitem(last=False)
+
+    def put(self, cache_key:str, values:list, statistics:dict = None):
+
+        with self.lock:
+
+            self.put_memory(cache_key=cache_key, values=values, statistics=statistics)
+
+            if self.connection is not None:
+
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO embeddings (cache_key, vector, statistics, created_at) VALUES (?, ?, ?, ?)",
+                    (cache_key, array("f", values).tobytes(), json.dumps(statistics) if statistics else None, time.time())
+                )
+
+                # Pruning every prune_interval writes keeps the table bounded without a count on each put
+                self.disk_writes += 1
+                if self.disk_writes % self.prune_interval == 1 or self.prune_interval <= 1:
+                    self.prune_disk()
+
+                self.connection.commit()
+
+    def prune_disk(self):
+
+        self.connection.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        if self.max_disk_entries:
+
+            excess_rows = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_disk_entries
+
+            if excess_rows > 0:
+                self.connection.execute(
+                    "DELETE FROM embeddings WHERE cache_key IN (SELECT cache_key FROM embeddings ORDER BY created_at LIMIT ?)",
+                    (excess_rows,)
+                )
+
+    def stats(self) -> dict:
+
+        with self.lock:
+
+            lookups = sum(self.counters.values())
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+
+            return {
+                **self.counters,
+                "memory_entries": len(self.memory_cache),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,20 +1,39 @@
 import json
-from pprint import pprint
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 from google import genai
 from google.genai import types
 from google.genai.types import EmbedContentConfig
 from google.oauth2.service_account import Credentials
 
+from commons.utils import HelperUtils
+from commons.rate_limiter import RateLimiter
+from commons.embedding_cache import EmbeddingCache
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
 class MetadataDetailsSchema(BaseModel):
     project_code: int 
     project_name: str
 
+# Per-request limits of the Vertex embed API. gemini-embedding-001 only accepts a single
+# input per request, so its batches are dispatched concurrently instead.
+EMBEDDING_MODEL_LIMITS = {
+    "gemini-embedding-001": {"max_items": 1, "max_tokens": 2048},
+    "text-embedding-005": {"max_items": 250, "max_tokens": 20000},
+    "text-multilingual-embedding-002": {"max_items": 250, "max_tokens": 20000}
+}
+
 class GoogleGenaiHelper:
 
-    def __init__(self, project_id:str, location:str, credentials:dict):
+    def __init__(self, project_id:str, location:str, credentials:dict, embedding_cache:EmbeddingCache = None, rate_limiter:RateLimiter = None):
         self.project_id = project_id
         self.location = location
+        self.embedding_cache = embedding_cache
+        self.rate_limiter = rate_limiter or RateLimiter()
         self.credentials = Credentials.from_service_account_info(
             credentials, 
             scopes=["https://www.googleapis.com/auth/cloud-platform"]
@@ -27,58 +46,347 @@ class GoogleGenaiHelper:
             http_options=types.HttpOptions(api_version='v1')
         )
 
-    def generate_embeddings(self, model:str, contents:list, title:str, output_dimensionality:int = 1536):
+    async def close_async(self):
+
+        # Newer google-genai clients close their own HTTP pools, older ones only hold them on the API client
+        if hasattr(self.client, "close"):
+            self.client.close()
+            await self.client.aio.aclose()
+            return
+
+        api_client = getattr(self.client, "_api_client", None)
+
+        if getattr(api_client, "_httpx_client", None) is not None:
+            api_client._httpx_client.close()
+        if getattr(api_client, "_async_httpx_client", None) is not None:
+            await api_client._async_httpx_client.aclose()
+
+    def lookup_cached_embeddings(self, model:str, contents:list, task_type:str, title:str, output_dimensionality:int):
+
+        cache_keys = [None] * len(contents)
+        cached_embeddings = [None] * len(contents)
+
+        if self.embedding_cache is None:
+            return cache_keys, cached_embeddings
+
+        for idx, content in enumerate(contents):
+
+            if not isinstance(content, str):
+                continue
+
+            cache_keys[idx] = self.embedding_cache.cache_key(
+                model=model,
+                task_type=task_type,
+                title=title,
+                output_dimensionality=output_dimensionality,
+                text=content
+            )
+
+            cached_entry = self.embedding_cache.get(cache_key=cache_keys[idx])
+
+            if cached_entry is not None:
 
-        print("\nGenerating vector embeddings ...")
+                values, statistics = cached_entry
+                cached_embeddings[idx] = types.ContentEmbedding(
+                    values=values,
+                    statistics=types.ContentEmbeddingStatistics(**statistics) if statistics else None
+                )
 
-        response = self.client.models.embed_content(
+        return cache_keys, cached_embeddings
+
+    def merge_cached_embeddings(self, cache_keys:list, cached_embeddings:list, response) -> types.EmbedContentResponse:
+
+        new_embeddings = iter(response.embeddings if response is not None else [])
+        embeddings = []
+
+        for cache_key, cached_embedding in zip(cache_keys, cached_embeddings):
+
+            if cached_embedding is not None:
+                embeddings.append(cached_embedding)
+                continue
+
+            embedding = next(new_embeddings)
+            embeddings.append(embedding)
+
+            if cache_key is not None:
+                self.embedding_cache.put(
+                    cache_key=cache_key,
+                    values=embedding.values,
+                    statistics=embedding.statistics.model_dump(exclude_none=True) if embedding.statistics else None
+                )
+
+        return types.EmbedContentResponse(embeddings=embeddings)
+
+    def generate_embeddings(self, model:str, contents:list, title:str, output_dimensionality:int = 1536, task_type:str = "RETRIEVAL_DOCUMENT"):
+
+        logger.debug("Generating vector embeddings", model=model, contents=len(contents))
+
+        cache_keys, cached_embeddings = self.lookup_cached_embeddings(
             model=model,
             contents=contents,
-            config=EmbedContentConfig(
-                task_type="RETRIEVAL_DOCUMENT",
-                title=title,
-                output_dimensionality=output_dimensionality
-            ),
+            task_type=task_type,
+            title=title,
+            output_dimensionality=output_dimensionality
         )
+        missing_contents = [content for content, cached in zip(contents, cached_embeddings) if cached is None]
+
+        response = None
+
+        if missing_contents:
+
+            response = self.rate_limiter.call(
+                model=model,
+                request=lambda: self.client.models.embed_content(
+                    model=model,
+                    contents=missing_contents,
+                    config=EmbedContentConfig(
+                        task_type=task_type,
+                        title=title,
+                        output_dimensionality=output_dimensionality
+                    ),
+                )
+            )
+
+        logger.debug("Vector embeddings generated", model=model, contents=len(contents), cache_hits=len(contents) - len(missing_contents))
+
+        return self.merge_cached_embeddings(
+            cache_keys=cache_keys,
+            cached_embeddings=cached_embeddings,
+            response=response
+        )
+
+    async def generate_embeddings_async(self, model:str, contents:list, title:str, output_dimensionality:int = 1536, task_type:str = "RETRIEVAL_DOCUMENT"):
 
-        print("\nVector embeddings generated.\n")
+        logger.debug("Generating vector embeddings", model=model, contents=len(contents), mode="async")
 
-        return response
+        # The cache's SQLite tier blocks, so lookups and writes run off the event loop
+        cache_keys, cached_embeddings = await asyncio.to_thread(
+            self.lookup_cached_embeddings,
+            model=model,
+            contents=contents,
+            task_type=task_type,
+            title=title,
+            output_dimensionality=output_dimensionality
+        )
+        missing_contents = [content for content, cached in zip(contents, cached_embeddings) if cached is None]
+
+        response = None
+
+        if missing_contents:
+
+            response = await self.rate_limiter.call_async(
+                model=model,
+                request=lambda: self.client.aio.models.embed_content(
+                    model=model,
+                    contents=missing_contents,
+                    config=EmbedContentConfig(
+                        task_type=task_type,
+                        title=title,
+                        output_dimensionality=output_dimensionality
+                    ),
+                )
+            )
+
+        logger.debug("Vector embeddings generated", model=model, contents=len(contents), cache_hits=len(contents) - len(missing_contents))
+
+        return await asyncio.to_thread(
+            self.merge_cached_embeddings,
+            cache_keys=cache_keys,
+            cached_embeddings=cached_embeddings,
+            response=response
+        )
     
+    def plan_embedding_batches(self, contents:list, titles:list, max_items:int, max_tokens:int) -> list:
+
+        batches = []
+        open_batches = {}
+
+        for idx, (content, title) in enumerate(zip(contents, titles)):
+
+            content_tokens = HelperUtils.estimate_tokens(content)
+            batch = open_batches.get(title)
+
+            if (batch is None) or (len(batch["indices"]) >= max_items) or (batch["tokens"] + content_tokens > max_tokens):
+                batch = {"title": title, "indices": [], "tokens": 0}
+                open_batches[title] = batch
+                batches.append(batch)
+
+            batch["indices"].append(idx)
+            batch["tokens"] += content_tokens
+
+        return batches
+
+    def iter_embeddings_batched(self, model:str, contents:list, titles:list, output_dimensionality:int = 1536, task_type:str = "RETRIEVAL_DOCUMENT", max_items:int = None, max_tokens:int = None, max_workers:int = 4):
+
+        model_limits = EMBEDDING_MODEL_LIMITS.get(model, {"max_items": 250, "max_tokens": 20000})
+
+        batches = self.plan_embedding_batches(
+            contents=contents,
+            titles=titles,
+            max_items=max_items or model_limits["max_items"],
+            max_tokens=max_tokens or model_limits["max_tokens"]
+        )
+
+        logger.info("Generating batched vector embeddings", model=model, contents=len(contents), batches=len(batches))
+
+        def embed_batch(batch:dict):
+            return self.generate_embeddings(
+                model=model,
+                contents=[contents[idx] for idx in batch["indices"]],
+                title=batch["title"],
+                output_dimensionality=output_dimensionality,
+                task_type=task_type
+            )
+
+        # Yields (content index, embedding) pairs as soon as each batch is embedded
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+
+            for batch, response in zip(batches, executor.map(embed_batch, batches)):
+
+                yield from zip(batch["indices"], response.embeddings)
+
+    def generate_embeddings_batched(self, model:str, contents:list, titles:list, output_dimensionality:int = 1536, task_type:str = "RETRIEVAL_DOCUMENT", max_items:int = None, max_tokens:int = None, max_workers:int = 4) -> list:
+
+        embeddings = [None] * len(contents)
+
+        for idx, embedding in self.iter_embeddings_batched(
+            model=model,
+            contents=contents,
+            titles=titles,
+            output_dimensionality=output_dimensionality,
+            task_type=task_type,
+            max_items=max_items,
+            max_tokens=max_tokens,
+            max_workers=max_workers
+        ):
+            embeddings[idx] = embedding
+
+        return embeddings
+
+    async def generate_embeddings_batched_async(self, model:str, contents:list, titles:list, output_dimensionality:int = 1536, task_type:str = "RETRIEVAL_DOCUMENT", max_items:int = None, max_tokens:int = None) -> list:
+
+        model_limits = EMBEDDING_MODEL_LIMITS.get(model, {"max_items": 250, "max_tokens": 20000})
+
+        batches = self.plan_embedding_batches(
+            contents=contents,
+            titles=titles,
+            max_items=max_items or model_limits["max_items"],
+            max_tokens=max_tokens or model_limits["max_tokens"]
+        )
+
+        logger.debug("Generating batched vector embeddings", model=model, contents=len(contents), batches=len(batches), mode="async")
+
+        # Batches run concurrently, bounded by the rate limiter's semaphore
+        responses = await asyncio.gather(*[
+            self.generate_embeddings_async(
+                model=model,
+                contents=[contents[idx] for idx in batch["indices"]],
+                title=batch["title"],
+                output_dimensionality=output_dimensionality,
+                task_type=task_type
+            )
+            for batch in batches
+        ])
+
+        embeddings = [None] * len(contents)
+
+        for batch, response in zip(batches, responses):
+            for idx, embedding in zip(batch["indices"], response.embeddings):
+                embeddings[idx] = embedding
+
+        return embeddings
+
     def gemini_llm_chat_with_text_response(self, model:str, prompt:dict, max_output_tokens:int = 4096, temperature:float = 0.9):
 
         system_instructions = prompt["system"]
         user_query = prompt["user"]
 
-        response = self.client.models.generate_content(
-            model=model, 
-            contents=user_query,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions,
-                max_output_tokens=max_output_tokens,
-                temperature=temperature
-            ),
+        response = self.rate_limiter.call(
+            model=model,
+            request=lambda: self.client.models.generate_content(
+                model=model, 
+                contents=user_query,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instructions,
+                    max_output_tokens=max_output_tokens,
+                    temperature=temperature
+                ),
+            )
         )
 
         return response.text
     
+    async def gemini_llm_chat_with_text_stream_async(self, model:str, prompt:dict, max_output_tokens:int = 4096, temperature:float = 0.9):
+
+        system_instructions = prompt["system"]
+        user_query = prompt["user"]
+
+        # Only opening the stream is retried, a stream that fails after the first chunk is surfaced to the caller
+        response_stream = self.rate_limiter.call_stream_async(
+            model=model,
+            request=lambda: self.client.aio.models.generate_content_stream(
+                model=model, 
+                contents=user_query,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instructions,
+                    max_output_tokens=max_output_tokens,
+                    temperature=temperature
+                ),
+            )
+        )
+
+        # Closing the stream early releases the rate limiter slot right away
+        async with contextlib.aclosing(response_stream):
+            async for response_chunk in response_stream:
+                if response_chunk.text:
+                    yield response_chunk.text
+    
     def gemini_llm_chat_with_json_response(self, model:str, prompt:dict, response_schema, max_output_tokens:int = 1024, temperature:float = 0.3):
 
         system_instructions = prompt["system"]
         user_query = prompt["user"]
 
-        response = self.client.models.generate_content(
-            model=model, 
-            contents=user_query,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions,
-                max_output_tokens=max_output_tokens,
-                temperature=temperature,
-                response_mime_type='application/json',
-                response_schema=response_schema,
-            ),
+        response = self.rate_limiter.call(
+            model=model,
+            request=lambda: self.client.models.generate_content(
+                model=model, 
+                contents=user_query,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instructions,
+                    max_output_tokens=max_output_tokens,
+                    temperature=temperature,
+                    response_mime_type='application/json',
+                    response_schema=response_schema,
+                ),
+            )
+        )
+
+        return self.parse_json_response(response=response)
+
+    async def gemini_llm_chat_with_json_response_async(self, model:str, prompt:dict, response_schema, max_output_tokens:int = 1024, temperature:float = 0.3):
+
+        system_instructions = prompt["system"]
+        user_query = prompt["user"]
+
+        response = await self.rate_limiter.call_async(
+            model=model,
+            request=lambda: self.client.aio.models.generate_content(
+                model=model, 
+                contents=user_query,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instructions,
+                    max_output_tokens=max_output_tokens,
+                    temperature=temperature,
+                    response_mime_type='application/json',
+                    response_schema=response_schema,
+                ),
+            )
         )
 
+        return self.parse_json_response(response=response)
+
+    def parse_json_response(self, response) -> dict:
+
         json_response = {
             "project_code": -1,
             "project_name": ""
@@ -94,7 +402,7 @@ class GoogleGenaiHelper:
         except Exception as ex:
 
             error_message = ex.with_traceback(ex.__traceback__)
-            print(f"\nError: \n{error_message}\n")
+            logger.error("Failed to parse the LLM's JSON response", error=error_message)
 
         return json_response
     
@@ -117,9 +425,7 @@ class GoogleGenaiHelper:
 
         return llm_text_response
     
-    def extract_metadata_details_from_user_query_task(self, user_query:str):
-
-        print("\nExtracting metadata details from the user's query ...")
+    def metadata_extraction_prompt(self, user_query:str) -> dict:
 
         extraction_prompt = {
             "system": "You're a useful AI assistant and your only function is to extract the project name and code from the user's query.",
@@ -145,21 +451,41 @@ class GoogleGenaiHelper:
             """
         }
 
+        return extraction_prompt
+
+    def extract_metadata_details_from_user_query_task(self, user_query:str):
+
+        logger.debug("Extracting metadata details from the user's query")
+
         llm_json_response = self.gemini_llm_chat_with_json_response(
             model="gemini-2.5-flash-lite", 
-            prompt=extraction_prompt,
+            prompt=self.metadata_extraction_prompt(user_query=user_query),
             response_schema=MetadataDetailsSchema,
             max_output_tokens=250,
             temperature=0.3
         )
 
-        print("\nMetadata returned: ")
-        pprint(llm_json_response)
-        print("\n")
+        logger.debug("Metadata details extracted", metadata=llm_json_response)
 
         return llm_json_response
 
-    def ppa_query_task(self, user_query:str, retrieved_documents:list):
+    async def extract_metadata_details_from_user_query_task_async(self, user_query:str):
+
+        logger.debug("Extracting metadata details from the user's query", mode="async")
+
+        llm_json_response = await self.gemini_llm_chat_with_json_response_async(
+            model="gemini-2.5-flash-lite", 
+            prompt=self.metadata_extraction_prompt(user_query=user_query),
+            response_schema=MetadataDetailsSchema,
+            max_output_tokens=250,
+            temperature=0.3
+        )
+
+        logger.debug("Metadata details extracted", metadata=llm_json_response)
+
+        return llm_json_response
+
+    def ppa_query_prompt(self, user_query:str, retrieved_documents:list) -> dict:
 
         ppa_query_prompt = {
             "system": "You're a useful AI assistant and need to answer the user's query from the provided context.",
@@ -172,11 +498,28 @@ class GoogleGenaiHelper:
             """
         }
 
+        return ppa_query_prompt
+
+    def ppa_query_task(self, user_query:str, retrieved_documents:list):
+
         llm_text_response = self.gemini_llm_chat_with_text_response(
             model="gemini-2.5-flash", 
-            prompt=ppa_query_prompt,
+            prompt=self.ppa_query_prompt(user_query=user_query, retrieved_documents=retrieved_documents),
+            max_output_tokens=4096,
+            temperature=0.9
+        )
+
+        return llm_text_response
+
+    async def ppa_query_task_stream_async(self, user_query:str, retrieved_documents:list):
+
+        text_stream = self.gemini_llm_chat_with_text_stream_async(
+            model="gemini-2.5-flash", 
+            prompt=self.ppa_query_prompt(user_query=user_query, retrieved_documents=retrieved_documents),
             max_output_tokens=4096,
             temperature=0.9
         )
 
-        return llm_text_response
\ No newline at end of file
+        async with contextlib.aclosing(text_stream):
+            async for text_chunk in text_stream:
+                yield text_chunk
@@ -0,0 +1,82 @@
+import os
+import json
+import uuid
+import hashlib
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Fixed namespace so the same (S3 key, page number, content hash) always maps to the same point ID
+POINT_ID_NAMESPACE = uuid.UUID("6f1c1f52-3a0e-4c61-9d51-1c5bde6a8f21")
+
+class IngestionManifest:
+
+    def __init__(self, collection_name:str, manifest_path:str = None, autosave:bool = True):
+        self.collection_name = collection_name
+        self.autosave = autosave
+        self.manifest_path = manifest_path or os.path.join(".cache", "ingestion_manifests", f"{collection_name}.json")
+        self.documents = {}
+
+    @staticmethod
+    def content_hash(text:str) -> str:
+        return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def point_id(s3_key:str, page_number, content_hash:str) -> str:
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{s3_key}|{page_number}|{content_hash}"))
+
+    def load(self):
+
+        if os.path.exists(self.manifest_path):
+
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+            if manifest.get("collection_name") == self.collection_name:
+                self.documents = manifest.get("documents", {})
+
+        logger.info("Ingestion manifest loaded", documents=len(self.documents), manifest_path=self.manifest_path)
+
+        return self
+
+    def save(self):
+
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump({"collection_name": self.collection_name, "documents": self.documents}, manifest_file)
+
+        os.replace(temp_path, self.manifest_path)
+
+    def reset(self):
+
+        self.documents = {}
+        self.save()
+
+    def document_keys(self) -> set:
+        return set(self.documents.keys())
+
+    def document_etag(self, s3_key:str):
+        return self.documents.get(s3_key, {}).get("etag")
+
+    def document_point_ids(self, s3_key:str) -> set:
+        return set(self.documents.get(s3_key, {}).get("pages", {}).keys())
+
+    def update_document(self, s3_key:str, etag:str, pages:dict):
+
+        self.documents[s3_key] = {
+            "etag": etag,
+            "pages": pages
+        }
+
+        if self.autosave:
+            self.save()
+
+    def remove_document(self, s3_key:str):
+
+        self.documents.pop(s3_key, None)
+
+        if self.autosave:
+            self.save()
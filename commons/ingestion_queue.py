@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from array import array
+from contextlib import contextmanager
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Chunk states in processing order, every stage is checkpointed before the next one starts
+CHUNK_STATES = ("pending", "summarized", "embedded", "upserted")
+ACTIVE_CHUNK_STATES = CHUNK_STATES[:-1]
+
+class IngestionQueue:
+
+    def __init__(self, db_path:str = ".cache/ingestion_queue.sqlite3", lease_seconds:float = 600, max_attempts:int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        # Autocommit connection, multi-statement updates open their own IMMEDIATE transactions
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                s3_key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                manifest_pages TEXT NOT NULL,
+                existing_point_ids TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                point_id TEXT PRIMARY KEY,
+                s3_key TEXT NOT NULL,
+                chunk_idx INTEGER NOT NULL,
+                text_chunk TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                summary TEXT,
+                vector BLOB,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                lease_token TEXT,
+                lease_expires_at REAL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_state ON chunks (state, lease_expires_at);
+            CREATE INDEX IF NOT EXISTS chunks_by_document ON chunks (s3_key);
+            """
+        )
+
+    @contextmanager
+    def transaction(self):
+
+        with self.lock:
+
+            self.connection.execute("BEGIN IMMEDIATE")
+
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+            self.connection.execute("COMMIT")
+
+    def reset(self):
+
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM chunks")
+            connection.execute("DELETE FROM documents")
+
+    def recover(self):
+
+        # Only the coordinator calls this before starting workers, so every lease left behind belongs to a dead worker.
+        # Chunks that ran out of attempts on a previous run get a fresh set.
+        with self.transaction() as connection:
+            connection.execute(
+                f"UPDATE chunks SET lease_token = NULL, lease_expires_at = NULL, attempts = 0 WHERE state IN ({','.join('?' * len(ACTIVE_CHUNK_STATES))})",
+                ACTIVE_CHUNK_STATES
+            )
+
+    def document_etag(self, s3_key:str):
+
+        row = self.connection.execute("SELECT etag FROM documents WHERE s3_key = ?", (s3_key,)).fetchone()
+
+        return row[0] if row else None
+
+    def document_keys(self) -> set:
+        return {row[0] for row in self.connection.execute("SELECT s3_key FROM documents")}
+
+    def enqueue_document(self, s3_key:str, etag:str, manifest_pages:dict, existing_point_ids:set, page_chunks:list):
+
+        now = time.time()
+
+        with self.transaction() as connection:
+
+            # A document changed again before its last version finished keeps that version's upserted points as stale points to delete
+            previously_upserted = {row[0] for row in connection.execute("SELECT point_id FROM chunks WHERE s3_key = ? AND state = 'upserted'", (s3_key,))}
+            connection.execute("DELETE FROM chunks WHERE s3_key = ?", (s3_key,))
+
+            connection.execute(
+                "INSERT OR REPLACE INTO documents (s3_key, etag, manifest_pages, existing_point_ids, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (s3_key, etag, json.dumps(manifest_pages), json.dumps(sorted(set(existing_point_ids) | previously_upserted)), now)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO chunks (point_id, s3_key, chunk_idx, text_chunk, metadata, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (point_id, s3_key, chunk_idx, text_chunk, json.dumps(metadata_fields), now)
+                    for chunk_idx, (point_id, text_chunk, metadata_fields) in enumerate(page_chunks)
+                ]
+            )
+
+    def remove_document(self, s3_key:str) -> set:
+
+        with self.transaction() as connection:
+
+            upserted_point_ids = {row[0] for row in connection.execute("SELECT point_id FROM chunks WHERE s3_key = ? AND state = 'upserted'", (s3_key,))}
+            connection.execute("DELETE FROM chunks WHERE s3_key = ?", (s3_key,))
+            connection.execute("DELETE FROM documents WHERE s3_key = ?", (s3_key,))
+
+        # Points of an unfinished document that are already in the collection
+        return upserted_point_ids
+
+    def requeue_upserted(self):
+
+        # For stores that lose unsaved points on a crash, the stored vectors are upserted again
+        with self.transaction() as connection:
+            connection.execute("UPDATE chunks SET state = 'embedded' WHERE state = 'upserted'")
+
+    def claim(self, batch_size:int) -> list:
+
+        now = time.time()
+        lease_token = uuid.uuid4().hex
+
+        with self.transaction() as connection:
+
+            # Chunks closest to done first, so upserts are not starved by new summaries
+            connection.execute(
+                f"""
+                UPDATE chunks SET lease_token = ?, lease_expires_at = ?
+                WHERE point_id IN (
+                    SELECT point_id FROM chunks
+                    WHERE state IN ({','.join('?' * len(ACTIVE_CHUNK_STATES))})
+                      AND attempts < ?
+                      AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                    ORDER BY CASE state WHEN 'embedded' THEN 0 WHEN 'summarized' THEN 1 ELSE 2 END, s3_key, chunk_idx
+                    LIMIT ?
+                )
+                """,
+                (lease_token, now + self.lease_seconds, *ACTIVE_CHUNK_STATES, self.max_attempts, now, batch_size)
+            )
+
+            rows = connection.execute(
+                "SELECT point_id, s3_key, text_chunk, metadata, summary, vector, state FROM chunks WHERE lease_token = ? ORDER BY s3_key, chunk_idx",
+                (lease_token,)
+            ).fetchall()
+
+        return [
+            {
+                "point_id": point_id,
+                "s3_key": s3_key,
+                "text_chunk": text_chunk,
+                "metadata": json.loads(metadata),
+                "summary": summary,
+                "vector": array("f", vector).tolist() if vector is not None else None,
+                "state": state,
+                "lease_token": lease_token
+            }
+            for point_id, s3_key, text_chunk, metadata, summary, vector, state in rows
+        ]
+
+    def checkpoint(self, chunk:dict, state:str, summary:str = None, vector:list = None):
+
+        now = time.time()
+
+        # Writes only land while the worker still holds the lease, and each checkpoint extends it
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                UPDATE chunks SET
+                    state = ?,
+                    summary = COALESCE(?, summary),
+                    vector = COALESCE(?, vector),
+                    last_error = NULL,
+                    lease_expires_at = ?,
+                    updated_at = ?
+                WHERE point_id = ? AND lease_token = ?
+                """,
+                (state, summary, array("f", vector).tobytes() if vector is not None else None, now + self.lease_seconds, now, chunk["point_id"], chunk["lease_token"])
+            )
+
+        chunk["state"] = state
+
+        if summary is not None:
+            chunk["summary"] = summary
+        if vector is not None:
+            chunk["vector"] = vector
+
+    def checkpoint_many(self, chunks:list, state:str):
+
+        now = time.time()
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "UPDATE chunks SET state = ?, last_error = NULL, lease_expires_at = ?, updated_at = ? WHERE point_id = ? AND lease_token = ?",
+                [(state, now + self.lease_seconds, now, chunk["point_id"], chunk["lease_token"]) for chunk in chunks]
+            )
+
+        for chunk in chunks:
+            chunk["state"] = state
+
+    def release(self, chunks:list, error:str = None):
+
+        now = time.time()
+
+        # Failed chunks go back to the queue at their last completed stage, until they run out of attempts
+        with self.transaction() as connection:
+            connection.executemany(
+                """
+                UPDATE chunks SET
+                    attempts = attempts + ?,
+                    last_error = COALESCE(?, last_error),
+                    lease_token = NULL,
+                    lease_expires_at = NULL,
+                    updated_at = ?
+                WHERE point_id = ? AND lease_token = ?
+                """,
+                [(1 if error else 0, error, now, chunk["point_id"], chunk["lease_token"]) for chunk in chunks]
+            )
+
+    def has_work(self) -> bool:
+
+        row = self.connection.execute(
+            f"SELECT 1 FROM chunks WHERE state IN ({','.join('?' * len(ACTIVE_CHUNK_STATES))}) AND attempts < ? LIMIT 1",
+            (*ACTIVE_CHUNK_STATES, self.max_attempts)
+        ).fetchone()
+
+        return row is not None
+
+    def finished_documents(self) -> list:
+
+        # Documents whose chunks are all upserted or out of attempts
+        rows = self.connection.execute(
+            f"""
+            SELECT d.s3_key, d.etag, d.manifest_pages, d.existing_point_ids, d.enqueued_at
+            FROM documents d
+            WHERE NOT EXISTS (
+                SELECT 1 FROM chunks c
+                WHERE c.s3_key = d.s3_key AND c.state IN ({','.join('?' * len(ACTIVE_CHUNK_STATES))}) AND c.attempts < ?
+            )
+            """,
+            (*ACTIVE_CHUNK_STATES, self.max_attempts)
+        ).fetchall()
+
+        documents = []
+
+        for s3_key, etag, manifest_pages, existing_point_ids, enqueued_at in rows:
+
+            failed_point_ids = {
+                row[0] for row in self.connection.execute("SELECT point_id FROM chunks WHERE s3_key = ? AND state != 'upserted'", (s3_key,))
+            }
+
+            documents.append({
+                "key": s3_key,
+                "etag": etag,
+                "manifest_pages": json.loads(manifest_pages),
+                "existing_point_ids": set(json.loads(existing_point_ids)),
+                "failed_point_ids": failed_point_ids,
+                "enqueued_at": enqueued_at
+            })
+
+        return documents
+
+    def complete_document(self, s3_key:str):
+
+        # Documents with failed chunks stay queued, the next run retries those chunks from their last stage
+        with self.transaction() as connection:
+
+            remaining = connection.execute("SELECT COUNT(*) FROM chunks WHERE s3_key = ? AND state != 'upserted'", (s3_key,)).fetchone()[0]
+
+            if remaining == 0:
+                connection.execute("DELETE FROM chunks WHERE s3_key = ?", (s3_key,))
+                connection.execute("DELETE FROM documents WHERE s3_key = ?", (s3_key,))
+
+            return remaining == 0
+
+    def stats(self) -> dict:
+
+        counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM chunks GROUP BY state").fetchall())
+        failed = self.connection.execute(
+            f"SELECT COUNT(*) FROM chunks WHERE state IN ({','.join('?' * len(ACTIVE_CHUNK_STATES))}) AND attempts >= ?",
+            (*ACTIVE_CHUNK_STATES, self.max_attempts)
+        ).fetchone()[0]
+
+        return {**{state: counts.get(state, 0) for state in CHUNK_STATES}, "failed": failed, "documents": len(self.document_keys())}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,566 @@
+import os
+import json
+import asyncio
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from qdrant_client.http import models
+
+from commons.qdrant_helper import QdrantHelper, FULL_VECTOR_NAME
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+class LocalVectorStore:
+
+    def __init__(self, snapshot_dir:str = ".cache/local_vector_store", ivf_lists:int = 0, ivf_probes:int = 8, ivf_min_points:int = 50000):
+        self.snapshot_dir = snapshot_dir
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.ivf_min_points = ivf_min_points
+        self.collections = {}
+        self.pending_points = {}
+        self.lock = threading.RLock()
+
+    # Points are built exactly like the Qdrant backend builds them
+    point_object = QdrantHelper.point_object
+
+    def collection_dir(self, collection_name:str) -> str:
+        return os.path.join(self.snapshot_dir, collection_name)
+
+    def readable_collection_dir(self, collection_name:str) -> str:
+
+        collection_dir = self.collection_dir(collection_name)
+        backup_dir = f"{collection_dir}.old"
+
+        # Between the two renames of a snapshot swap only the previous snapshot exists, under the backup name
+        if not os.path.exists(os.path.join(collection_dir, "meta.json")) and os.path.exists(os.path.join(backup_dir, "meta.json")):
+            return backup_dir
+
+        return collection_dir
+
+    def restore_interrupted_swap(self, collection_name:str):
+
+        collection_dir = self.collection_dir(collection_name)
+        backup_dir = f"{collection_dir}.old"
+
+        # A writer that died between the two renames leaves the previous snapshot under the backup name
+        if not os.path.exists(collection_dir) and os.path.exists(os.path.join(backup_dir, "meta.json")):
+            logger.warning("Restoring the local vector store snapshot of an interrupted swap", collection=collection_name)
+            os.rename(backup_dir, collection_dir)
+
+    def load_collection(self, collection_name:str) -> dict:
+
+        with self.lock:
+
+            if collection_name not in self.collections:
+                self.collections[collection_name] = self.read_collection(collection_name=collection_name)
+
+            return self.collections[collection_name]
+
+    def read_collection(self, collection_name:str) -> dict:
+
+        collection_dir = self.readable_collection_dir(collection_name)
+
+        if not os.path.exists(os.path.join(collection_dir, "meta.json")):
+            raise FileNotFoundError(f"No local vector store snapshot for collection '{collection_name}' in '{collection_dir}'.")
+
+        snapshot_mtime = os.path.getmtime(os.path.join(collection_dir, "meta.json"))
+
+        with open(os.path.join(collection_dir, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+
+        # The vector matrix stays memory-mapped, only the filterable fields are held in RAM
+        collection = {
+            "meta": meta,
+            "vectors": np.load(os.path.join(collection_dir, "vectors.npy"), mmap_mode="r"),
+            "project_codes": np.array(meta["project_codes"], dtype=object),
+            "project_names": np.array(meta["project_names"], dtype=object),
+            "payload_db": sqlite3.connect(os.path.join(collection_dir, "payloads.sqlite3"), check_same_thread=False),
+            "ivf": None,
+            "snapshot_mtime": snapshot_mtime
+        }
+
+        if os.path.exists(os.path.join(collection_dir, "ivf_centroids.npy")):
+
+            assignments = np.load(os.path.join(collection_dir, "ivf_assignments.npy"))
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=meta["ivf_lists"]))])
+
+            collection["ivf"] = {
+                "centroids": np.load(os.path.join(collection_dir, "ivf_centroids.npy")),
+                "order": order,
+                "offsets": offsets
+            }
+
+        logger.info("Local vector store loaded", collection=collection_name, points=meta['count'], ivf=collection['ivf'] is not None)
+
+        return collection
+
+    def refresh_if_stale(self, collection_name:str) -> bool:
+
+        collection = self.collections.get(collection_name)
+
+        try:
+            snapshot_mtime = os.path.getmtime(os.path.join(self.readable_collection_dir(collection_name), "meta.json"))
+        except OSError:
+            return False
+
+        if collection is not None and collection["snapshot_mtime"] == snapshot_mtime:
+            return False
+
+        # The superseded snapshot is not closed here, searches still running in worker threads may hold it.
+        # Its payload connection closes once the last of them lets go of it.
+        with self.lock:
+            self.collections.pop(collection_name, None)
+            self.load_collection(collection_name=collection_name)
+
+        return True
+
+    def load(self, collection_name:str):
+
+        self.load_collection(collection_name=collection_name)
+
+        return self
+
+    def filter_mask(self, collection:dict, project_code_filter = None, project_name_filter:str = None):
+
+        mask = None
+
+        if project_code_filter not in (None, "", -1, "-1"):
+            mask = collection["project_codes"] == str(project_code_filter)
+
+        if project_name_filter:
+            name_mask = collection["project_names"] == project_name_filter
+            mask = name_mask if mask is None else (mask & name_mask)
+
+        return mask
+
+    def candidate_rows(self, collection:dict, query_vector:np.ndarray, mask):
+
+        ivf = collection["ivf"]
+
+        if ivf is None:
+            return None if mask is None else np.flatnonzero(mask)
+
+        # Probe the inverted lists of the centroids closest to the query
+        centroid_scores = ivf["centroids"] @ query_vector
+        probes = np.argpartition(-centroid_scores, min(self.ivf_probes, len(centroid_scores)) - 1)[:self.ivf_probes]
+
+        rows = np.concatenate([ivf["order"][ivf["offsets"][probe]:ivf["offsets"][probe + 1]] for probe in probes])
+
+        if mask is not None:
+            rows = rows[mask[rows]]
+
+        return rows
+
+    def search_batch(self, collection_name:str, query_vectors:list, top_k:int = 5, project_code_filter = None, project_name_filter:str = None, with_payload = True) -> list:
+
+        collection = self.load_collection(collection_name=collection_name)
+        vectors = collection["vectors"]
+
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        mask = self.filter_mask(
+            collection=collection,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter
+        )
+
+        results = []
+
+        if collection["ivf"] is None:
+
+            # Exact search scores every query against the (optionally filtered) matrix in one product
+            rows = None if mask is None else np.flatnonzero(mask)
+            candidate_vectors = vectors if rows is None else vectors[rows]
+            score_matrix = candidate_vectors @ queries.T if len(candidate_vectors) else np.empty((0, len(queries)), dtype=np.float32)
+
+            for query_idx in range(len(queries)):
+                results.append(self.top_k_points(collection, score_matrix[:, query_idx], rows, top_k, with_payload))
+
+        else:
+
+            for query_vector in queries:
+                rows = self.candidate_rows(collection=collection, query_vector=query_vector, mask=mask)
+                scores = vectors[rows] @ query_vector if len(rows) else np.empty(0, dtype=np.float32)
+                results.append(self.top_k_points(collection, scores, rows, top_k, with_payload))
+
+        return results
+
+    def top_k_points(self, collection:dict, scores:np.ndarray, rows, top_k:int, with_payload = True) -> list:
+
+        if len(scores) == 0:
+            return []
+
+        k = min(top_k, len(scores))
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+        top_rows = top_idx if rows is None else rows[top_idx]
+
+        payloads = self.read_payloads(collection=collection, rows=[int(row) for row in top_rows])
+
+        return [
+            models.ScoredPoint(
+                id=point_id,
+                version=0,
+                score=float(score),
+                payload=self.select_payload(payload, with_payload)
+            )
+            for (point_id, payload), score in zip(payloads, scores[top_idx])
+        ]
+
+    @staticmethod
+    def select_payload(payload:dict, with_payload):
+
+        if with_payload is True:
+            return payload
+
+        if not with_payload:
+            return None
+
+        # Same dotted-key selectors as Qdrant's with_payload
+        selected = {}
+
+        for field in with_payload:
+
+            keys = field.split(".")
+            value = payload
+
+            for key in keys:
+                value = value.get(key) if isinstance(value, dict) else None
+
+            if value is None:
+                continue
+
+            target = selected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+
+        return selected
+
+    def read_payloads(self, collection:dict, rows:list) -> list:
+
+        placeholders = ",".join("?" * len(rows))
+        records = collection["payload_db"].execute(
+            f"SELECT row, point_id, payload FROM payloads WHERE row IN ({placeholders})",
+            rows
+        ).fetchall()
+
+        by_row = {row: (json.loads(point_id), json.loads(payload)) for row, point_id, payload in records}
+
+        return [by_row[row] for row in rows]
+
+    def query_vector_store(self, collection_name:str, query_vector: list, top_k:int = 5, with_payload = True, **search_options):
+        return self.search_batch(collection_name=collection_name, query_vectors=[query_vector], top_k=top_k, with_payload=with_payload)[0]
+
+    # The async variants run the NumPy scoring and SQLite payload reads in a worker thread, off the event loop
+
+    async def query_vector_store_async(self, collection_name:str, query_vector: list, top_k:int = 5, with_payload = True, **search_options):
+        return await asyncio.to_thread(self.query_vector_store, collection_name=collection_name, query_vector=query_vector, top_k=top_k, with_payload=with_payload)
+
+    def query_vector_store_with_filter(self, collection_name:str, query_vector: list, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, with_payload = True, **search_options):
+
+        return self.search_batch(
+            collection_name=collection_name,
+            query_vectors=[query_vector],
+            top_k=top_k,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter,
+            with_payload=with_payload
+        )[0]
+
+    async def query_vector_store_with_filter_async(self, collection_name:str, query_vector: list, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, with_payload = True, **search_options):
+
+        return await asyncio.to_thread(
+            self.query_vector_store_with_filter,
+            collection_name=collection_name,
+            query_vector=query_vector,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter,
+            top_k=top_k,
+            with_payload=with_payload
+        )
+
+    # Exact in-process search already costs less than a coarse pass, so two-stage queries search the full vector
+    def query_vector_store_two_stage(self, collection_name:str, query_vector: list, coarse_vector_size:int = None, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, with_payload = True, **search_options):
+
+        return self.query_vector_store_with_filter(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter,
+            top_k=top_k,
+            with_payload=with_payload
+        )
+
+    async def query_vector_store_two_stage_async(self, collection_name:str, query_vector: list, coarse_vector_size:int = None, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, with_payload = True, **search_options):
+
+        return await asyncio.to_thread(
+            self.query_vector_store_two_stage,
+            collection_name=collection_name,
+            query_vector=query_vector,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter,
+            top_k=top_k,
+            with_payload=with_payload
+        )
+
+    def query_vector_store_batch(self, collection_name:str, query_vectors:list, project_filters:list = None, top_k:int = 5, with_payload = True, **search_options) -> list:
+
+        project_filters = project_filters or [{}] * len(query_vectors)
+        filter_groups = {}
+
+        # search_batch takes one filter, so queries sharing a project filter are scored together
+        for idx, project_filter in enumerate(project_filters):
+            filter_key = (project_filter.get("project_code_filter"), project_filter.get("project_name_filter"))
+            filter_groups.setdefault(filter_key, []).append(idx)
+
+        results = [None] * len(query_vectors)
+
+        for (project_code_filter, project_name_filter), indices in filter_groups.items():
+
+            group_results = self.search_batch(
+                collection_name=collection_name,
+                query_vectors=[query_vectors[idx] for idx in indices],
+                top_k=top_k,
+                project_code_filter=project_code_filter,
+                project_name_filter=project_name_filter,
+                with_payload=with_payload
+            )
+
+            for idx, points in zip(indices, group_results):
+                results[idx] = points
+
+        return results
+
+    async def query_vector_store_batch_async(self, collection_name:str, query_vectors:list, project_filters:list = None, top_k:int = 5, with_payload = True, **search_options) -> list:
+
+        return await asyncio.to_thread(
+            self.query_vector_store_batch,
+            collection_name=collection_name,
+            query_vectors=query_vectors,
+            project_filters=project_filters,
+            top_k=top_k,
+            with_payload=with_payload
+        )
+
+    def scroll_project_metadata(self, collection_name:str, batch_size:int = 1000) -> list:
+
+        collection = self.load_collection(collection_name=collection_name)
+
+        projects = {
+            (project_code, project_name): {"project_code": project_code, "project_name": project_name}
+            for project_code, project_name in zip(collection["project_codes"], collection["project_names"])
+        }
+
+        return list(projects.values())
+
+    # The loader writes into the pending points, save_snapshot() persists them
+
+    def create_collection(self, collection_name:str, force_recreation: bool = False, **collection_options) -> bool:
+
+        self.restore_interrupted_swap(collection_name=collection_name)
+
+        snapshot_exists = os.path.exists(os.path.join(self.collection_dir(collection_name), "meta.json"))
+
+        if force_recreation or not snapshot_exists:
+            logger.info("Creating local vector store collection", collection=collection_name)
+            self.pending_points[collection_name] = {}
+            return True
+
+        self.pending_points[collection_name] = self.read_all_points(collection_name=collection_name)
+
+        return False
+
+    def create_keyword_filter_index(self, collection_name:str, field_name:str, field_schema:str = "keyword"):
+        # Project codes and names are always held in RAM for filtering
+        return None
+
+    def read_all_points(self, collection_name:str) -> dict:
+
+        collection = self.load_collection(collection_name=collection_name)
+        vectors = np.asarray(collection["vectors"])
+
+        points = {}
+
+        for row, point_id, payload in collection["payload_db"].execute("SELECT row, point_id, payload FROM payloads ORDER BY row"):
+            points[json.loads(point_id)] = (vectors[row], json.loads(payload))
+
+        return points
+
+    def ingest_data(self, collection_name:str, points:list):
+
+        collection_points = self.pending_points.setdefault(collection_name, {})
+
+        for point in points:
+
+            vector = point.vector[FULL_VECTOR_NAME] if isinstance(point.vector, dict) else point.vector
+            collection_points[point.id] = (np.asarray(vector, dtype=np.float32), point.payload)
+
+        return None
+
+    def upsert_batch(self, collection_name:str, points:list, wait:bool = False, max_retries:int = 3) -> int:
+
+        self.ingest_data(collection_name=collection_name, points=points)
+
+        return 0
+
+    def purge_legacy_points(self, collection_name:str, batch_size:int = 1000) -> int:
+
+        legacy_point_ids = [point_id for point_id in self.pending_points.setdefault(collection_name, {}) if isinstance(point_id, int)]
+        self.delete_points(collection_name=collection_name, point_ids=legacy_point_ids)
+
+        return len(legacy_point_ids)
+
+    def delete_points(self, collection_name:str, point_ids:list):
+
+        collection_points = self.pending_points.setdefault(collection_name, {})
+
+        for point_id in point_ids:
+            collection_points.pop(point_id, None)
+
+    def build_ivf(self, vectors:np.ndarray, iterations:int = 10, sample_size:int = 50000, seed:int = 42):
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.ivf_lists, replace=False)].copy()
+
+        # Spherical k-means, vectors and centroids are unit length so the dot product is the cosine similarity
+        for _ in range(iterations):
+
+            sample_assignments = np.argmax(sample @ centroids.T, axis=1)
+
+            for list_idx in range(self.ivf_lists):
+                members = sample[sample_assignments == list_idx]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[list_idx] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), 8192)
+        ]).astype(np.int32)
+
+        return centroids.astype(np.float32), assignments
+
+    def write_snapshot(self, collection_name:str, point_ids:list, vectors:np.ndarray, payloads:list):
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(point_ids), -1) if point_ids else np.zeros((0, 1), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        self.restore_interrupted_swap(collection_name=collection_name)
+
+        collection_dir = self.collection_dir(collection_name)
+        temp_dir = f"{collection_dir}.tmp"
+
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        np.save(os.path.join(temp_dir, "vectors.npy"), vectors)
+
+        payload_db = sqlite3.connect(os.path.join(temp_dir, "payloads.sqlite3"))
+        payload_db.execute("CREATE TABLE payloads (row INTEGER PRIMARY KEY, point_id TEXT NOT NULL, payload TEXT NOT NULL)")
+        payload_db.executemany(
+            "INSERT INTO payloads (row, point_id, payload) VALUES (?, ?, ?)",
+            ((row, json.dumps(point_id), json.dumps(payload)) for row, (point_id, payload) in enumerate(zip(point_ids, payloads)))
+        )
+        payload_db.commit()
+        payload_db.close()
+
+        use_ivf = self.ivf_lists > 0 and len(point_ids) >= max(self.ivf_min_points, self.ivf_lists)
+
+        if use_ivf:
+            centroids, assignments = self.build_ivf(vectors=vectors)
+            np.save(os.path.join(temp_dir, "ivf_centroids.npy"), centroids)
+            np.save(os.path.join(temp_dir, "ivf_assignments.npy"), assignments)
+
+        meta = {
+            "count": len(point_ids),
+            "dimensions": int(vectors.shape[1]) if len(point_ids) else 0,
+            "ivf_lists": self.ivf_lists if use_ivf else 0,
+            "project_codes": [str((payload.get("metadata") or {}).get("project_code") or "") for payload in payloads],
+            "project_names": [str((payload.get("metadata") or {}).get("project_name") or "") for payload in payloads]
+        }
+
+        with open(os.path.join(temp_dir, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        # Swap by rename so a complete snapshot exists at every step, the backup is only deleted once the new one is live
+        backup_dir = f"{collection_dir}.old"
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+        self.close_collection(collection_name=collection_name)
+
+        if os.path.exists(collection_dir):
+            os.rename(collection_dir, backup_dir)
+
+        os.rename(temp_dir, collection_dir)
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+        logger.info("Local vector store snapshot written", collection=collection_name, points=len(point_ids), path=collection_dir)
+
+    def save_snapshot(self, collection_name:str):
+
+        collection_points = self.pending_points.get(collection_name, {})
+
+        point_ids = list(collection_points.keys())
+        vectors = np.stack([vector for vector, _ in collection_points.values()]) if collection_points else None
+        payloads = [payload for _, payload in collection_points.values()]
+
+        self.write_snapshot(
+            collection_name=collection_name,
+            point_ids=point_ids,
+            vectors=vectors,
+            payloads=payloads
+        )
+
+    def export_from_qdrant(self, qdrant_helper:QdrantHelper, collection_name:str, batch_size:int = 1000):
+
+        logger.info("Exporting Qdrant collection to the local vector store", collection=collection_name)
+
+        point_ids, vectors, payloads = [], [], []
+        next_offset = None
+
+        while True:
+
+            records, next_offset = qdrant_helper.client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=next_offset,
+                with_payload=True,
+                with_vectors=True
+            )
+
+            for record in records:
+                vector = record.vector[FULL_VECTOR_NAME] if isinstance(record.vector, dict) else record.vector
+                point_ids.append(record.id)
+                vectors.append(vector)
+                payloads.append(record.payload)
+
+            if next_offset is None:
+                break
+
+        self.write_snapshot(
+            collection_name=collection_name,
+            point_ids=point_ids,
+            vectors=np.asarray(vectors, dtype=np.float32),
+            payloads=payloads
+        )
+
+    def close_collection(self, collection_name:str):
+
+        with self.lock:
+            collection = self.collections.pop(collection_name, None)
+
+        if collection is not None:
+            collection["payload_db"].close()
+
+    async def close_async(self):
+
+        for collection_name in list(self.collections):
+            self.close_collection(collection_name=collection_name)
@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+
+import numpy as np
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Mersenne prime modulus of the MinHash permutations, signatures are kept to 32 bits
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+class NearDuplicateIndex:
+
+    def __init__(self, db_path:str = ".cache/near_duplicates.sqlite3", namespace:str = "default", num_perm:int = 128, bands:int = 16, threshold:float = 0.9, shingle_size:int = 5, min_words:int = 20, seed:int = 1):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.lock = threading.Lock()
+        self.counters = {
+            "exact_hits": 0,
+            "near_hits": 0,
+            "misses": 0
+        }
+
+        # Fixed seed, so signatures stay comparable across runs and worker processes
+        rng = np.random.default_rng(seed)
+        self.permutation_a = rng.integers(1, int(MAX_HASH), size=num_perm, dtype=np.uint64)
+        self.permutation_b = rng.integers(0, int(MAX_HASH), size=num_perm, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id INTEGER PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                summary TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                source_point_id TEXT,
+                created_at REAL NOT NULL,
+                UNIQUE (namespace, text_hash)
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                namespace TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                band_hash TEXT NOT NULL,
+                page_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bands_by_hash ON bands (namespace, band, band_hash);
+            """
+        )
+
+        # The title each vector was embedded with, "" when it was embedded without one.
+        # Rows written before it was recorded keep NULL and only share their summary.
+        if "vector_title" not in {column[1] for column in self.connection.execute("PRAGMA table_info(pages)")}:
+            self.connection.execute("ALTER TABLE pages ADD COLUMN vector_title TEXT")
+
+        self.connection.commit()
+
+    @staticmethod
+    def normalized_words(text:str) -> list:
+        return WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+    def text_hash(self, words:list) -> str:
+        return hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+
+    def signature(self, words:list) -> np.ndarray:
+
+        if len(words) <= self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+        shingle_hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+        # One universal hash per permutation, the signature keeps the minimum over all shingles
+        permuted = (np.outer(self.permutation_a, shingle_hashes) + self.permutation_b[:, None]) % MERSENNE_PRIME
+
+        return (permuted & MAX_HASH).min(axis=1).astype(np.uint32)
+
+    def band_hashes(self, signature:np.ndarray) -> list:
+
+        return [
+            hashlib.blake2b(signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes(), digest_size=8).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def fingerprint(self, text:str) -> dict:
+
+        words = self.normalized_words(text)
+        signature = self.signature(words)
+
+        return {
+            "text_hash": self.text_hash(words),
+            "signature": signature,
+            "band_hashes": self.band_hashes(signature),
+            "near_matchable": len(words) >= self.min_words
+        }
+
+    def similarity(self, signature:np.ndarray, other_signature:np.ndarray) -> float:
+        return float(np.mean(signature == other_signature))
+
+    def match(self, fingerprint:dict, other_fingerprint:dict) -> bool:
+
+        if fingerprint["text_hash"] == other_fingerprint["text_hash"]:
+            return True
+
+        return fingerprint["near_matchable"] and other_fingerprint["near_matchable"] and self.similarity(fingerprint["signature"], other_fingerprint["signature"]) >= self.threshold
+
+    @staticmethod
+    def vector_usable(vector_title, title:str = None) -> bool:
+
+        # A vector embedded without a title fits every page, a title-conditioned one only pages embedded under that title
+        return vector_title is not None and vector_title in ("", title or "")
+
+    def row_result(self, row, title:str, similarity:float, match_type:str) -> dict:
+
+        summary, vector, source_point_id, vector_title = row
+
+        return {
+            "summary": summary,
+            "vector": array("f", vector).tolist() if self.vector_usable(vector_title, title) else None,
+            "source_point_id": source_point_id,
+            "similarity": similarity,
+            "match": match_type
+        }
+
+    def lookup(self, fingerprint:dict, title:str = None):
+
+        with self.lock:
+
+            row = self.connection.execute(
+                "SELECT summary, vector, source_point_id, vector_title FROM pages WHERE namespace = ? AND text_hash = ?",
+                (self.namespace, fingerprint["text_hash"])
+            ).fetchone()
+
+            if row is not None:
+                self.counters["exact_hits"] += 1
+                return self.row_result(row, title=title, similarity=1.0, match_type="exact")
+
+            if not fingerprint["near_matchable"]:
+                self.counters["misses"] += 1
+                return None
+
+            # Pages sharing at least one LSH band are candidates, their signatures decide
+            candidate_rows = self.connection.execute(
+                f"""
+                SELECT DISTINCT p.page_id, p.signature, p.summary, p.vector, p.source_point_id, p.vector_title
+                FROM bands b JOIN pages p ON p.page_id = b.page_id
+                WHERE b.namespace = ? AND ({' OR '.join('(b.band = ? AND b.band_hash = ?)' for _ in fingerprint['band_hashes'])})
+                """,
+                (self.namespace, *[value for band, band_hash in enumerate(fingerprint["band_hashes"]) for value in (band, band_hash)])
+            ).fetchall()
+
+            # Candidates whose vector this page can reuse rank ahead of more similar ones it cannot
+            best_row, best_rank = None, (False, 0.0)
+
+            for _, signature, summary, vector, source_point_id, vector_title in candidate_rows:
+
+                similarity = self.similarity(fingerprint["signature"], np.frombuffer(signature, dtype=np.uint32))
+                rank = (self.vector_usable(vector_title, title), similarity)
+
+                if similarity >= self.threshold and rank > best_rank:
+                    best_row, best_rank = (summary, vector, source_point_id, vector_title), rank
+
+            if best_row is None:
+                self.counters["misses"] += 1
+                return None
+
+            self.counters["near_hits"] += 1
+
+            return self.row_result(best_row, title=title, similarity=best_rank[1], match_type="near")
+
+    def add(self, fingerprint:dict, summary:str, vector:list, source_point_id:str = None, title:str = None):
+
+        with self.lock:
+
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO pages (namespace, text_hash, signature, summary, vector, source_point_id, vector_title, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, fingerprint["text_hash"], fingerprint["signature"].tobytes(), summary, array("f", vector).tobytes(), source_point_id, title or "", time.time())
+            )
+
+            if cursor.rowcount and fingerprint["near_matchable"]:
+                self.connection.executemany(
+                    "INSERT INTO bands (namespace, band, band_hash, page_id) VALUES (?, ?, ?, ?)",
+                    [(self.namespace, band, band_hash, cursor.lastrowid) for band, band_hash in enumerate(fingerprint["band_hashes"])]
+                )
+
+            # A vector every project can reuse replaces a title-conditioned or unrecorded one of the same text
+            if not cursor.rowcount:
+                self.connection.execute(
+                    "UPDATE pages SET vector = ?, source_point_id = ?, vector_title = ? WHERE namespace = ? AND text_hash = ? AND (vector_title IS NULL OR ? = '')",
+                    (array("f", vector).tobytes(), source_point_id, title or "", self.namespace, fingerprint["text_hash"], title or "")
+                )
+
+            self.connection.commit()
+
+    def stats(self) -> dict:
+
+        with self.lock:
+            return dict(self.counters)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,131 @@
+from commons.utils import BANNER_PATTERN, HelperUtils
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+class PageChunker:
+
+    def __init__(self, max_tokens:int = None, merge_below_tokens:int = None, max_banner_length:int = 1024):
+        self.max_tokens = max_tokens
+        self.merge_below_tokens = merge_below_tokens
+        self.max_banner_length = max_banner_length
+
+    def iter_raw_pages(self, content:str):
+
+        previous_match = None
+
+        for match in BANNER_PATTERN.finditer(content):
+
+            if previous_match is not None:
+                yield HelperUtils.banner_fields_from_match(previous_match), content[previous_match.end():match.start()].strip()
+
+            elif match.start() > 0 and content[:match.start()].strip():
+                logger.warning("Skipping text before the first page banner", characters=match.start())
+
+            previous_match = match
+
+        if previous_match is not None:
+            yield HelperUtils.banner_fields_from_match(previous_match), content[previous_match.end():].strip()
+
+    def iter_raw_pages_from_stream(self, content_stream):
+
+        buffer = ""
+        banner_fields = None
+
+        for text in content_stream:
+
+            buffer += text
+            consumed = 0
+
+            for match in BANNER_PATTERN.finditer(buffer):
+
+                if banner_fields is not None:
+                    yield banner_fields, buffer[consumed:match.start()].strip()
+
+                banner_fields = HelperUtils.banner_fields_from_match(match)
+                consumed = match.end()
+
+            buffer = buffer[consumed:]
+
+            # Text before the first banner is dropped, apart from a possibly incomplete banner at the end
+            if banner_fields is None and len(buffer) > self.max_banner_length:
+                buffer = buffer[-self.max_banner_length:]
+
+        if banner_fields is not None:
+            yield banner_fields, buffer.strip()
+
+    def split_page(self, banner_fields:dict, page_text:str):
+
+        if (not self.max_tokens) or (HelperUtils.estimate_tokens(page_text) <= self.max_tokens):
+            yield banner_fields, page_text
+            return
+
+        max_chars = self.max_tokens * 4
+        parts = []
+        current_part = ""
+
+        for paragraph in page_text.split("\n\n"):
+
+            # Paragraphs longer than the budget are cut at the closest whitespace
+            while len(paragraph) > max_chars:
+                cut = paragraph.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                parts.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:]
+
+            if current_part and len(current_part) + len(paragraph) + 2 > max_chars:
+                parts.append(current_part.strip())
+                current_part = ""
+
+            current_part = f"{current_part}\n\n{paragraph}" if current_part else paragraph
+
+        if current_part.strip():
+            parts.append(current_part.strip())
+
+        for chunk_index, part in enumerate(parts):
+            yield {**banner_fields, "chunk_index": chunk_index}, part
+
+    def merge_pages(self, pages):
+
+        pending = None
+
+        for banner_fields, page_text in pages:
+
+            if pending is not None:
+
+                pending_fields, pending_text = pending
+                merged_text = f"{pending_text}\n\n{page_text}"
+
+                same_document = (pending_fields["project_code"], pending_fields["filename"]) == (banner_fields["project_code"], banner_fields["filename"])
+                within_budget = (not self.max_tokens) or (HelperUtils.estimate_tokens(merged_text) <= self.max_tokens)
+
+                if same_document and within_budget and ("chunk_index" not in pending_fields) and ("chunk_index" not in banner_fields):
+                    pending = ({**pending_fields, "page_end": banner_fields["page_number"]}, merged_text)
+                else:
+                    yield pending
+                    pending = (banner_fields, page_text)
+
+            else:
+                pending = (banner_fields, page_text)
+
+            if HelperUtils.estimate_tokens(pending[1]) >= self.merge_below_tokens:
+                yield pending
+                pending = None
+
+        if pending is not None:
+            yield pending
+
+    def iter_pages(self, content:str = None, content_stream = None):
+
+        raw_pages = self.iter_raw_pages(content) if content_stream is None else self.iter_raw_pages_from_stream(content_stream)
+
+        pages = (
+            (banner_fields, page_part)
+            for banner_fields, page_text in raw_pages if page_text
+            for banner_fields, page_part in self.split_page(banner_fields, page_text)
+        )
+
+        if self.merge_below_tokens:
+            pages = self.merge_pages(pages)
+
+        yield from pages
@@ -0,0 +1,281 @@
+import os
+import re
+import json
+from difflib import SequenceMatcher
+from collections import deque
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# A bare number may be a year, a capacity or a clause, so only numbers introduced as a project code count on their own
+PROJECT_CODE_PATTERN = re.compile(r"\b(?:project|code|ppa|number)\s*(?:code|no|number|id)?\s*[.:#-]?\s*(\d{3,6})\b", re.IGNORECASE)
+
+class AhoCorasickAutomaton:
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add_pattern(self, pattern:str, value):
+
+        state = 0
+
+        for char in pattern:
+
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+
+            state = self.goto[state][char]
+
+        self.output[state].append((len(pattern), value))
+
+    def build(self):
+
+        queue = deque(self.goto[0].values())
+
+        while queue:
+
+            state = queue.popleft()
+
+            for char, next_state in self.goto[state].items():
+
+                queue.append(next_state)
+
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def search(self, text:str):
+
+        state = 0
+
+        for position, char in enumerate(text):
+
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+
+            state = self.goto[state].get(char, 0)
+
+            for pattern_length, value in self.output[state]:
+                yield position - pattern_length + 1, pattern_length, value
+
+class ProjectResolver:
+
+    def __init__(self, snapshot_path:str = ".cache/project_resolver.json", fuzzy_threshold:float = 0.85, min_fuzzy_length:int = 5):
+        self.snapshot_path = snapshot_path
+        self.fuzzy_threshold = fuzzy_threshold
+        self.min_fuzzy_length = min_fuzzy_length
+        self.snapshot_mtime = None
+        self.projects = []
+        self.load_projects(projects=[])
+
+    @staticmethod
+    def normalize_text(text:str) -> str:
+
+        text = text.lower().replace("&", " and ")
+        text = re.sub(r"[^a-z0-9]+", " ", text)
+
+        return f" {text.strip()} "
+
+    def name_aliases(self, project_name:str) -> set:
+
+        aliases = {self.normalize_text(project_name)}
+
+        # "Procter and Gamble (P&G)" => "procter and gamble" and "p and g"
+        for inner_text in re.findall(r"\(([^)]+)\)", project_name):
+            aliases.add(self.normalize_text(inner_text))
+
+        outer_text = re.sub(r"\([^)]*\)", " ", project_name)
+        aliases.add(self.normalize_text(outer_text))
+
+        return {alias for alias in aliases if alias.strip()}
+
+    def load_projects(self, projects:list):
+
+        self.projects = []
+        self.codes = {}
+        self.aliases = {}
+        self.automaton = AhoCorasickAutomaton()
+
+        seen = set()
+
+        for project in projects:
+
+            project_code = str(project.get("project_code") or "").strip()
+            project_name = str(project.get("project_name") or "").strip()
+
+            if (project_code, project_name) in seen:
+                continue
+
+            seen.add((project_code, project_name))
+            self.projects.append({"project_code": project_code, "project_name": project_name})
+
+            if project_code:
+                self.codes.setdefault(project_code, project_name)
+
+            if project_name:
+                for alias in self.name_aliases(project_name):
+                    self.aliases.setdefault(alias, {"project_code": project_code, "project_name": project_name})
+
+        for alias, project in self.aliases.items():
+            self.automaton.add_pattern(alias, project)
+
+        self.automaton.build()
+
+        logger.info("Project resolver loaded", projects=len(self.projects))
+
+    def build_from_qdrant(self, qdrant_helper, collection_name:str):
+
+        projects = qdrant_helper.scroll_project_metadata(collection_name=collection_name)
+
+        self.load_projects(projects=projects)
+
+        return self
+
+    def save_snapshot(self):
+
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w") as snapshot_file:
+            json.dump({"projects": self.projects}, snapshot_file)
+
+        os.replace(temp_path, self.snapshot_path)
+        self.snapshot_mtime = os.path.getmtime(self.snapshot_path)
+
+        logger.info("Project resolver snapshot saved", snapshot_path=self.snapshot_path)
+
+    def load_snapshot(self) -> bool:
+
+        if not os.path.exists(self.snapshot_path):
+            return False
+
+        snapshot_mtime = os.path.getmtime(self.snapshot_path)
+
+        with open(self.snapshot_path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+
+        self.load_projects(projects=snapshot.get("projects", []))
+        self.snapshot_mtime = snapshot_mtime
+
+        return True
+
+    def refresh_if_stale(self) -> bool:
+
+        try:
+            snapshot_mtime = os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return False
+
+        if snapshot_mtime == self.snapshot_mtime:
+            return False
+
+        return self.load_snapshot()
+
+    def match_name(self, normalized_query:str):
+
+        best_match = None
+
+        for start, length, project in self.automaton.search(normalized_query):
+
+            # Patterns are padded with spaces, so every hit sits on word boundaries
+            if (best_match is None) or (length > best_match[0]):
+                best_match = (length, project)
+
+        if best_match:
+            return best_match[1], 1.0
+
+        return self.fuzzy_match_name(normalized_query=normalized_query)
+
+    def fuzzy_match_name(self, normalized_query:str):
+
+        query_tokens = normalized_query.split()
+        best_match = (None, 0.0)
+
+        for alias, project in self.aliases.items():
+
+            alias_text = alias.strip()
+            if len(alias_text) < self.min_fuzzy_length:
+                continue
+
+            alias_token_count = len(alias_text.split())
+            matcher = SequenceMatcher(b=alias_text, autojunk=False)
+
+            for window_size in {max(1, alias_token_count - 1), alias_token_count, alias_token_count + 1}:
+
+                for idx in range(0, max(0, len(query_tokens) - window_size) + 1):
+
+                    matcher.set_seq1(" ".join(query_tokens[idx:idx + window_size]))
+
+                    if matcher.real_quick_ratio() < self.fuzzy_threshold or matcher.quick_ratio() < self.fuzzy_threshold:
+                        continue
+
+                    score = matcher.ratio()
+                    if score >= self.fuzzy_threshold and score > best_match[1]:
+                        best_match = (project, score)
+
+        return best_match
+
+    def match_code(self, user_query:str):
+
+        for project_code in PROJECT_CODE_PATTERN.findall(user_query):
+            if project_code in self.codes:
+                return project_code
+
+        return None
+
+    def metadata_details(self, project_code:str, project_name:str, score:float, matched_on:str) -> dict:
+
+        return {
+            "project_code": int(project_code) if project_code.isdigit() else -1,
+            "project_name": project_name,
+            "match_score": round(score, 3),
+            "matched_on": matched_on
+        }
+
+    def resolve(self, user_query:str):
+
+        # Same shape as the LLM metadata extraction task, or None when nothing matches
+        project_code = self.match_code(user_query=user_query)
+
+        if project_code is not None:
+            # An explicit project code wins over any name match
+            return self.metadata_details(project_code, self.codes[project_code], 1.0, "code")
+
+        project, score = self.match_name(normalized_query=self.normalize_text(user_query))
+
+        if project is None:
+            return None
+
+        # A bare number only confirms the code of the project the name already matched
+        if project["project_code"] and project["project_code"] in re.findall(r"\b\d{3,6}\b", user_query):
+            return self.metadata_details(project["project_code"], project["project_name"], 1.0, "code")
+
+        return self.metadata_details(project["project_code"], project["project_name"], score, "name")
+
+    def canonicalize(self, metadata_details:dict):
+
+        # Map the LLM's extracted metadata onto a known project, or None when it isn't one
+        project_code = str(metadata_details.get("project_code") or "")
+
+        if project_code in self.codes:
+            return self.metadata_details(project_code, self.codes[project_code], 1.0, "code")
+
+        project_name = metadata_details.get("project_name") or ""
+        project = self.aliases.get(self.normalize_text(project_name)) if project_name.strip() else None
+
+        if project is None:
+            return None
+
+        return self.metadata_details(project["project_code"], project["project_name"], 1.0, "name")
@@ -1,89 +1,527 @@
-from qdrant_client import QdrantClient
+import os
+import time
+import httpx
+import random
+import threading
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
+from commons.utils import HelperUtils
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Storage profiles for create_collection, trading memory per point against recall
+COLLECTION_PROFILES = {
+    "float32": {"quantization": None, "on_disk": False, "on_disk_payload": False},
+    "scalar_int8": {"quantization": "scalar", "on_disk": True, "on_disk_payload": True},
+    "binary": {"quantization": "binary", "on_disk": True, "on_disk_payload": True}
+}
+
+# Named vectors of collections created with a reduced-dimension (Matryoshka) coarse vector
+FULL_VECTOR_NAME = "full"
+COARSE_VECTOR_NAME = "coarse"
+
+# Clients are pooled per process and connection settings, so every helper built
+# with the same settings reuses one HTTP connection pool or gRPC channel
+SHARED_CLIENTS = {}
+SHARED_CLIENTS_LOCK = threading.Lock()
+
+def grpc_channel_options(keepalive_seconds:float = 30, keepalive_timeout_seconds:float = 10) -> dict:
+
+    return {
+        # Pings keep idle channels open through load balancers between bursts of queries
+        "grpc.keepalive_time_ms": int(keepalive_seconds * 1000),
+        "grpc.keepalive_timeout_ms": int(keepalive_timeout_seconds * 1000),
+        "grpc.keepalive_permit_without_calls": 1,
+        "grpc.http2.max_pings_without_data": 0,
+        # Upsert batches of full-size vectors exceed gRPC's 4 MB default message size
+        "grpc.max_send_message_length": -1,
+        "grpc.max_receive_message_length": -1
+    }
+
+def client_options(url:str, api_key:str, prefer_grpc:bool = False, grpc_port:int = 6334, timeout:int = None, keepalive_seconds:float = 30, max_connections:int = 32) -> dict:
+
+    options = {
+        "url": url,
+        "api_key": api_key,
+        "prefer_grpc": prefer_grpc,
+        "grpc_port": grpc_port,
+        "timeout": timeout
+    }
+
+    if prefer_grpc:
+        options["grpc_options"] = grpc_channel_options(keepalive_seconds=keepalive_seconds)
+    else:
+        # qdrant-client turns keep-alive off for localhost, reused connections skip the TCP and TLS handshakes
+        options["limits"] = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_seconds
+        )
+
+    return options
+
+def acquire_shared_clients(**options) -> tuple:
+
+    key = tuple(sorted(options.items()))
+
+    with SHARED_CLIENTS_LOCK:
+
+        if key not in SHARED_CLIENTS:
+            connection_options = client_options(**options)
+            SHARED_CLIENTS[key] = [QdrantClient(**connection_options), AsyncQdrantClient(**connection_options), 0]
+
+        SHARED_CLIENTS[key][2] += 1
+
+        return key, SHARED_CLIENTS[key][0], SHARED_CLIENTS[key][1]
+
+def release_shared_clients(key:tuple) -> bool:
+
+    with SHARED_CLIENTS_LOCK:
+
+        SHARED_CLIENTS[key][2] -= 1
+
+        if SHARED_CLIENTS[key][2] > 0:
+            return False
+
+        SHARED_CLIENTS.pop(key)
+
+        return True
+
 class QdrantHelper:
 
-    def __init__(self, url:str, api_key:str):
-        self.client = QdrantClient(url=url, api_key=api_key)
+    def __init__(self, url:str, api_key:str, prefer_grpc:bool = False, grpc_port:int = 6334, timeout:int = None, keepalive_seconds:float = 30, max_connections:int = 32):
+        self.prefer_grpc = prefer_grpc
+        self.shared_clients_key, self.client, self.async_client = acquire_shared_clients(
+            url=url,
+            api_key=api_key,
+            prefer_grpc=prefer_grpc,
+            grpc_port=grpc_port,
+            timeout=timeout,
+            keepalive_seconds=keepalive_seconds,
+            max_connections=max_connections
+        )
+
+    @classmethod
+    def from_env(cls, url:str, api_key:str):
+
+        # Transport options shared by the API server and the loader scripts.
+        # gRPC avoids JSON-encoding every vector; clients are pooled per process.
+        return cls(
+            url=url,
+            api_key=api_key,
+            prefer_grpc=os.getenv('QDRANT_PREFER_GRPC', 'False').strip().lower() in ('1', 'true', 'yes'),
+            grpc_port=int(os.getenv('QDRANT_GRPC_PORT', '6334')),
+            timeout=int(os.getenv('QDRANT_TIMEOUT_SECONDS', '0')) or None,
+            keepalive_seconds=float(os.getenv('QDRANT_KEEPALIVE_SECONDS', '30')),
+            max_connections=int(os.getenv('QDRANT_MAX_CONNECTIONS', '32'))
+        )
+
+    async def close_async(self):
+
+        # The pooled clients are closed once the last helper sharing them is done
+        if release_shared_clients(self.shared_clients_key):
+            await self.async_client.close()
+            self.client.close()
 
-    def query_vector_store(self, collection_name:str, query_vector: list, top_k:int = 5):
+    def search_params(self, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None):
 
-        print(f"\nQuerying Qdrant collection '{collection_name}' with top_k={top_k} ...")
+        if hnsw_ef is None and rescore is None and oversampling is None:
+            return None
+
+        return models.SearchParams(
+            hnsw_ef=hnsw_ef,
+            quantization=models.QuantizationSearchParams(
+                rescore=rescore,
+                oversampling=oversampling
+            ) if (rescore is not None or oversampling is not None) else None
+        )
+
+    def query_vector_store(self, collection_name:str, query_vector: list, top_k:int = 5, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        logger.debug("Querying Qdrant collection", collection=collection_name, top_k=top_k)
 
         documents = self.client.search(
             collection_name=collection_name,
             query_vector=query_vector,
-            limit=top_k
+            limit=top_k,
+            search_params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling),
+            with_payload=with_payload
         )
 
-        print(f"\nQdrant returned {len(documents)} document results.\n")
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(documents))
+
+        return documents
+
+    async def query_vector_store_async(self, collection_name:str, query_vector: list, top_k:int = 5, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        logger.debug("Querying Qdrant collection", collection=collection_name, top_k=top_k, mode="async")
+
+        documents = await self.async_client.search(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            limit=top_k,
+            search_params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling),
+            with_payload=with_payload
+        )
+
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(documents))
 
         return documents
     
-    def query_vector_store_with_filter(self, collection_name:str, query_vector: list, project_code_filter:str = "", project_name_filter:str = "", top_k:int = 5):
+    def project_filter(self, project_code_filter = None, project_name_filter:str = None):
+
+        must_conditions = []
+
+        # -1, empty strings and None mean the value wasn't found in the user's query
+        if project_code_filter not in (None, "", -1, "-1"):
+            must_conditions.append(
+                FieldCondition(
+                    key='metadata.project_code',
+                    match=MatchValue(value=str(project_code_filter))
+                )
+            )
+
+        if project_name_filter:
+            must_conditions.append(
+                FieldCondition(
+                    key='metadata.project_name',
+                    match=MatchValue(value=project_name_filter)
+                )
+            )
+
+        if not must_conditions:
+            return None
+
+        return Filter(must=must_conditions)
+
+    def query_vector_store_with_filter(self, collection_name:str, query_vector: list, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        query_filter = self.project_filter(
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter
+        )
+
+        logger.debug("Querying Qdrant collection", collection=collection_name, top_k=top_k, query_filter=query_filter)
 
         documents = self.client.search(
             collection_name=collection_name,
             query_vector=query_vector,
-            query_filter=Filter(
-                should=[
-                    FieldCondition(
-                        key='metadata.project_code',
-                        match=MatchValue(value=project_code_filter)
-                    ),
-                    FieldCondition(
-                        key='metadata.project_name',
-                        match=MatchValue(value=project_name_filter)
-                    )
-                ]
-            ),
-            limit=top_k
+            query_filter=query_filter,
+            limit=top_k,
+            search_params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling),
+            with_payload=with_payload
         )
 
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(documents))
+
         return documents
 
-    def point_object(self, index:int, embedding_vector:list, text_chunk:str, metadata:dict) -> models.PointStruct:
+    async def query_vector_store_with_filter_async(self, collection_name:str, query_vector: list, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        query_filter = self.project_filter(
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter
+        )
+
+        logger.debug("Querying Qdrant collection", collection=collection_name, top_k=top_k, query_filter=query_filter, mode="async")
+
+        documents = await self.async_client.search(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            query_filter=query_filter,
+            limit=top_k,
+            search_params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling),
+            with_payload=with_payload
+        )
+
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(documents))
+
+        return documents
+
+    def two_stage_query(self, query_vector:list, coarse_query_vector:list, query_filter, top_k:int, candidates:int, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True) -> dict:
+
+        # Coarse search on the small vector, then re-rank the candidates with the full vector
+        return {
+            "prefetch": models.Prefetch(
+                query=coarse_query_vector,
+                using=COARSE_VECTOR_NAME,
+                filter=query_filter,
+                limit=max(candidates, top_k),
+                params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling)
+            ),
+            "query": query_vector,
+            "using": FULL_VECTOR_NAME,
+            "query_filter": query_filter,
+            "limit": top_k,
+            "with_payload": with_payload
+        }
+
+    def query_vector_store_two_stage(self, collection_name:str, query_vector: list, coarse_vector_size:int, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, candidate_multiplier:int = 8, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        query_filter = self.project_filter(
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter
+        )
+
+        logger.debug("Two-stage query of Qdrant collection", collection=collection_name, top_k=top_k, query_filter=query_filter)
+
+        response = self.client.query_points(
+            collection_name=collection_name,
+            **self.two_stage_query(
+                query_vector=query_vector,
+                coarse_query_vector=HelperUtils.truncate_embedding(query_vector, coarse_vector_size),
+                query_filter=query_filter,
+                top_k=top_k,
+                candidates=top_k * candidate_multiplier,
+                hnsw_ef=hnsw_ef,
+                rescore=rescore,
+                oversampling=oversampling,
+                with_payload=with_payload
+            )
+        )
+
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(response.points))
+
+        return response.points
+
+    async def query_vector_store_two_stage_async(self, collection_name:str, query_vector: list, coarse_vector_size:int, project_code_filter = None, project_name_filter:str = None, top_k:int = 5, candidate_multiplier:int = 8, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True):
+
+        query_filter = self.project_filter(
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter
+        )
+
+        logger.debug("Two-stage query of Qdrant collection", collection=collection_name, top_k=top_k, query_filter=query_filter, mode="async")
+
+        response = await self.async_client.query_points(
+            collection_name=collection_name,
+            **self.two_stage_query(
+                query_vector=query_vector,
+                coarse_query_vector=HelperUtils.truncate_embedding(query_vector, coarse_vector_size),
+                query_filter=query_filter,
+                top_k=top_k,
+                candidates=top_k * candidate_multiplier,
+                hnsw_ef=hnsw_ef,
+                rescore=rescore,
+                oversampling=oversampling,
+                with_payload=with_payload
+            )
+        )
+
+        logger.debug("Qdrant query completed", collection=collection_name, results=len(response.points))
+
+        return response.points
+
+    def query_request(self, query_vector:list, query_filter, top_k:int, coarse_vector_size:int = None, candidate_multiplier:int = 8, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True) -> models.QueryRequest:
+
+        if not coarse_vector_size:
+            return models.QueryRequest(
+                query=query_vector,
+                filter=query_filter,
+                limit=top_k,
+                params=self.search_params(hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling),
+                with_payload=with_payload
+            )
+
+        two_stage_query = self.two_stage_query(
+            query_vector=query_vector,
+            coarse_query_vector=HelperUtils.truncate_embedding(query_vector, coarse_vector_size),
+            query_filter=query_filter,
+            top_k=top_k,
+            candidates=top_k * candidate_multiplier,
+            hnsw_ef=hnsw_ef,
+            rescore=rescore,
+            oversampling=oversampling,
+            with_payload=with_payload
+        )
+
+        return models.QueryRequest(
+            prefetch=two_stage_query["prefetch"],
+            query=two_stage_query["query"],
+            using=two_stage_query["using"],
+            filter=two_stage_query["query_filter"],
+            limit=two_stage_query["limit"],
+            with_payload=two_stage_query["with_payload"]
+        )
+
+    def query_batch_requests(self, query_vectors:list, project_filters:list = None, **request_options) -> list:
+
+        project_filters = project_filters or [{}] * len(query_vectors)
+
+        return [
+            self.query_request(
+                query_vector=query_vector,
+                query_filter=self.project_filter(**project_filter),
+                **request_options
+            )
+            for query_vector, project_filter in zip(query_vectors, project_filters)
+        ]
+
+    def query_vector_store_batch(self, collection_name:str, query_vectors:list, project_filters:list = None, top_k:int = 5, coarse_vector_size:int = None, candidate_multiplier:int = 8, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True) -> list:
+
+        logger.debug("Batch querying Qdrant collection", collection=collection_name, queries=len(query_vectors), top_k=top_k)
+
+        # One round trip for every query, each with its own project filter
+        responses = self.client.query_batch_points(
+            collection_name=collection_name,
+            requests=self.query_batch_requests(
+                query_vectors=query_vectors,
+                project_filters=project_filters,
+                top_k=top_k,
+                coarse_vector_size=coarse_vector_size,
+                candidate_multiplier=candidate_multiplier,
+                hnsw_ef=hnsw_ef,
+                rescore=rescore,
+                oversampling=oversampling,
+                with_payload=with_payload
+            )
+        )
+
+        logger.debug("Qdrant batch query completed", collection=collection_name, queries=len(responses), results=sum(len(response.points) for response in responses))
+
+        return [response.points for response in responses]
+
+    async def query_vector_store_batch_async(self, collection_name:str, query_vectors:list, project_filters:list = None, top_k:int = 5, coarse_vector_size:int = None, candidate_multiplier:int = 8, hnsw_ef:int = None, rescore:bool = None, oversampling:float = None, with_payload = True) -> list:
+
+        logger.debug("Batch querying Qdrant collection", collection=collection_name, queries=len(query_vectors), top_k=top_k, mode="async")
+
+        responses = await self.async_client.query_batch_points(
+            collection_name=collection_name,
+            requests=self.query_batch_requests(
+                query_vectors=query_vectors,
+                project_filters=project_filters,
+                top_k=top_k,
+                coarse_vector_size=coarse_vector_size,
+                candidate_multiplier=candidate_multiplier,
+                hnsw_ef=hnsw_ef,
+                rescore=rescore,
+                oversampling=oversampling,
+                with_payload=with_payload
+            )
+        )
+
+        logger.debug("Qdrant batch query completed", collection=collection_name, queries=len(responses), results=sum(len(response.points) for response in responses))
+
+        return [response.points for response in responses]
+
+    def point_object(self, index:int | str, embedding_vector:list, text_chunk:str, metadata:dict, coarse_vector_size:int = None, content_ref:dict = None) -> models.PointStruct:
+
+        vector = embedding_vector
+
+        if coarse_vector_size:
+            vector = {
+                FULL_VECTOR_NAME: embedding_vector,
+                COARSE_VECTOR_NAME: HelperUtils.truncate_embedding(embedding_vector, coarse_vector_size)
+            }
+
+        payload = {
+            "metadata": {
+                "project_code": metadata["project_code"],
+                "project_name": metadata["project_name"],
+                "filename": metadata["filename"],
+                "page_number": metadata.get("page_number"),
+                "page_end": metadata.get("page_end"),
+                "chunk_index": metadata.get("chunk_index"),
+                "summary": metadata["summary"]
+            }
+        }
+
+        # With an external content store the payload only points at the page text
+        if content_ref is not None:
+            payload["content_ref"] = content_ref
+        else:
+            payload["content"] = text_chunk
 
         point = models.PointStruct(
             id=index,
-            vector=embedding_vector,
-            payload={
-                "content": text_chunk,
-                "metadata": {
-                    "project_code": metadata["project_code"],
-                    "project_name": metadata["project_name"],
-                    "filename": metadata["filename"],
-                    "summary": metadata["summary"]
-                }
-            }
+            vector=vector,
+            payload=payload
         )
 
         return point
     
-    def create_collection(self, collection_name:str, vector_size:int = 1536, force_recreation: bool = False):
+    def quantization_config(self, profile:str):
+
+        quantization = COLLECTION_PROFILES[profile]["quantization"]
+
+        if quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
+            )
+
+        if quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+
+        return None
+
+    def vectors_config(self, vector_size:int, profile:str, coarse_vector_size:int = None):
+
+        full_vector_params = models.VectorParams(
+            size=vector_size,
+            distance=models.Distance.COSINE,
+            on_disk=COLLECTION_PROFILES[profile]["on_disk"]
+        )
+
+        if not coarse_vector_size:
+            return full_vector_params
+
+        # The coarse vector is searched first, so it always stays in RAM
+        return {
+            FULL_VECTOR_NAME: full_vector_params,
+            COARSE_VECTOR_NAME: models.VectorParams(
+                size=coarse_vector_size,
+                distance=models.Distance.COSINE,
+                on_disk=False
+            )
+        }
+
+    def create_collection(self, collection_name:str, vector_size:int = 1536, force_recreation: bool = False, profile:str = "float32", hnsw_m:int = None, hnsw_ef_construct:int = None, coarse_vector_size:int = None):
+
+        if profile not in COLLECTION_PROFILES:
+            raise ValueError(f"Unknown collection profile '{profile}', expected one of {list(COLLECTION_PROFILES)}.")
 
         if (force_recreation) or (not self.client.collection_exists(collection_name)):
 
-            print(f"\nCreating Qdrant collection '{collection_name}' ... ")
+            logger.info("Creating Qdrant collection", collection=collection_name, profile=profile)
 
+            # Quantized profiles keep the compressed vectors in RAM and the originals on disk for rescoring
             self.client.recreate_collection(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=vector_size,
-                    distance=models.Distance.COSINE
-                )
+                vectors_config=self.vectors_config(
+                    vector_size=vector_size,
+                    profile=profile,
+                    coarse_vector_size=coarse_vector_size
+                ),
+                quantization_config=self.quantization_config(profile=profile),
+                hnsw_config=models.HnswConfigDiff(
+                    m=hnsw_m,
+                    ef_construct=hnsw_ef_construct
+                ) if (hnsw_m or hnsw_ef_construct) else None,
+                on_disk_payload=COLLECTION_PROFILES[profile]["on_disk_payload"]
             )
 
-            print(f"\nCollection '{collection_name}' created.\n")
+            logger.info("Qdrant collection created", collection=collection_name)
+
+            return True
 
         else:
 
-            print(f"\nQdrant collection '{collection_name}' already exists. Skipping creation.\n")
+            logger.info("Qdrant collection already exists, skipping creation", collection=collection_name)
+
+            return False
 
     def create_keyword_filter_index(self, collection_name:str, field_name:str, field_schema:str = "keyword"):
 
-        print(f"\nCreating keyword filter index on field '{field_name}' ... ")
+        logger.info("Creating keyword filter index", collection=collection_name, field_name=field_name)
 
         self.client.create_payload_index(
             collection_name=collection_name,
@@ -91,19 +529,112 @@ class QdrantHelper:
             field_schema=field_schema
         )
 
-        print("\nKeyword filter index created.\n")
+        logger.info("Keyword filter index created", collection=collection_name, field_name=field_name)
+
+    def scroll_project_metadata(self, collection_name:str, batch_size:int = 1000) -> list:
+
+        logger.info("Reading project metadata from Qdrant collection", collection=collection_name)
+
+        projects = {}
+        next_offset = None
+
+        while True:
+
+            records, next_offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=next_offset,
+                with_payload=["metadata.project_code", "metadata.project_name"],
+                with_vectors=False
+            )
+
+            for record in records:
+                metadata = (record.payload or {}).get("metadata", {})
+                project_key = (metadata.get("project_code"), metadata.get("project_name"))
+                projects[project_key] = {
+                    "project_code": metadata.get("project_code"),
+                    "project_name": metadata.get("project_name")
+                }
+
+            if next_offset is None:
+                break
+
+        logger.info("Project metadata read", collection=collection_name, projects=len(projects))
+
+        return list(projects.values())
 
     def ingest_data(self, collection_name:str, points:list):
 
-        print(f"Uploading {len(points)} points into Qdrant collection '{collection_name}' ... ")
+        logger.info("Uploading points into Qdrant collection", collection=collection_name, points=len(points))
 
         operation_info =  self.client.upsert(
             collection_name=collection_name,
             points=points
         )
 
-        print("\nUpload complete: ")
-        print(operation_info)
-        print("\n")
+        logger.info("Upload complete", collection=collection_name, operation_info=operation_info)
+
+        return operation_info
+
+    def upsert_batch(self, collection_name:str, points:list, wait:bool = False, max_retries:int = 3) -> int:
+
+        for attempt in range(max_retries + 1):
+
+            try:
+
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=points,
+                    wait=wait
+                )
+
+                return attempt
+
+            except Exception as ex:
+
+                if attempt >= max_retries:
+                    raise
+
+                backoff = random.uniform(0, min(30.0, 2 ** attempt))
+                logger.warning("Qdrant upsert failed, retrying", collection=collection_name, points=len(points), error=str(ex), backoff_seconds=round(backoff, 2), attempt=attempt + 1, max_retries=max_retries)
+                time.sleep(backoff)
+
+    def purge_legacy_points(self, collection_name:str, batch_size:int = 1000) -> int:
+
+        # Collections loaded before the manifest existed use sequential integer IDs, the loader now writes UUIDs
+        legacy_point_ids = []
+        next_offset = None
+
+        while True:
+
+            records, next_offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=next_offset,
+                with_payload=False,
+                with_vectors=False
+            )
+
+            legacy_point_ids.extend(record.id for record in records if isinstance(record.id, int))
+
+            if next_offset is None:
+                break
+
+        for start in range(0, len(legacy_point_ids), batch_size):
+            self.delete_points(collection_name=collection_name, point_ids=legacy_point_ids[start:start + batch_size])
+
+        return len(legacy_point_ids)
+
+    def delete_points(self, collection_name:str, point_ids:list):
+
+        if not point_ids:
+            return None
+
+        logger.info("Deleting points from Qdrant collection", collection=collection_name, points=len(point_ids))
+
+        operation_info = self.client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=list(point_ids))
+        )
 
-        return operation_info
\ No newline at end of file
+        return operation_info
@@ -0,0 +1,255 @@
+import time
+import random
+import asyncio
+import contextlib
+import threading
+
+import httpx
+from google.genai import errors
+
+from commons.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Requests per minute for each model, kept below the project's Vertex AI quota
+DEFAULT_MODEL_REQUESTS_PER_MINUTE = {
+    "gemini-2.5-flash-lite": 600,
+    "gemini-2.5-flash": 300,
+    "gemini-embedding-001": 600
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+
+    def __init__(self, requests_per_minute:float, burst:int = None, min_rate_fraction:float = 0.1, recovery_fraction:float = 0.05):
+        self.base_rate = requests_per_minute / 60.0
+        self.rate = self.base_rate
+        self.min_rate = self.base_rate * min_rate_fraction
+        self.recovery_step = self.base_rate * recovery_fraction
+        self.capacity = burst or max(1, int(self.base_rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+
+        # Reserve a token now and return how long the caller has to wait before using it
+        with self.lock:
+
+            self.refill()
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def try_acquire(self) -> float:
+
+        # Take a token only when one is available, otherwise return how long until the next one
+        with self.lock:
+
+            self.refill()
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+
+            return (1 - self.tokens) / self.rate
+
+    def on_throttled(self):
+
+        with self.lock:
+            self.refill()
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+
+        with self.lock:
+            self.refill()
+            self.rate = min(self.base_rate, self.rate + self.recovery_step)
+
+class RateLimiter:
+
+    def __init__(self, model_requests_per_minute:dict = None, max_concurrency:int = 8, max_retries:int = 5, base_backoff_seconds:float = 1.0, max_backoff_seconds:float = 60.0):
+        self.model_requests_per_minute = {**DEFAULT_MODEL_REQUESTS_PER_MINUTE, **(model_requests_per_minute or {})}
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.buckets = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.thread_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.async_semaphore = asyncio.Semaphore(max_concurrency)
+
+    def bucket(self, model:str) -> TokenBucket:
+
+        with self.lock:
+
+            if model not in self.buckets:
+                self.buckets[model] = TokenBucket(
+                    requests_per_minute=self.model_requests_per_minute.get(model, 300)
+                )
+                self.metrics[model] = {
+                    "requests": 0,
+                    "retries": 0,
+                    "throttled": 0,
+                    "failures": 0,
+                    "rate_limit_wait_seconds": 0.0,
+                    "concurrency_wait_seconds": 0.0,
+                    "backoff_wait_seconds": 0.0
+                }
+
+            return self.buckets[model]
+
+    def record(self, model:str, metric:str, value:float = 1):
+
+        with self.lock:
+            self.metrics[model][metric] += value
+
+    @staticmethod
+    def is_throttled(ex:Exception) -> bool:
+        return isinstance(ex, errors.APIError) and ex.code == 429
+
+    @staticmethod
+    def is_retryable(ex:Exception) -> bool:
+
+        if isinstance(ex, errors.APIError):
+            return ex.code in RETRYABLE_STATUS_CODES
+
+        return isinstance(ex, httpx.TransportError)
+
+    def backoff_seconds(self, attempt:int) -> float:
+
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt)))
+
+    def handle_failure(self, model:str, bucket:TokenBucket, ex:Exception, attempt:int) -> float:
+
+        if (not self.is_retryable(ex)) or (attempt >= self.max_retries):
+            self.record(model, "failures")
+            raise ex
+
+        if self.is_throttled(ex):
+            self.record(model, "throttled")
+            bucket.on_throttled()
+
+        backoff = self.backoff_seconds(attempt=attempt)
+
+        self.record(model, "retries")
+        self.record(model, "backoff_wait_seconds", backoff)
+
+        logger.warning("Vertex AI request failed, retrying", model=model, error=str(ex), backoff_seconds=round(backoff, 2), attempt=attempt + 1, max_retries=self.max_retries)
+
+        return backoff
+
+    def call(self, model:str, request):
+
+        bucket = self.bucket(model=model)
+
+        for attempt in range(self.max_retries + 1):
+
+            rate_limit_wait = bucket.reserve()
+            if rate_limit_wait > 0:
+                self.record(model, "rate_limit_wait_seconds", rate_limit_wait)
+                time.sleep(rate_limit_wait)
+
+            waiting_since = time.monotonic()
+
+            with self.thread_semaphore:
+
+                self.record(model, "concurrency_wait_seconds", time.monotonic() - waiting_since)
+                self.record(model, "requests")
+
+                try:
+                    result = request()
+                except Exception as ex:
+                    backoff = self.handle_failure(model=model, bucket=bucket, ex=ex, attempt=attempt)
+                else:
+                    bucket.on_success()
+                    return result
+
+            time.sleep(backoff)
+
+    async def call_async(self, model:str, request):
+
+        bucket = self.bucket(model=model)
+
+        for attempt in range(self.max_retries + 1):
+
+            rate_limit_wait = bucket.reserve()
+            if rate_limit_wait > 0:
+                self.record(model, "rate_limit_wait_seconds", rate_limit_wait)
+                await asyncio.sleep(rate_limit_wait)
+
+            waiting_since = time.monotonic()
+
+            async with self.async_semaphore:
+
+                self.record(model, "concurrency_wait_seconds", time.monotonic() - waiting_since)
+                self.record(model, "requests")
+
+                try:
+                    result = await request()
+                except Exception as ex:
+                    backoff = self.handle_failure(model=model, bucket=bucket, ex=ex, attempt=attempt)
+                else:
+                    bucket.on_success()
+                    return result
+
+            await asyncio.sleep(backoff)
+
+    async def call_stream_async(self, model:str, request):
+
+        bucket = self.bucket(model=model)
+
+        for attempt in range(self.max_retries + 1):
+
+            rate_limit_wait = bucket.reserve()
+            if rate_limit_wait > 0:
+                self.record(model, "rate_limit_wait_seconds", rate_limit_wait)
+                await asyncio.sleep(rate_limit_wait)
+
+            waiting_since = time.monotonic()
+
+            # The slot is held until the stream is exhausted or closed, only opening the stream is retried
+            async with self.async_semaphore:
+
+                self.record(model, "concurrency_wait_seconds", time.monotonic() - waiting_since)
+                self.record(model, "requests")
+
+                try:
+                    response_stream = await request()
+                except Exception as ex:
+                    backoff = self.handle_failure(model=model, bucket=bucket, ex=ex, attempt=attempt)
+                else:
+                    bucket.on_success()
+
+                    async with contextlib.aclosing(response_stream):
+                        async for response_chunk in response_stream:
+                            yield response_chunk
+
+                    return
+
+            await asyncio.sleep(backoff)
+
+    def stats(self) -> dict:
+
+        with self.lock:
+
+            return {
+                model: {
+                    **{metric: round(value, 3) for metric, value in metrics.items()},
+                    "current_requests_per_minute": round(self.buckets[model].rate * 60, 1)
+                }
+                for model, metrics in self.metrics.items()
+            }
@@ -0,0 +1,109 @@
+import re
+import time
+import asyncio
+from collections import OrderedDict
+
+from commons.collection_version import CollectionVersionStamp
+
+class ResultCache:
+
+    def __init__(self, version_stamp:CollectionVersionStamp, ttl_seconds:float = 300, max_entries:int = 1000):
+        self.version_stamp = version_stamp
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.in_flight = {}
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0
+        }
+
+    @staticmethod
+    def normalize_query(query:str) -> str:
+        return re.sub(r"\s+", " ", query).strip().casefold()
+
+    def cache_key(self, query:str, top_k:int) -> tuple:
+        return (self.version_stamp.current(), self.normalize_query(query), top_k)
+
+    def get(self, cache_key:tuple):
+
+        entry = self.results.get(cache_key)
+
+        if entry is None:
+            return None
+
+        result, cached_at = entry
+
+        if (time.monotonic() - cached_at) > self.ttl_seconds:
+            del self.results[cache_key]
+            return None
+
+        self.results.move_to_end(cache_key)
+
+        return result
+
+    def put(self, cache_key:tuple, result):
+
+        current_version = self.version_stamp.current()
+
+        # A computation that started before the loader bumped the version is dropped, not stored
+        if cache_key[0] != current_version:
+            return
+
+        # Entries stamped with an older collection version can never be hit again
+        for stale_key in [key for key in self.results if key[0] != current_version]:
+            del self.results[stale_key]
+
+        self.results[cache_key] = (result, time.monotonic())
+        self.results.move_to_end(cache_key)
+
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+    def lookup(self, query:str, top_k:int) -> tuple:
+
+        cache_key = self.cache_key(query=query, top_k=top_k)
+        result = self.get(cache_key=cache_key)
+
+        self.counters["hits" if result is not None else "misses"] += 1
+
+        return cache_key, result
+
+    async def get_or_compute(self, query:str, top_k:int, compute):
+
+        cache_key = self.cache_key(query=query, top_k=top_k)
+
+        result = self.get(cache_key=cache_key)
+
+        if result is not None:
+            self.counters["hits"] += 1
+            return result
+
+        task = self.in_flight.get(cache_key)
+
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = asyncio.ensure_future(compute())
+            self.in_flight[cache_key] = task
+            task.add_done_callback(lambda done_task: self.complete(cache_key=cache_key, task=done_task))
+
+        # Shield the shared computation so a disconnecting caller doesn't cancel it for the others
+        return await asyncio.shield(task)
+
+    def complete(self, cache_key:tuple, task:asyncio.Task):
+
+        self.in_flight.pop(cache_key, None)
+
+        if not task.cancelled() and task.exception() is None:
+            self.put(cache_key=cache_key, result=task.result())
+
+    def stats(self) -> dict:
+
+        return {
+            **self.counters,
+            "entries": len(self.results),
+            "in_flight": len(self.in_flight)
+        }
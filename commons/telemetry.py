@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to long LLM generations
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(label_names:tuple, label_values:tuple, extra_labels:dict = None) -> str:
+
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    labels += [f'{name}="{escape_label_value(value)}"' for name, value in (extra_labels or {}).items()]
+
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+class Metric:
+
+    metric_type = "untyped"
+
+    def __init__(self, name:str, description:str, label_names:tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    @property
+    def sample_name(self) -> str:
+        return self.name
+
+    def label_values(self, labels:dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> list:
+        return [f"# HELP {self.sample_name} {self.description}", f"# TYPE {self.sample_name} {self.metric_type}", *self.samples()]
+
+class Counter(Metric):
+
+    metric_type = "counter"
+
+    # Text format 0.0.4 has no suffix handling, so HELP and TYPE name the _total samples directly
+    @property
+    def sample_name(self) -> str:
+        return f"{self.name}_total"
+
+    def inc(self, value:float = 1, **labels):
+
+        key = self.label_values(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def set_total(self, value:float, **labels):
+
+        # Mirrors a running total kept by another component, copied at scrape time
+        with self.lock:
+            self.values[self.label_values(labels)] = float(value)
+
+    def samples(self) -> list:
+
+        with self.lock:
+            return [f"{self.sample_name}{format_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+class Gauge(Metric):
+
+    metric_type = "gauge"
+
+    def set(self, value:float, **labels):
+
+        with self.lock:
+            self.values[self.label_values(labels)] = float(value)
+
+    def samples(self) -> list:
+
+        with self.lock:
+            return [f"{self.name}{format_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+class Histogram(Metric):
+
+    metric_type = "histogram"
+
+    def __init__(self, name:str, description:str, label_names:tuple = (), buckets:tuple = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name=name, description=description, label_names=label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value:float, **labels):
+
+        key = self.label_values(labels)
+
+        with self.lock:
+
+            bucket_counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+
+            for idx, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[idx] += 1
+
+            self.values[key] = (bucket_counts, total + value, count + 1)
+
+    def samples(self) -> list:
+
+        lines = []
+
+        with self.lock:
+
+            for key, (bucket_counts, total, count) in self.values.items():
+
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, {'le': upper_bound})} {bucket_count}")
+
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, {'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {count}")
+
+        return lines
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name:str, description:str, label_names:tuple = (), **options):
+
+        with self.lock:
+
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(name=name, description=description, label_names=label_names, **options)
+
+            return self.metrics[name]
+
+    def counter(self, name:str, description:str, label_names:tuple = ()) -> Counter:
+        return self.register(Counter, name=name, description=description, label_names=label_names)
+
+    def gauge(self, name:str, description:str, label_names:tuple = ()) -> Gauge:
+        return self.register(Gauge, name=name, description=description, label_names=label_names)
+
+    def histogram(self, name:str, description:str, label_names:tuple = (), buckets:tuple = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram, name=name, description=description, label_names=label_names, buckets=buckets)
+
+    def render(self) -> str:
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        # Prometheus text exposition format 0.0.4
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def write_textfile(self, path:str):
+
+        # Written atomically for the node exporter's textfile collector
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+
+        os.replace(temp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION_SECONDS = REGISTRY.histogram(
+    "ppa_stage_duration_seconds",
+    "Duration of each stage of the query and ingestion pipelines.",
+    ("pipeline", "stage")
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "ppa_stage_errors",
+    "Stages of the query and ingestion pipelines that raised an exception.",
+    ("pipeline", "stage")
+)
+
+class JsonLogFormatter(logging.Formatter):
+
+    converter = time.gmtime
+
+    def format(self, record:logging.LogRecord) -> str:
+
+        log_entry = {
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        trace_id = getattr(record, "trace_id", None) or trace_id_var.get()
+        if trace_id:
+            log_entry["trace_id"] = trace_id
+
+        log_entry.update(getattr(record, "fields", None) or {})
+
+        if record.exc_info:
+            log_entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(log_entry, default=str)
+
+class StructuredLogger(logging.LoggerAdapter):
+
+    def process(self, msg, kwargs):
+
+        # Keyword arguments other than the logging module's own become structured fields
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in ("exc_info", "stack_info", "stacklevel", "extra")}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+
+        return msg, kwargs
+
+def get_logger(name:str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"ppa.{name.split('.')[-1]}"), {})
+
+def configure_logging(level:str = "INFO"):
+
+    logger = logging.getLogger("ppa")
+    logger.setLevel(str(level).upper())
+    logger.propagate = False
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonLogFormatter())
+        logger.addHandler(handler)
+
+def new_trace_id(incoming_trace_id:str = None) -> str:
+
+    # Accept a caller's trace ID when it looks sane, otherwise start a new trace
+    if incoming_trace_id and len(incoming_trace_id) <= 128 and incoming_trace_id.replace("-", "").isalnum():
+        return incoming_trace_id
+
+    return uuid.uuid4().hex
+
+@contextmanager
+def stage_timer(pipeline:str, stage:str, logger:StructuredLogger = None, **fields):
+
+    started_at = time.perf_counter()
+
+    # Cancellations and closed generators (e.g. an SSE client disconnecting) are not stage errors
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(pipeline=pipeline, stage=stage)
+        raise
+    finally:
+
+        duration = time.perf_counter() - started_at
+        STAGE_DURATION_SECONDS.observe(duration, pipeline=pipeline, stage=stage)
+
+        if logger is not None:
+            logger.debug("Stage completed", pipeline=pipeline, stage=stage, duration_ms=round(duration * 1000, 2), **fields)
@@ -1,26 +1,49 @@
 import re
 from google.genai.types import ContentEmbedding
 
+# Banner line that precedes every page in the PPA text dumps
+BANNER_PATTERN = re.compile(
+    r"<PAGE NUMBER: (?P<page_number>\d+), PROJECT CODE: (?P<project_code>\d+), "
+    r"PROJECT NAME: (?P<project_name>[^,]+), DOCUMENT NAME: (?P<filename>[^>]+)>"
+)
+
 class HelperUtils:
 
     def get_embedding_values(self, embedding_object: ContentEmbedding):
         return embedding_object.statistics, embedding_object.values
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    @staticmethod
+    def truncate_embedding(values: list, dimensions: int) -> list:
+
+        # Matryoshka embeddings keep most of their meaning in the leading dimensions,
+        # the truncated vector only needs to be re-normalized to unit length
+        truncated = list(values[:dimensions])
+        norm = sum(value * value for value in truncated) ** 0.5
+
+        if norm == 0:
+            return truncated
+
+        return [value / norm for value in truncated]
+
+    @staticmethod
+    def banner_fields_from_match(match: re.Match) -> dict:
+
+        return {
+            "page_number": int(match.group("page_number")),
+            "project_code": match.group("project_code").strip(),
+            "project_name": match.group("project_name").strip(),
+            "filename": match.group("filename").strip()
+        }
     
     def extract_banner_fields(self, content: str) -> dict:
 
-        pattern = (
-            r"<PAGE NUMBER: \d+, PROJECT CODE: (?P<project_code>\d+), "
-            r"PROJECT NAME: (?P<project_name>[^,]+), DOCUMENT NAME: (?P<filename>[^>]+)>"
-        )
-
-        match = re.match(pattern, content)
+        match = BANNER_PATTERN.match(content)
 
         if match:
-
-            return {
-                "project_code": match.group("project_code").strip(),
-                "project_name": match.group("project_name").strip(),
-                "filename": match.group("filename").strip()
-            }
+            return self.banner_fields_from_match(match)
         
-        return {}
\ No newline at end of file
+        return {}
@@ -0,0 +1,40 @@
+import os 
+from dotenv import load_dotenv
+
+from commons.qdrant_helper import QdrantHelper
+from commons.local_vector_store import LocalVectorStore
+from commons.aws_secrets_manager_helper import AWSSecretManagerHelper
+from commons.telemetry import configure_logging, get_logger
+
+load_dotenv(dotenv_path=".env")
+
+configure_logging(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = get_logger("export_local_vector_store")
+
+secrets_helper = AWSSecretManagerHelper()
+aws_secret_name = os.getenv("AWS_SECRET_NAME")
+secret_result_json = secrets_helper.get_secret(secret_name=aws_secret_name)
+qdrant_api_key = secret_result_json.get('QDRANT_CLOUD_API_KEY')
+
+qdrant_url = os.getenv('QDRANT_URL')
+
+qdrant_collection_name = os.getenv('QDRANT_PPA_COLLECTION_NAME')
+
+local_vector_store_path = os.getenv('LOCAL_VECTOR_STORE_PATH', '.cache/local_vector_store')
+local_vector_store_ivf_lists = int(os.getenv('LOCAL_VECTOR_STORE_IVF_LISTS', '0'))
+
+if __name__ == "__main__":
+
+    qdrant_helper = QdrantHelper.from_env(url=qdrant_url, api_key=qdrant_api_key)
+
+    local_vector_store = LocalVectorStore(
+        snapshot_dir=local_vector_store_path,
+        ivf_lists=local_vector_store_ivf_lists
+    )
+
+    logger.info("Exporting Qdrant collection snapshot", collection=qdrant_collection_name)
+
+    local_vector_store.export_from_qdrant(
+        qdrant_helper=qdrant_helper,
+        collection_name=qdrant_collection_name
+    )
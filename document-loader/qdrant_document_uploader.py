@@ -1,16 +1,34 @@
 import os 
-import re
 import json
+import time
+import multiprocessing
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from commons.utils import HelperUtils
+from commons.page_chunker import PageChunker
 from commons.aws_s3_helper import AWSS3Helper
 from commons.qdrant_helper import QdrantHelper
+from commons.local_vector_store import LocalVectorStore
+from commons.project_resolver import ProjectResolver
+from commons.rate_limiter import RateLimiter, DEFAULT_MODEL_REQUESTS_PER_MINUTE
+from commons.embedding_cache import EmbeddingCache
+from commons.collection_version import CollectionVersionStamp
+from commons.ingestion_manifest import IngestionManifest
+from commons.ingestion_queue import IngestionQueue
+from commons.near_duplicate_index import NearDuplicateIndex
+from commons.content_store import ContentStore
 from commons.aws_secrets_manager_helper import AWSSecretManagerHelper
 from commons.google_genai_helper import GoogleGenaiHelper
+from commons.telemetry import REGISTRY, configure_logging, get_logger, stage_timer
 
 load_dotenv(dotenv_path=".env")
 
+configure_logging(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = get_logger("qdrant_document_uploader")
+
+# Optional Prometheus textfile the ingestion stage timings are written to at the end of the run
+metrics_textfile_path = os.getenv('METRICS_TEXTFILE_PATH')
+
 secrets_helper = AWSSecretManagerHelper()
 aws_secret_name = os.getenv("AWS_SECRET_NAME")
 secret_result_json = secrets_helper.get_secret(secret_name=aws_secret_name)
@@ -22,119 +40,599 @@ google_cloud_location = os.getenv('GOOGLE_CLOUD_LOCATION')
 google_cloud_service_credential_json = json.loads(google_cloud_service_credential)
 
 qdrant_url = os.getenv('QDRANT_URL')
+
 qdrant_cluster_name = os.getenv('QDRANT_CLUSTER_NAME')
 qdrant_collection_name = os.getenv('QDRANT_PPA_COLLECTION_NAME')
-qdrant_recreate_collection = os.getenv('QDRANT_RECREATE_COLLECTION')
+qdrant_recreate_collection = os.getenv('QDRANT_RECREATE_COLLECTION', 'False').strip().lower() in ('1', 'true', 'yes')
+ingestion_manifest_path = os.getenv('INGESTION_MANIFEST_PATH')
+
+# Storage profile of a newly created collection: float32, scalar_int8 or binary
+qdrant_collection_profile = os.getenv('QDRANT_COLLECTION_PROFILE', 'float32')
+qdrant_hnsw_m = int(os.getenv('QDRANT_HNSW_M', '0'))
+qdrant_hnsw_ef_construct = int(os.getenv('QDRANT_HNSW_EF_CONSTRUCT', '0'))
+
+# "qdrant" uploads to Qdrant Cloud, "local" writes an in-process NumPy vector store snapshot instead
+vector_store_backend = os.getenv('VECTOR_STORE_BACKEND', 'qdrant').strip().lower()
+local_vector_store_path = os.getenv('LOCAL_VECTOR_STORE_PATH', '.cache/local_vector_store')
+local_vector_store_ivf_lists = int(os.getenv('LOCAL_VECTOR_STORE_IVF_LISTS', '0'))
+
+# Size of the truncated Matryoshka vector stored next to the full vector (0 disables it)
+qdrant_coarse_vector_size = int(os.getenv('QDRANT_COARSE_VECTOR_SIZE', '0'))
+
+s3_document_suffix = os.getenv('S3_DOCUMENT_SUFFIX', '')
+s3_download_max_workers = int(os.getenv('S3_DOWNLOAD_MAX_WORKERS', '8'))
+
+# Optional token budget for splitting long pages and merging short ones (0 disables)
+page_chunk_max_tokens = int(os.getenv('PAGE_CHUNK_MAX_TOKENS', '0'))
+page_chunk_merge_below_tokens = int(os.getenv('PAGE_CHUNK_MERGE_BELOW_TOKENS', '0'))
+
+qdrant_upsert_batch_size = int(os.getenv('QDRANT_UPSERT_BATCH_SIZE', '64'))
+project_resolver_snapshot_path = os.getenv('PROJECT_RESOLVER_SNAPSHOT_PATH', '.cache/project_resolver.json')
+
+embedding_cache_path = os.getenv('EMBEDDING_CACHE_PATH', '.cache/embeddings.sqlite3')
+embedding_cache_max_entries = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '10000'))
+embedding_cache_ttl_seconds = float(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', '86400'))
+embedding_cache_max_disk_entries = int(os.getenv('EMBEDDING_CACHE_MAX_DISK_ENTRIES', '100000'))
+embedding_batch_max_workers = int(os.getenv('EMBEDDING_BATCH_MAX_WORKERS', '4'))
+
+# Total for the run, split evenly across the INGESTION_WORKERS processes
+genai_max_concurrency = int(os.getenv('GENAI_MAX_CONCURRENCY', '8'))
+genai_max_retries = int(os.getenv('GENAI_MAX_RETRIES', '5'))
+
+# Durable chunk queue, each worker process claims QDRANT_UPSERT_BATCH_SIZE chunks at a time.
+# The local vector store lives in this process, so it always runs a single in-process worker.
+ingestion_queue_path = os.getenv('INGESTION_QUEUE_PATH', '.cache/ingestion_queue.sqlite3')
+ingestion_workers = int(os.getenv('INGESTION_WORKERS', '1'))
+ingestion_lease_seconds = float(os.getenv('INGESTION_LEASE_SECONDS', '600'))
+ingestion_max_attempts = int(os.getenv('INGESTION_MAX_ATTEMPTS', '3'))
+
+# Pages matching an already embedded page (MinHash Jaccard estimate >= threshold) reuse its embedding, identical pages also its summary.
+# Clauses shared across projects are embedded once without the project title, so every project can reuse that vector.
+near_duplicate_detection = os.getenv('NEAR_DUPLICATE_DETECTION', 'True').strip().lower() in ('1', 'true', 'yes')
+near_duplicate_index_path = os.getenv('NEAR_DUPLICATE_INDEX_PATH', '.cache/near_duplicates.sqlite3')
+near_duplicate_threshold = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+near_duplicate_num_perm = int(os.getenv('NEAR_DUPLICATE_NUM_PERM', '128'))
+near_duplicate_bands = int(os.getenv('NEAR_DUPLICATE_BANDS', '16'))
+
+# Optional directory of the compressed page text store, payloads then hold a pointer instead of the text.
+# The API server needs the same directory (CONTENT_STORE_PATH) to hydrate its search results.
+content_store_path = os.getenv('CONTENT_STORE_PATH', '')
+
+DOCUMENT_DURATION_SECONDS = REGISTRY.histogram(
+    "ppa_ingestion_document_duration_seconds",
+    "End-to-end ingestion time of each new or changed document."
+)
+DUPLICATE_PAGES = REGISTRY.counter(
+    "ppa_ingestion_duplicate_pages",
+    "Pages that reused the summary or embedding of an exact or near-duplicate page.",
+    ("match",)
+)
+PAGES_INGESTED = REGISTRY.counter(
+    "ppa_ingestion_pages",
+    "Pages embedded and upserted by the document loader."
+)
+
+def build_genai_helper(budget_share:int = 1) -> GoogleGenaiHelper:
+
+    embedding_cache = EmbeddingCache(
+        db_path=embedding_cache_path,
+        max_entries=embedding_cache_max_entries,
+        ttl_seconds=embedding_cache_ttl_seconds,
+        max_disk_entries=embedding_cache_max_disk_entries
+    )
 
-if __name__ == "__main__":
+    return GoogleGenaiHelper(
+        project_id=google_cloud_project_id, 
+        location=google_cloud_location, 
+        credentials=google_cloud_service_credential_json,
+        embedding_cache=embedding_cache,
+        # Each spawned worker gets 1/budget_share of the request rate and concurrency so that together they stay within the quota
+        rate_limiter=RateLimiter(
+            model_requests_per_minute={model: rpm / budget_share for model, rpm in DEFAULT_MODEL_REQUESTS_PER_MINUTE.items()},
+            max_concurrency=max(1, genai_max_concurrency // budget_share),
+            max_retries=genai_max_retries
+        )
+    )
 
-    helper_utils = HelperUtils()
+def build_qdrant_helper():
 
-    s3_helper = AWSS3Helper()
+    if vector_store_backend == "local":
+        return LocalVectorStore(
+            snapshot_dir=local_vector_store_path,
+            ivf_lists=local_vector_store_ivf_lists
+        )
 
-    genai_helper = GoogleGenaiHelper(
-        project_id=google_cloud_project_id, 
-        location=google_cloud_location, 
-        credentials=google_cloud_service_credential_json
+    return QdrantHelper.from_env(url=qdrant_url, api_key=qdrant_api_key)
+
+def build_ingestion_queue() -> IngestionQueue:
+
+    return IngestionQueue(
+        db_path=ingestion_queue_path,
+        lease_seconds=ingestion_lease_seconds,
+        max_attempts=ingestion_max_attempts
+    )
+
+def build_near_duplicate_index():
+
+    if not near_duplicate_detection:
+        return None
+
+    # Reused vectors must come from the same embedding model and size
+    return NearDuplicateIndex(
+        db_path=near_duplicate_index_path,
+        namespace="gemini-embedding-001:1536",
+        num_perm=near_duplicate_num_perm,
+        bands=near_duplicate_bands,
+        threshold=near_duplicate_threshold
+    )
+
+def deduplicate_chunks(worker_name:str, queue:IngestionQueue, near_duplicate_index:NearDuplicateIndex, pending_chunks:list, fingerprints:dict, followers:dict, reused_vectors:dict, untitled_chunks:set, summary_copies:dict) -> list:
+
+    # Each leader is embedded under its project title, or without one ("") once another project shares the page
+    leaders = []
+    leader_titles = {}
+    first_copies = {}
+    unsummarized_chunks = []
+
+    def summarize(chunk:dict):
+
+        # Identical pages of the batch are summarized once, later copies take the first copy's summary
+        first_copy = first_copies[fingerprints[chunk["point_id"]]["text_hash"]]
+
+        if first_copy is chunk:
+            unsummarized_chunks.append(chunk)
+        else:
+            summary_copies[chunk["point_id"]] = first_copy
+
+    with stage_timer("ingestion", "deduplication", logger=logger, worker=worker_name, chunks=len(pending_chunks)):
+
+        for chunk in pending_chunks:
+
+            title = chunk["metadata"].get("project_name") or ""
+            fingerprint = near_duplicate_index.fingerprint(chunk["text_chunk"])
+            fingerprints[chunk["point_id"]] = fingerprint
+            first_copies.setdefault(fingerprint["text_hash"], chunk)
+
+            duplicate = near_duplicate_index.lookup(fingerprint, title=title)
+
+            # The point keeps its own text and project metadata, only an identical page also reuses the summary
+            if duplicate is not None and duplicate["vector"] is not None:
+
+                if duplicate["match"] == "exact":
+                    logger.debug("Duplicate page, reusing its summary and embedding", point_id=chunk["point_id"], source_point_id=duplicate["source_point_id"])
+                    queue.checkpoint(chunk=chunk, state="embedded", summary=duplicate["summary"], vector=duplicate["vector"])
+                else:
+                    # A near copy may differ in the clauses its summary would describe, so it gets its own summary
+                    logger.debug("Near-duplicate page, reusing its embedding", point_id=chunk["point_id"], source_point_id=duplicate["source_point_id"], similarity=duplicate["similarity"])
+                    reused_vectors[chunk["point_id"]] = duplicate["vector"]
+                    summarize(chunk)
+
+                DUPLICATE_PAGES.inc(match=duplicate["match"])
+                continue
+
+            # The vector was embedded under another project's title, an identical page still reuses the summary
+            if duplicate is not None and duplicate["match"] == "exact":
+                queue.checkpoint(chunk=chunk, state="summarized", summary=duplicate["summary"])
+                DUPLICATE_PAGES.inc(match="exact")
+
+            matching_leaders = [leader for leader in leaders if near_duplicate_index.match(fingerprints[leader["point_id"]], fingerprint)]
+            leader = next((leader for leader in matching_leaders if leader_titles[leader["point_id"]] in ("", title)), None)
+
+            # Leaders are not embedded yet, so another project's copy is switched to an untitled embedding every project can share
+            if leader is None and matching_leaders:
+                leader = matching_leaders[0]
+                leader_titles[leader["point_id"]] = ""
+                untitled_chunks.add(leader["point_id"])
+
+            # Copies within the claimed batch wait for the first reusable copy's embedding
+            if leader is not None:
+
+                followers.setdefault(leader["point_id"], []).append(chunk)
+
+                if chunk["state"] == "pending" and fingerprints[leader["point_id"]]["text_hash"] != fingerprint["text_hash"]:
+                    summarize(chunk)
+
+                continue
+
+            # A page matching another project's indexed page starts the shared untitled copy
+            leaders.append(chunk)
+            leader_titles[chunk["point_id"]] = "" if duplicate is not None else title
+
+            if duplicate is not None:
+                untitled_chunks.add(chunk["point_id"])
+
+            if chunk["state"] == "pending":
+                summarize(chunk)
+
+    return unsummarized_chunks
+
+def process_chunks(worker_name:str, queue:IngestionQueue, genai_helper:GoogleGenaiHelper, qdrant_helper, chunks:list, near_duplicate_index:NearDuplicateIndex = None, content_store:ContentStore = None):
+
+    failed_chunks = {}
+    fingerprints = {}
+    followers = {}
+    reused_vectors = {}
+    untitled_chunks = set()
+    summary_copies = {}
+
+    # Each stage only picks up chunks whose previous stage is checkpointed, so resumed chunks skip straight to their next stage
+    pending_chunks = [chunk for chunk in chunks if chunk["state"] == "pending"]
+
+    if pending_chunks and near_duplicate_index is not None:
+        pending_chunks = deduplicate_chunks(
+            worker_name=worker_name,
+            queue=queue,
+            near_duplicate_index=near_duplicate_index,
+            pending_chunks=pending_chunks,
+            fingerprints=fingerprints,
+            followers=followers,
+            reused_vectors=reused_vectors,
+            untitled_chunks=untitled_chunks,
+            summary_copies=summary_copies
+        )
+
+    if pending_chunks:
+
+        with stage_timer("ingestion", "summarization", logger=logger, worker=worker_name, chunks=len(pending_chunks)):
+            with ThreadPoolExecutor(max_workers=genai_helper.rate_limiter.max_concurrency) as executor:
+
+                futures = {executor.submit(genai_helper.summarize_content_task, chunk["text_chunk"]): chunk for chunk in pending_chunks}
+
+                for future in as_completed(futures):
+
+                    chunk = futures[future]
+
+                    try:
+                        if chunk["point_id"] in reused_vectors:
+                            queue.checkpoint(chunk=chunk, state="embedded", summary=future.result(), vector=reused_vectors[chunk["point_id"]])
+                        else:
+                            queue.checkpoint(chunk=chunk, state="summarized", summary=future.result())
+                    except Exception as ex:
+                        failed_chunks[chunk["point_id"]] = (chunk, f"summarization: {ex}")
+
+    for chunk in chunks:
+
+        first_copy = summary_copies.get(chunk["point_id"])
+
+        if first_copy is None or first_copy["summary"] is None:
+            continue
+
+        if chunk["point_id"] in reused_vectors:
+            queue.checkpoint(chunk=chunk, state="embedded", summary=first_copy["summary"], vector=reused_vectors[chunk["point_id"]])
+        else:
+            queue.checkpoint(chunk=chunk, state="summarized", summary=first_copy["summary"])
+
+    # Batch followers take their leader's embedding once it exists
+    follower_ids = {follower["point_id"] for chunk_followers in followers.values() for follower in chunk_followers}
+    summarized_chunks = [chunk for chunk in chunks if chunk["state"] == "summarized" and chunk["point_id"] not in follower_ids]
+
+    if summarized_chunks:
+
+        with stage_timer("ingestion", "embedding", logger=logger, worker=worker_name, chunks=len(summarized_chunks)):
+
+            try:
+                embeddings = genai_helper.generate_embeddings_batched(
+                    model="gemini-embedding-001",
+                    contents=[chunk["text_chunk"] for chunk in summarized_chunks],
+                    titles=[None if chunk["point_id"] in untitled_chunks else chunk["metadata"].get("project_name") for chunk in summarized_chunks],
+                    max_workers=embedding_batch_max_workers
+                )
+            except Exception as ex:
+                embeddings = [ex] * len(summarized_chunks)
+
+            for chunk, embedding in zip(summarized_chunks, embeddings):
+
+                if embedding is None or isinstance(embedding, Exception):
+                    failed_chunks[chunk["point_id"]] = (chunk, f"embedding: {embedding or 'no embedding returned'}")
+                    continue
+
+                queue.checkpoint(chunk=chunk, state="embedded", vector=embedding.values)
+
+                if near_duplicate_index is None:
+                    continue
+
+                fingerprint = fingerprints.get(chunk["point_id"]) or near_duplicate_index.fingerprint(chunk["text_chunk"])
+                near_duplicate_index.add(fingerprint=fingerprint, summary=chunk["summary"], vector=chunk["vector"], source_point_id=chunk["point_id"], title=None if chunk["point_id"] in untitled_chunks else chunk["metadata"].get("project_name"))
+
+                for follower in followers.get(chunk["point_id"], []):
+
+                    if fingerprints[follower["point_id"]]["text_hash"] == fingerprint["text_hash"]:
+                        queue.checkpoint(chunk=follower, state="embedded", summary=chunk["summary"], vector=chunk["vector"])
+                    elif follower["state"] == "summarized":
+                        queue.checkpoint(chunk=follower, state="embedded", vector=chunk["vector"])
+                    else:
+                        continue
+
+                    DUPLICATE_PAGES.inc(match="batch")
+
+    embedded_chunks = [chunk for chunk in chunks if chunk["state"] == "embedded"]
+
+    if embedded_chunks:
+
+        with stage_timer("ingestion", "upsert", logger=logger, worker=worker_name, chunks=len(embedded_chunks)):
+
+            try:
+
+                content_refs = {}
+                if content_store is not None:
+                    content_refs = content_store.append_many([(chunk["point_id"], chunk["text_chunk"]) for chunk in embedded_chunks])
+
+                points = [
+                    qdrant_helper.point_object(
+                        index=chunk["point_id"],
+                        embedding_vector=chunk["vector"],
+                        text_chunk=chunk["text_chunk"],
+                        metadata={**chunk["metadata"], "summary": chunk["summary"]},
+                        coarse_vector_size=qdrant_coarse_vector_size or None,
+                        content_ref=content_refs.get(chunk["point_id"])
+                    )
+                    for chunk in embedded_chunks
+                ]
+
+                # Acknowledged writes, an upserted checkpoint means the points are in the collection
+                qdrant_helper.upsert_batch(collection_name=qdrant_collection_name, points=points, wait=True)
+                queue.checkpoint_many(chunks=embedded_chunks, state="upserted")
+                PAGES_INGESTED.inc(len(embedded_chunks))
+            except Exception as ex:
+                for chunk in embedded_chunks:
+                    failed_chunks[chunk["point_id"]] = (chunk, f"upsert: {ex}")
+
+    for chunk, error in failed_chunks.values():
+        logger.warning("Chunk failed, returning it to the queue", worker=worker_name, point_id=chunk["point_id"], s3_key=chunk["s3_key"], state=chunk["state"], error=error)
+        queue.release(chunks=[chunk], error=error)
+
+    queue.release(chunks=[chunk for chunk in chunks if chunk["point_id"] not in failed_chunks])
+
+def run_ingestion_worker(worker_name:str, genai_helper:GoogleGenaiHelper = None, qdrant_helper = None, budget_share:int = 1):
+
+    queue = build_ingestion_queue()
+    genai_helper = genai_helper or build_genai_helper(budget_share=budget_share)
+    qdrant_helper = qdrant_helper or build_qdrant_helper()
+    near_duplicate_index = build_near_duplicate_index()
+    content_store = ContentStore(store_dir=content_store_path) if content_store_path else None
+
+    logger.info("Ingestion worker started", worker=worker_name)
+
+    processed_chunks = 0
+
+    while True:
+
+        chunks = queue.claim(batch_size=qdrant_upsert_batch_size)
+
+        if not chunks:
+
+            if not queue.has_work():
+                break
+
+            # The remaining chunks are leased by other workers, wait for them to finish or for their leases to expire
+            time.sleep(1)
+            continue
+
+        process_chunks(
+            worker_name=worker_name,
+            queue=queue,
+            genai_helper=genai_helper,
+            qdrant_helper=qdrant_helper,
+            chunks=chunks,
+            near_duplicate_index=near_duplicate_index,
+            content_store=content_store
+        )
+        processed_chunks += len(chunks)
+
+    logger.info(
+        "Ingestion worker finished",
+        worker=worker_name,
+        claimed_chunks=processed_chunks,
+        embedding_cache=genai_helper.embedding_cache.stats(),
+        near_duplicates=near_duplicate_index.stats() if near_duplicate_index is not None else None,
+        content_store=content_store.stats() if content_store is not None else None
     )
 
-    qdrant_helper = QdrantHelper(
-        url=qdrant_url, 
-        api_key=qdrant_api_key
+    queue.close()
+    if near_duplicate_index is not None:
+        near_duplicate_index.close()
+
+def run_ingestion_workers(genai_helper:GoogleGenaiHelper, qdrant_helper):
+
+    if ingestion_workers <= 1 or vector_store_backend == "local":
+        run_ingestion_worker(worker_name="worker-0", genai_helper=genai_helper, qdrant_helper=qdrant_helper)
+        return
+
+    # Spawned rather than forked, the gRPC and HTTP clients of this process must not be shared with the workers
+    spawn_context = multiprocessing.get_context("spawn")
+    workers = [
+        spawn_context.Process(target=run_ingestion_worker, args=(f"worker-{idx}",), kwargs={"budget_share": ingestion_workers}, name=f"ingestion-worker-{idx}")
+        for idx in range(ingestion_workers)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+
+        worker.join()
+
+        if worker.exitcode != 0:
+            logger.warning("Ingestion worker exited with an error, its chunks are retried on the next run", worker=worker.name, exitcode=worker.exitcode)
+
+if __name__ == "__main__":
+
+    s3_helper = AWSS3Helper(max_workers=s3_download_max_workers)
+
+    page_chunker = PageChunker(
+        max_tokens=page_chunk_max_tokens or None,
+        merge_below_tokens=page_chunk_merge_below_tokens or None
     )
 
-    print("\nCreate Qdrant Collection: ")
-    qdrant_helper.create_collection(
+    genai_helper = build_genai_helper()
+    qdrant_helper = build_qdrant_helper()
+
+    logger.info("Creating collection", collection=qdrant_collection_name, backend=vector_store_backend)
+    collection_created = qdrant_helper.create_collection(
         collection_name=qdrant_collection_name, 
-        force_recreation=qdrant_recreate_collection
+        force_recreation=qdrant_recreate_collection,
+        profile=qdrant_collection_profile,
+        hnsw_m=qdrant_hnsw_m or None,
+        hnsw_ef_construct=qdrant_hnsw_ef_construct or None,
+        coarse_vector_size=qdrant_coarse_vector_size or None
     )
 
-    print("\nDocument Loader Started => \n")
-    qdrant_point_index = 0
+    version_stamp = CollectionVersionStamp(collection_name=qdrant_collection_name)
 
-    for doc in s3_helper.get_documents():
+    # The local snapshot is only written at the end of the run, so its manifest is saved together with it
+    manifest = IngestionManifest(
+        collection_name=qdrant_collection_name,
+        manifest_path=ingestion_manifest_path,
+        autosave=(vector_store_backend != "local")
+    ).load()
 
-        doc_filename = doc['key']
-        doc_content = doc['content']
+    queue = build_ingestion_queue()
+
+    if collection_created:
+        # A new (or recreated) collection holds none of the manifest's or the queue's points
+        manifest.reset()
+        queue.reset()
 
-        # Regex pattern to match the banner line
-        banner_pattern = r"<PAGE NUMBER: \d+, PROJECT CODE: \d+, PROJECT NAME: [^,]+, DOCUMENT NAME: [^>]+>"
+        # The append-only content store only holds the text of the dropped points
+        if content_store_path:
+            ContentStore(store_dir=content_store_path).reset()
+    elif not manifest.document_keys() and not queue.document_keys():
+        # An existing collection without a manifest was loaded by the pre-manifest loader. Its integer point IDs
+        # never match the UUIDs written from now on, so they are purged instead of being left as duplicates.
+        legacy_points = qdrant_helper.purge_legacy_points(collection_name=qdrant_collection_name)
 
-        # Split the document at each banner
-        contents = re.split(f'({banner_pattern})', doc_content)
+        if legacy_points:
+            logger.warning("Collection has points but no ingestion manifest, purged its legacy integer point IDs", collection=qdrant_collection_name, points=legacy_points)
+            version_stamp.bump()
+    elif vector_store_backend == "local":
+        # The local store only keeps the points of a finished run
+        queue.requeue_upserted()
 
-        # Remove any empty strings from the result
-        text_chunks = [chunk.strip() for chunk in contents if chunk.strip()]
+    # Chunks leased by workers of an interrupted run go back to the queue at their last completed stage
+    queue.recover()
 
-        print("\nChunk document text: ")
+    logger.info("Document loader started", queue=queue.stats())
 
-        qdrant_points = []
+    # Removals are worked out from the unfiltered listing, so documents outside S3_DOCUMENT_SUFFIX are never taken for deleted
+    all_s3_documents = s3_helper.list_documents()
+    s3_keys = {document['key'] for document in all_s3_documents}
+    s3_documents = [document for document in all_s3_documents if document['key'].endswith(s3_document_suffix)]
 
-        for idx in range( int( len(text_chunks) / 2) ):
+    # Documents removed from S3 lose all of their points
+    for removed_key in (manifest.document_keys() | queue.document_keys()) - s3_keys:
 
-            page_banner_idx = idx * 2
-            text_chunk_idx = page_banner_idx + 1 
+        logger.info("Document was removed from S3, deleting its points", s3_key=removed_key)
 
-            page_banner = text_chunks[page_banner_idx]
-            text_chunk = text_chunks[text_chunk_idx]
-            metadata_fields = {}
+        qdrant_helper.delete_points(
+            collection_name=qdrant_collection_name,
+            point_ids=manifest.document_point_ids(removed_key) | queue.remove_document(removed_key)
+        )
+        manifest.remove_document(removed_key)
+        version_stamp.bump()
 
-            # print(f"\n[{page_banner_idx}] Page Banner =>")
-            # print(page_banner)
+    # Documents with an unchanged ETag are skipped without being downloaded, as are documents already queued at their current ETag
+    changed_documents = [
+        document for document in s3_documents
+        if document['etag'] not in (manifest.document_etag(document['key']), queue.document_etag(document['key']))
+    ]
 
-            print(f"\n[{page_banner_idx}] Extract Banner Fields. ")
-            metadata_fields = helper_utils.extract_banner_fields(content=page_banner)
+    logger.info("Selected new or changed documents", changed_documents=len(changed_documents), documents=len(s3_documents))
 
-            print(f"\n[{text_chunk_idx}] Text Chunk: ")
-            print(text_chunk)
-            
-            print(f"\n[{text_chunk_idx}] Generate Text Summary. ")
-            text_summary = genai_helper.summarize_content_task(content=text_chunk)
-            # print(text_summary)
-            metadata_fields["summary"] = text_summary
+    for doc in s3_helper.get_documents(documents=changed_documents, stream=True):
 
-            print(f"\n[{text_chunk_idx}] Metadata Fields: ")
-            print(metadata_fields)
+        doc_filename = doc['key']
 
-            embedding_result = genai_helper.generate_embeddings(
-                model="gemini-embedding-001",
-                contents=[text_chunk],
-                title=metadata_fields['project_name']
-            )
-        
-            embeddings = list(map(helper_utils.get_embedding_values, embedding_result.embeddings))
+        existing_point_ids = manifest.document_point_ids(doc_filename)
+        manifest_pages = {}
+        page_chunks = []
 
-            if len(embeddings) > 0:
+        # Pages are parsed lazily from the streamed S3 body, so chunking includes the download
+        with stage_timer("ingestion", "download_and_chunking", logger=logger, s3_key=doc_filename):
 
-                print(f"\n[{text_chunk_idx}] Vector Embedding: ")
-                embed_stats, embed_val = embeddings[0]
-                print(embed_stats)
-                # print(embed_val)
+            for idx, (metadata_fields, text_chunk) in enumerate(page_chunker.iter_pages(content_stream=doc['content_stream'])):
 
-                point = qdrant_helper.point_object(
-                    index=qdrant_point_index,
-                    embedding_vector=embed_val,
-                    text_chunk=text_chunk,
-                    metadata=metadata_fields
+                page_key = metadata_fields.get('page_number', idx)
+                if 'chunk_index' in metadata_fields:
+                    page_key = f"{page_key}.{metadata_fields['chunk_index']}"
+
+                content_hash = manifest.content_hash(text_chunk)
+                point_id = manifest.point_id(
+                    s3_key=doc_filename,
+                    page_number=page_key,
+                    content_hash=content_hash
                 )
+                manifest_pages[point_id] = {
+                    "page_number": page_key,
+                    "content_hash": content_hash
+                }
+
+                # Unchanged pages keep their existing point
+                if point_id in existing_point_ids:
+                    logger.debug("Page unchanged, skipping", s3_key=doc_filename, page=page_key)
+                    continue
+
+                logger.debug("Page chunked", s3_key=doc_filename, page=page_key, text=text_chunk)
+
+                page_chunks.append((point_id, text_chunk, metadata_fields))
+
+        queue.enqueue_document(
+            s3_key=doc_filename,
+            etag=doc['etag'],
+            manifest_pages=manifest_pages,
+            existing_point_ids=existing_point_ids,
+            page_chunks=page_chunks
+        )
 
-                qdrant_points.append(point)
+        logger.info("Document queued", s3_key=doc_filename, changed_pages=len(page_chunks), pages=len(manifest_pages))
 
-                print(f"\nQdrant point added to the points list => Index: {qdrant_point_index}.\n")
+    logger.info("Processing the ingestion queue", workers=1 if vector_store_backend == "local" else max(1, ingestion_workers), queue=queue.stats())
 
-                qdrant_point_index += 1
+    run_ingestion_workers(genai_helper=genai_helper, qdrant_helper=qdrant_helper)
 
-            # if qdrant_point_index >= 1:
-            #     break
+    for document in queue.finished_documents():
 
-        qdrant_helper.ingest_data(
-            collection_name=qdrant_collection_name,
-            points=qdrant_points
+        doc_filename = document['key']
+
+        # Pages without an upserted point stay out of the manifest so the next run retries them
+        manifest_pages = {
+            point_id: page for point_id, page in document['manifest_pages'].items()
+            if point_id not in document['failed_point_ids']
+        }
+
+        # Pages that changed or disappeared leave stale points behind
+        with stage_timer("ingestion", "stale_point_deletion", logger=logger, s3_key=doc_filename):
+            qdrant_helper.delete_points(
+                collection_name=qdrant_collection_name,
+                point_ids=document['existing_point_ids'] - set(document['manifest_pages'].keys())
+            )
+
+        with stage_timer("ingestion", "manifest_update", logger=logger, s3_key=doc_filename):
+            manifest.update_document(
+                s3_key=doc_filename,
+                etag=document['etag'],
+                pages=manifest_pages
+            )
+
+        completed = queue.complete_document(s3_key=doc_filename)
+
+        # Invalidate the API server's cached query results for this collection
+        version_stamp.bump()
+
+        document_duration = time.time() - document['enqueued_at']
+        DOCUMENT_DURATION_SECONDS.observe(document_duration)
+
+        logger.info(
+            "Document ingested" if completed else "Document partially ingested, failed pages are retried on the next run",
+            s3_key=doc_filename,
+            pages=len(manifest_pages),
+            failed_pages=len(document['failed_point_ids']),
+            duration_ms=round(document_duration * 1000, 2)
         )
 
-        # break
+    logger.info("Ingestion queue stats", **queue.stats())
+    logger.info("Vertex AI rate limiter stats", models=genai_helper.rate_limiter.stats())
 
-    print("\nCreate Filter Indexes => \n")
+    logger.info("Creating filter indexes", collection=qdrant_collection_name)
 
     qdrant_helper.create_keyword_filter_index(
         collection_name=qdrant_collection_name, 
@@ -144,4 +642,25 @@ if __name__ == "__main__":
     qdrant_helper.create_keyword_filter_index(
         collection_name=qdrant_collection_name, 
         field_name="metadata.project_name"
-    )
\ No newline at end of file
+    )
+
+    if vector_store_backend == "local":
+
+        logger.info("Saving local vector store snapshot", collection=qdrant_collection_name)
+
+        qdrant_helper.save_snapshot(collection_name=qdrant_collection_name)
+        manifest.save()
+        version_stamp.bump()
+
+    logger.info("Refreshing project resolver snapshot")
+
+    project_resolver = ProjectResolver(snapshot_path=project_resolver_snapshot_path)
+    project_resolver.build_from_qdrant(
+        qdrant_helper=qdrant_helper,
+        collection_name=qdrant_collection_name
+    )
+    project_resolver.save_snapshot()
+
+    if metrics_textfile_path:
+        REGISTRY.write_textfile(path=metrics_textfile_path)
+        logger.info("Ingestion metrics written", path=metrics_textfile_path)
@@ -4,11 +4,16 @@ from dotenv import load_dotenv
 
 from commons.utils import HelperUtils
 from commons.qdrant_helper import QdrantHelper
+from commons.context_assembler import ContextAssembler, CONTEXT_PAYLOAD_FIELDS
+from commons.content_store import ContentStore
 from commons.aws_secrets_manager_helper import AWSSecretManagerHelper
+from commons.telemetry import configure_logging
 from commons.google_genai_helper import GoogleGenaiHelper
 
 load_dotenv(dotenv_path=".env")
 
+configure_logging(level=os.getenv('LOG_LEVEL', 'INFO'))
+
 secrets_helper = AWSSecretManagerHelper()
 aws_secret_name = os.getenv("AWS_SECRET_NAME")
 secret_result_json = secrets_helper.get_secret(secret_name=aws_secret_name)
@@ -20,8 +25,18 @@ google_cloud_location = os.getenv('GOOGLE_CLOUD_LOCATION')
 google_cloud_service_credential_json = json.loads(google_cloud_service_credential)
 
 qdrant_url = os.getenv('QDRANT_URL')
+
 qdrant_collection_name = os.getenv('QDRANT_PPA_COLLECTION_NAME')
 
+# Collections created with a coarse vector only hold named vectors, so they are searched in two stages like the API server does
+qdrant_coarse_vector_size = int(os.getenv('QDRANT_COARSE_VECTOR_SIZE', '0'))
+qdrant_coarse_candidate_multiplier = int(os.getenv('QDRANT_COARSE_CANDIDATE_MULTIPLIER', '8'))
+
+context_max_tokens = int(os.getenv('CONTEXT_MAX_TOKENS', '8000'))
+context_duplicate_threshold = float(os.getenv('CONTEXT_DUPLICATE_THRESHOLD', '0.9'))
+
+content_store_path = os.getenv('CONTENT_STORE_PATH', '')
+
 if __name__ == "__main__":
 
     helper_utils = HelperUtils()
@@ -32,9 +47,11 @@ if __name__ == "__main__":
         credentials=google_cloud_service_credential_json
     )
 
-    qdrant_helper = QdrantHelper(
-        url=qdrant_url, 
-        api_key=qdrant_api_key
+    qdrant_helper = QdrantHelper.from_env(url=qdrant_url, api_key=qdrant_api_key)
+
+    context_assembler = ContextAssembler(
+        max_context_tokens=context_max_tokens,
+        duplicate_threshold=context_duplicate_threshold
     )
 
     user_query = """ 
@@ -63,25 +80,29 @@ if __name__ == "__main__":
     embeddings = list(map(helper_utils.get_embedding_values,  vector_embeddings.embeddings))
     _, embed_val = embeddings[0]
 
-    document_results = qdrant_helper.query_vector_store(
-        collection_name=qdrant_collection_name, 
-        query_vector=embed_val,
-        top_k=5
-    )
+    if qdrant_coarse_vector_size:
+        document_results = qdrant_helper.query_vector_store_two_stage(
+            collection_name=qdrant_collection_name,
+            query_vector=embed_val,
+            coarse_vector_size=qdrant_coarse_vector_size,
+            top_k=5,
+            candidate_multiplier=qdrant_coarse_candidate_multiplier,
+            with_payload=CONTEXT_PAYLOAD_FIELDS
+        )
+    else:
+        document_results = qdrant_helper.query_vector_store(
+            collection_name=qdrant_collection_name, 
+            query_vector=embed_val,
+            top_k=5,
+            with_payload=CONTEXT_PAYLOAD_FIELDS
+        )
+
+    if content_store_path:
+        ContentStore(store_dir=content_store_path).hydrate(points=document_results)
 
     print("\nDocument Results: ")
 
-    retrieved_docs = "\n".join(
-    [f"""
-    Document Details:
-    Project Code: {doc.payload['metadata']['project_code']}
-    Project Name: {doc.payload['metadata']['project_name']}
-    PPA Filename: {doc.payload['metadata']['filename']}
-    PPA Section Summary: {doc.payload['metadata']['summary']}
-    PPA Section Content: \n{doc.payload['content']}\n
-    """ 
-    for doc in document_results]
-    ) 
+    retrieved_docs = context_assembler.assemble(points=document_results)
 
     print(retrieved_docs)
 
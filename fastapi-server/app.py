@@ -1,126 +1,854 @@
 import os 
 import json
+import time
+import asyncio
 import uvicorn
 from dotenv import load_dotenv
 from typing import Any
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, aclosing
+from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 
 from commons.utils import HelperUtils
 from commons.qdrant_helper import QdrantHelper
+from commons.local_vector_store import LocalVectorStore
+from commons.project_resolver import ProjectResolver
+from commons.rate_limiter import RateLimiter
+from commons.admission_control import CircuitBreaker, ClientRateLimiter, Overloaded, UpstreamLimiter, request_deadline_var
+from commons.embedding_cache import EmbeddingCache
+from commons.result_cache import ResultCache
+from commons.context_assembler import ContextAssembler, CONTEXT_PAYLOAD_FIELDS
+from commons.content_store import ContentStore
+from commons.collection_version import CollectionVersionStamp
 from commons.aws_secrets_manager_helper import AWSSecretManagerHelper
 from commons.google_genai_helper import GoogleGenaiHelper
+from commons.telemetry import REGISTRY, STAGE_DURATION_SECONDS, configure_logging, get_logger, new_trace_id, stage_timer, trace_id_var
 
 load_dotenv(dotenv_path=".env")
 
-secrets_helper = AWSSecretManagerHelper()
+configure_logging(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = get_logger("app")
+
 aws_secret_name = os.getenv("AWS_SECRET_NAME")
-secret_result_json = secrets_helper.get_secret(secret_name=aws_secret_name)
-google_cloud_service_credential = secret_result_json.get('GOOGLE_CLOUD_SERVICE_CREDENTIAL')
-qdrant_api_key = secret_result_json.get('QDRANT_CLOUD_API_KEY')
+
+# Secrets are cached per worker and re-fetched in the background before the TTL runs out
+secrets_ttl_seconds = float(os.getenv('SECRETS_TTL_SECONDS', '3600'))
+secrets_refresh_ahead_seconds = float(os.getenv('SECRETS_REFRESH_AHEAD_SECONDS', '300'))
+
+# Clients replaced by a secret rotation are closed once in-flight requests had this long to finish
+secrets_rotation_grace_seconds = float(os.getenv('SECRETS_ROTATION_GRACE_SECONDS', '120'))
+
+# A failed client initialization (e.g. a transient Secrets Manager error) is retried with exponential backoff
+startup_retry_base_seconds = float(os.getenv('STARTUP_RETRY_BASE_SECONDS', '2'))
+startup_retry_max_seconds = float(os.getenv('STARTUP_RETRY_MAX_SECONDS', '60'))
 
 google_cloud_project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
 google_cloud_location = os.getenv('GOOGLE_CLOUD_LOCATION')
-google_cloud_service_credential_json = json.loads(google_cloud_service_credential)
 
 qdrant_url = os.getenv('QDRANT_URL')
+
 qdrant_collection_name = os.getenv('QDRANT_PPA_COLLECTION_NAME')
 qdrant_recreate_collection = os.getenv('QDRANT_RECREATE_COLLECTION')
 
+# Query-time HNSW and quantization rescoring options (unset uses the collection defaults)
+qdrant_search_hnsw_ef = int(os.getenv('QDRANT_SEARCH_HNSW_EF', '0')) or None
+qdrant_search_rescore = {'true': True, 'false': False}.get(os.getenv('QDRANT_SEARCH_RESCORE', '').strip().lower())
+qdrant_search_oversampling = float(os.getenv('QDRANT_SEARCH_OVERSAMPLING', '0')) or None
+
+# Two-stage retrieval on the loader's truncated Matryoshka vector (0 searches the full vector only)
+qdrant_coarse_vector_size = int(os.getenv('QDRANT_COARSE_VECTOR_SIZE', '0'))
+qdrant_coarse_candidate_multiplier = int(os.getenv('QDRANT_COARSE_CANDIDATE_MULTIPLIER', '8'))
+
+# "local" serves queries from the in-process NumPy snapshot written or exported by the loader
+vector_store_backend = os.getenv('VECTOR_STORE_BACKEND', 'qdrant').strip().lower()
+local_vector_store_path = os.getenv('LOCAL_VECTOR_STORE_PATH', '.cache/local_vector_store')
+local_vector_store_ivf_probes = int(os.getenv('LOCAL_VECTOR_STORE_IVF_PROBES', '8'))
+
+project_resolver_snapshot_path = os.getenv('PROJECT_RESOLVER_SNAPSHOT_PATH', '.cache/project_resolver.json')
+
+embedding_cache_path = os.getenv('EMBEDDING_CACHE_PATH', '.cache/embeddings.sqlite3')
+embedding_cache_max_entries = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '10000'))
+embedding_cache_ttl_seconds = float(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', '86400'))
+embedding_cache_max_disk_entries = int(os.getenv('EMBEDDING_CACHE_MAX_DISK_ENTRIES', '100000'))
+
+genai_max_concurrency = int(os.getenv('GENAI_MAX_CONCURRENCY', '8'))
+genai_max_retries = int(os.getenv('GENAI_MAX_RETRIES', '5'))
+
+result_cache_ttl_seconds = float(os.getenv('RESULT_CACHE_TTL_SECONDS', '300'))
+result_cache_max_entries = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1000'))
+
+# Upper bound on the queries of one batch request, each one costs an embedding and a search
+batch_query_max_queries = int(os.getenv('BATCH_QUERY_MAX_QUERIES', '32'))
+
+# Token budget and near-duplicate threshold of the context passed to the LLM
+context_max_tokens = int(os.getenv('CONTEXT_MAX_TOKENS', '8000'))
+context_duplicate_threshold = float(os.getenv('CONTEXT_DUPLICATE_THRESHOLD', '0.9'))
+
+# Directory of the loader's compressed page text store, for collections whose payloads hold content pointers
+content_store_path = os.getenv('CONTENT_STORE_PATH', '')
+
+# Admission control: requests still waiting for an upstream at their deadline are rejected early with 503
+request_deadline_seconds = float(os.getenv('REQUEST_DEADLINE_SECONDS', '30'))
+upstream_max_queue = int(os.getenv('UPSTREAM_MAX_QUEUE', '32'))
+upstream_min_remaining_seconds = float(os.getenv('UPSTREAM_MIN_REMAINING_SECONDS', '0.1'))
+vertex_llm_max_concurrency = int(os.getenv('VERTEX_LLM_MAX_CONCURRENCY', '8'))
+vertex_llm_timeout_seconds = float(os.getenv('VERTEX_LLM_TIMEOUT_SECONDS', '20'))
+vertex_embedding_max_concurrency = int(os.getenv('VERTEX_EMBEDDING_MAX_CONCURRENCY', '8'))
+vertex_embedding_timeout_seconds = float(os.getenv('VERTEX_EMBEDDING_TIMEOUT_SECONDS', '10'))
+qdrant_max_concurrency = int(os.getenv('QDRANT_MAX_CONCURRENCY', '16'))
+qdrant_query_timeout_seconds = float(os.getenv('QDRANT_QUERY_TIMEOUT_SECONDS', '5'))
+circuit_failure_threshold = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+circuit_reset_seconds = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+# Opt-in per-client token buckets, keyed on CLIENT_ID_HEADER when set and on the peer address otherwise.
+# Behind a proxy or NAT every client shares the peer address, so set CLIENT_ID_HEADER before enabling it.
+client_rate_limit_per_minute = float(os.getenv('CLIENT_RATE_LIMIT_PER_MINUTE', '0'))
+client_rate_limit_burst = int(os.getenv('CLIENT_RATE_LIMIT_BURST', '0')) or None
+client_id_header = os.getenv('CLIENT_ID_HEADER', '')
+
+secrets_helper = AWSSecretManagerHelper(
+    ttl_seconds=secrets_ttl_seconds,
+    refresh_ahead_seconds=secrets_refresh_ahead_seconds
+)
 helper_utils = HelperUtils()
-genai_helper = GoogleGenaiHelper(
-    project_id=google_cloud_project_id, 
-    location=google_cloud_location, 
-    credentials=google_cloud_service_credential_json
+rate_limiter = RateLimiter(
+    max_concurrency=genai_max_concurrency,
+    max_retries=genai_max_retries
 )
-qdrant_helper = QdrantHelper(
-    url=qdrant_url, 
-    api_key=qdrant_api_key
+result_cache = ResultCache(
+    version_stamp=CollectionVersionStamp(collection_name=qdrant_collection_name),
+    ttl_seconds=result_cache_ttl_seconds,
+    max_entries=result_cache_max_entries
 )
+context_assembler = ContextAssembler(
+    max_context_tokens=context_max_tokens,
+    duplicate_threshold=context_duplicate_threshold
+)
+upstream_limiters = {
+    name: UpstreamLimiter(
+        name=name,
+        max_concurrency=max_concurrency,
+        max_queue=upstream_max_queue,
+        call_timeout_seconds=call_timeout_seconds,
+        min_remaining_seconds=upstream_min_remaining_seconds,
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=circuit_failure_threshold,
+            reset_seconds=circuit_reset_seconds
+        )
+    )
+    for name, max_concurrency, call_timeout_seconds in (
+        ("vertex_llm", vertex_llm_max_concurrency, vertex_llm_timeout_seconds),
+        ("vertex_embeddings", vertex_embedding_max_concurrency, vertex_embedding_timeout_seconds),
+        ("qdrant", qdrant_max_concurrency, qdrant_query_timeout_seconds)
+    )
+}
+client_rate_limiter = ClientRateLimiter(
+    requests_per_minute=client_rate_limit_per_minute,
+    burst=client_rate_limit_burst
+) if client_rate_limit_per_minute > 0 else None
+
+# Probes and metrics scrapes are never rate limited
+UNLIMITED_PATHS = ("/health/live", "/health/ready", "/metrics")
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "ppa_http_requests",
+    "HTTP requests handled by the API server.",
+    ("method", "path", "status")
+)
+HTTP_REQUEST_DURATION_SECONDS = REGISTRY.histogram(
+    "ppa_http_request_duration_seconds",
+    "End-to-end latency of the API server's HTTP requests.",
+    ("method", "path")
+)
+CACHE_EVENTS = REGISTRY.counter(
+    "ppa_cache_events",
+    "Hit, miss and coalesced counts of the API server's caches.",
+    ("cache", "event")
+)
+VERTEX_AI_REQUESTS = REGISTRY.counter(
+    "ppa_vertex_ai_rate_limiter",
+    "Vertex AI rate limiter requests, retries, throttles, failures and wait seconds per model.",
+    ("model", "metric")
+)
+VERTEX_AI_REQUESTS_PER_MINUTE = REGISTRY.gauge(
+    "ppa_vertex_ai_requests_per_minute",
+    "Current adaptive request rate of the Vertex AI rate limiter per model.",
+    ("model",)
+)
+ADMISSION_EVENTS = REGISTRY.counter(
+    "ppa_admission_control_events",
+    "Admitted, rejected, timed out and failed requests per upstream and of the per-client rate limiter.",
+    ("scope", "event")
+)
+ADMISSION_CONTROL = REGISTRY.gauge(
+    "ppa_admission_control",
+    "In-flight and waiting requests, service time and circuit state per upstream, and clients tracked by the per-client rate limiter.",
+    ("scope", "metric")
+)
+
+# Point-in-time values of the admission control stats, every other stat is a running total
+ADMISSION_GAUGE_METRICS = ("in_flight", "waiting", "service_seconds", "circuit_open", "clients")
+
+# Built once per worker process by the lifespan hook and shared by all requests
+embedding_cache = None
+genai_helper = None
+qdrant_helper = None
+project_resolver = None
+content_store = None
+startup_task = None
+initialization_task = None
+retiring_tasks = set()
+
+def build_genai_helper(secret_result_json:dict) -> GoogleGenaiHelper:
+
+    return GoogleGenaiHelper(
+        project_id=google_cloud_project_id, 
+        location=google_cloud_location, 
+        credentials=json.loads(secret_result_json.get('GOOGLE_CLOUD_SERVICE_CREDENTIAL')),
+        embedding_cache=embedding_cache,
+        rate_limiter=rate_limiter
+    )
+
+def build_qdrant_helper(secret_result_json:dict):
+
+    if vector_store_backend == "local":
+        return LocalVectorStore(
+            snapshot_dir=local_vector_store_path,
+            ivf_probes=local_vector_store_ivf_probes
+        ).load(collection_name=qdrant_collection_name)
+
+    return QdrantHelper.from_env(url=qdrant_url, api_key=secret_result_json.get('QDRANT_CLOUD_API_KEY'))
+
+def initialize_clients():
+
+    global embedding_cache, genai_helper, qdrant_helper, project_resolver, content_store
+
+    secret_result_json = secrets_helper.get_secret(secret_name=aws_secret_name)
+
+    embedding_cache = EmbeddingCache(
+        db_path=embedding_cache_path,
+        max_entries=embedding_cache_max_entries,
+        ttl_seconds=embedding_cache_ttl_seconds,
+        max_disk_entries=embedding_cache_max_disk_entries
+    )
+    genai_helper = build_genai_helper(secret_result_json=secret_result_json)
+    qdrant_helper = build_qdrant_helper(secret_result_json=secret_result_json)
+
+    resolver = ProjectResolver(snapshot_path=project_resolver_snapshot_path)
+    if not resolver.load_snapshot():
+        resolver.build_from_qdrant(
+            qdrant_helper=qdrant_helper,
+            collection_name=qdrant_collection_name
+        )
+    project_resolver = resolver
+
+    if content_store_path:
+        content_store = ContentStore(store_dir=content_store_path)
+
+    logger.info("API clients initialized", vector_store_backend=vector_store_backend)
+
+async def initialize_clients_with_retry():
+
+    global startup_task
+
+    attempt = 0
+
+    while True:
+
+        startup_task = asyncio.create_task(asyncio.to_thread(initialize_clients))
+
+        try:
+            await asyncio.shield(startup_task)
+            return
+        except Exception as ex:
+            backoff = min(startup_retry_max_seconds, startup_retry_base_seconds * (2 ** attempt))
+            logger.error("API client initialization failed, retrying", error=str(ex), attempt=attempt + 1, backoff_seconds=backoff)
+
+        await asyncio.sleep(backoff)
+        attempt += 1
+
+async def retire_clients(*helpers):
+
+    # Requests that started before the rotation keep using the old clients until they finish
+    try:
+        await asyncio.sleep(secrets_rotation_grace_seconds)
+    finally:
+        for helper in helpers:
+            try:
+                await helper.close_async()
+            except Exception as ex:
+                logger.warning("Closing a rotated client failed", client=type(helper).__name__, error=str(ex))
+
+async def refresh_secrets():
+
+    global genai_helper, qdrant_helper
+
+    await initialization_task
+
+    current_secret = secrets_helper.get_secret(secret_name=aws_secret_name)
+
+    while True:
+
+        await asyncio.sleep(max(60.0, secrets_ttl_seconds - secrets_refresh_ahead_seconds))
+
+        try:
+            refreshed_secret = await asyncio.to_thread(secrets_helper.fetch_secret, secret_name=aws_secret_name)
+        except Exception as ex:
+            logger.warning("Secret refresh failed, keeping the current clients", error=str(ex))
+            continue
+
+        if refreshed_secret == current_secret:
+            continue
+
+        # Rotated credentials get fresh clients, in-flight requests finish on the old ones
+        logger.info("Secrets rotated, rebuilding the Vertex AI and Qdrant clients")
+
+        retired_helpers = [genai_helper]
+
+        genai_helper = await asyncio.to_thread(build_genai_helper, secret_result_json=refreshed_secret)
+        if vector_store_backend != "local":
+            retired_helpers.append(qdrant_helper)
+            qdrant_helper = await asyncio.to_thread(build_qdrant_helper, secret_result_json=refreshed_secret)
+
+        retiring_task = asyncio.create_task(retire_clients(*retired_helpers))
+        retiring_tasks.add(retiring_task)
+        retiring_task.add_done_callback(retiring_tasks.discard)
+
+        current_secret = refreshed_secret
+
+async def close_clients():
+
+    if genai_helper is not None:
+        await genai_helper.close_async()
+
+    if qdrant_helper is not None:
+        await qdrant_helper.close_async()
+
+    if embedding_cache is not None:
+        embedding_cache.close()
+
+    if content_store is not None:
+        content_store.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    global initialization_task
+
+    # Initialization runs in the background, so the liveness probe answers while secrets and snapshots load
+    initialization_task = asyncio.create_task(initialize_clients_with_retry())
+    refresh_task = asyncio.create_task(refresh_secrets())
+
+    try:
+        yield
+    finally:
+        refresh_task.cancel()
+        initialization_task.cancel()
+        if startup_task is not None:
+            await asyncio.wait({startup_task})
+
+        # Rotated clients still in their grace period are closed right away
+        for retiring_task in list(retiring_tasks):
+            retiring_task.cancel()
+        await asyncio.gather(*retiring_tasks, return_exceptions=True)
+
+        await close_clients()
+
+async def wait_until_ready():
+
+    if startup_task is None:
+        raise HTTPException(status_code=503, detail="Service is starting up")
+
+    try:
+        await asyncio.shield(startup_task)
+    except Exception as e:
+        # The failed attempt is retried in the background, callers may come back after the backoff
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {e}", headers={"Retry-After": str(int(startup_retry_base_seconds) or 1)})
 
 # Request model
 class QueryRequest(BaseModel):
     query: str
     top_k: int
 
+class BatchQueryRequest(BaseModel):
+    queries: list[str] = Field(..., min_length=1, max_length=batch_query_max_queries)
+    top_k: int
+
 # Response model (optional, but good practice)
 class QueryResponse(BaseModel):
     results: Any
     message: str
 
+async def search_ppa_knowledge_base(query_vector:list, top_k:int, project_code_filter = None, project_name_filter:str = None):
+
+    # Loading a newer snapshot maps and indexes it, so the check runs in a worker thread
+    if vector_store_backend == "local":
+        await asyncio.to_thread(qdrant_helper.refresh_if_stale, collection_name=qdrant_collection_name)
+
+    if qdrant_coarse_vector_size:
+        return await qdrant_helper.query_vector_store_two_stage_async(
+            collection_name=qdrant_collection_name,
+            query_vector=query_vector,
+            coarse_vector_size=qdrant_coarse_vector_size,
+            project_code_filter=project_code_filter,
+            project_name_filter=project_name_filter,
+            top_k=top_k,
+            candidate_multiplier=qdrant_coarse_candidate_multiplier,
+            hnsw_ef=qdrant_search_hnsw_ef,
+            rescore=qdrant_search_rescore,
+            oversampling=qdrant_search_oversampling,
+            with_payload=CONTEXT_PAYLOAD_FIELDS
+        )
+
+    return await qdrant_helper.query_vector_store_with_filter_async(
+        collection_name=qdrant_collection_name,
+        query_vector=query_vector,
+        project_code_filter=project_code_filter,
+        project_name_filter=project_name_filter,
+        top_k=top_k,
+        hnsw_ef=qdrant_search_hnsw_ef,
+        rescore=qdrant_search_rescore,
+        oversampling=qdrant_search_oversampling,
+        with_payload=CONTEXT_PAYLOAD_FIELDS
+    )
+
+def project_filters(project_match:dict) -> dict:
+
+    # An explicit project code narrows the search to one site while a name covers all of its sites
+    if project_match is None:
+        return {}
+
+    return {
+        "project_code_filter": project_match['project_code'] if project_match['matched_on'] == "code" else None,
+        "project_name_filter": project_match['project_name'] if project_match['matched_on'] == "name" else None
+    }
+
+async def resolve_project(user_query:str, pipeline:str = "query") -> tuple:
+
+    # Resolve the project from the locally indexed project names and codes,
+    # and only fall back to the LLM extraction task when nothing matches
+    with stage_timer(pipeline, "project_resolution", logger=logger):
+        metadata_details = project_resolver.resolve(user_query=user_query)
+    project_match = metadata_details
+
+    if metadata_details is None:
+        with stage_timer(pipeline, "metadata_extraction", logger=logger):
+            async with upstream_limiters["vertex_llm"].slot():
+                metadata_details = await genai_helper.extract_metadata_details_from_user_query_task_async(
+                    user_query=user_query
+                )
+        project_match = project_resolver.canonicalize(metadata_details=metadata_details)
+
+    return metadata_details, project_match
+
+async def search_ppa_knowledge_base_batch(query_vectors:list, top_k:int, project_matches:list) -> list:
+
+    # Loading a newer snapshot maps and indexes it, so the check runs in a worker thread
+    if vector_store_backend == "local":
+        await asyncio.to_thread(qdrant_helper.refresh_if_stale, collection_name=qdrant_collection_name)
+
+    search_options = {
+        "collection_name": qdrant_collection_name,
+        "top_k": top_k,
+        "coarse_vector_size": qdrant_coarse_vector_size or None,
+        "candidate_multiplier": qdrant_coarse_candidate_multiplier,
+        "hnsw_ef": qdrant_search_hnsw_ef,
+        "rescore": qdrant_search_rescore,
+        "oversampling": qdrant_search_oversampling,
+        "with_payload": CONTEXT_PAYLOAD_FIELDS
+    }
+
+    document_results = await qdrant_helper.query_vector_store_batch_async(
+        query_vectors=query_vectors,
+        project_filters=[project_filters(project_match) for project_match in project_matches],
+        **search_options
+    )
+
+    # Project-filtered queries without hits are retried unfiltered in a second batch
+    retry_indices = [idx for idx, (project_match, points) in enumerate(zip(project_matches, document_results)) if project_match is not None and not points]
+
+    if retry_indices:
+
+        retry_results = await qdrant_helper.query_vector_store_batch_async(
+            query_vectors=[query_vectors[idx] for idx in retry_indices],
+            **search_options
+        )
+
+        for idx, points in zip(retry_indices, retry_results):
+            document_results[idx] = points
+
+    return document_results
+
+async def run_ppa_knowledge_base_query(user_query:str, top_k:int) -> dict:
+
+    project_resolver.refresh_if_stale()
+    metadata_details, project_match = await resolve_project(user_query=user_query)
+
+    # Generate a vector embedding for the user's query
+    with stage_timer("query", "embedding", logger=logger):
+        async with upstream_limiters["vertex_embeddings"].slot():
+            vector_embeddings = await genai_helper.generate_embeddings_async(
+                model="gemini-embedding-001", 
+                contents=[user_query],
+                title=metadata_details['project_name']
+            )
+
+    assert len(vector_embeddings.embeddings) > 0, "No vector embeddings returned from Google Vertex AI."
+
+    embeddings = list(map(helper_utils.get_embedding_values,  vector_embeddings.embeddings))
+    _, embed_val = embeddings[0]
+
+    document_results = []
+
+    with stage_timer("query", "vector_search", logger=logger):
+
+        async with upstream_limiters["qdrant"].slot():
+
+            # Prefilter on the project's keyword index when the project is known
+            if project_match is not None:
+                document_results = await search_ppa_knowledge_base(
+                    query_vector=embed_val,
+                    top_k=top_k,
+                    **project_filters(project_match)
+                )
+
+            # Query the whole Qdrant PPA knowledge base when the project is unknown or has no hits
+            if not document_results:
+                document_results = await search_ppa_knowledge_base(
+                    query_vector=embed_val,
+                    top_k=top_k
+                )
+
+    # Page text lives in the content store, only the final top-k is read back
+    if content_store is not None:
+        with stage_timer("query", "content_hydration", logger=logger):
+            await asyncio.to_thread(content_store.hydrate, points=document_results)
+
+    # Merge adjacent pages, drop near-duplicates and pack the hits into the context token budget
+    with stage_timer("query", "context_assembly", logger=logger):
+        retrieved_docs = context_assembler.assemble(points=document_results)
+
+    results = {
+        "query": user_query,
+        "top_k": top_k,
+        "documents": retrieved_docs
+    }
+
+    return results
+
+async def run_ppa_knowledge_base_batch_query(user_queries:list, top_k:int) -> list:
+
+    project_resolver.refresh_if_stale()
+
+    # Metadata extraction for unresolved queries runs concurrently
+    resolved_projects = await asyncio.gather(*[resolve_project(user_query=user_query, pipeline="batch_query") for user_query in user_queries])
+
+    with stage_timer("batch_query", "embedding", logger=logger, queries=len(user_queries)):
+        async with upstream_limiters["vertex_embeddings"].slot():
+            embeddings = await genai_helper.generate_embeddings_batched_async(
+                model="gemini-embedding-001",
+                contents=user_queries,
+                titles=[metadata_details['project_name'] for metadata_details, _ in resolved_projects]
+            )
+
+    assert all(embedding is not None for embedding in embeddings), "No vector embeddings returned from Google Vertex AI."
+
+    with stage_timer("batch_query", "vector_search", logger=logger, queries=len(user_queries)):
+        async with upstream_limiters["qdrant"].slot():
+            document_results = await search_ppa_knowledge_base_batch(
+                query_vectors=[embedding.values for embedding in embeddings],
+                top_k=top_k,
+                project_matches=[project_match for _, project_match in resolved_projects]
+            )
+
+    # One bulk read hydrates the hits of every query in the batch
+    if content_store is not None:
+        with stage_timer("batch_query", "content_hydration", logger=logger, queries=len(user_queries)):
+            await asyncio.to_thread(content_store.hydrate, points=[point for points in document_results for point in points])
+
+    with stage_timer("batch_query", "context_assembly", logger=logger, queries=len(user_queries)):
+        return [
+            {
+                "query": user_query,
+                "top_k": top_k,
+                "documents": context_assembler.assemble(points=points)
+            }
+            for user_query, points in zip(user_queries, document_results)
+        ]
+
 # Initialize FastAPI app
-app = FastAPI(title="PPA Knowledge Base API", version="1.0.0")
+app = FastAPI(title="PPA Knowledge Base API", version="1.0.0", lifespan=lifespan)
+
+def overloaded_response(ex:Overloaded) -> JSONResponse:
+
+    return JSONResponse(
+        status_code=ex.status_code,
+        content={"detail": str(ex), "reason": ex.reason, "upstream": ex.upstream},
+        headers={"Retry-After": str(ex.retry_after)}
+    )
+
+def client_id(request: Request) -> str:
+
+    if client_id_header and request.headers.get(client_id_header):
+        return request.headers[client_id_header].split(",")[0].strip()
+
+    return request.client.host if request.client is not None else "unknown"
+
+@app.exception_handler(Overloaded)
+async def handle_overloaded(request: Request, ex: Overloaded) -> JSONResponse:
+    return overloaded_response(ex)
+
+@app.middleware("http")
+async def trace_and_time_requests(request: Request, call_next):
+
+    # Callers may pass their own trace ID, it is returned on the response and attached to every log line
+    trace_id_var.set(new_trace_id(request.headers.get("X-Trace-Id")))
+    request_deadline_var.set(time.monotonic() + request_deadline_seconds)
+    started_at = time.perf_counter()
+    status_code = 500
+
+    try:
+
+        try:
+            if client_rate_limiter is not None and request.url.path not in UNLIMITED_PATHS:
+                client_rate_limiter.check(client_id=client_id(request))
+        except Overloaded as ex:
+            logger.warning("Client rate limit exceeded", client_id=client_id(request), path=request.url.path)
+            response = overloaded_response(ex)
+        else:
+            response = await call_next(request)
+
+        status_code = response.status_code
+        response.headers["X-Trace-Id"] = trace_id_var.get()
+        return response
+
+    finally:
+
+        duration = time.perf_counter() - started_at
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status_code)
+        HTTP_REQUEST_DURATION_SECONDS.observe(duration, method=request.method, path=path)
+
+        logger.debug("Request completed", method=request.method, path=path, status=status_code, duration_ms=round(duration * 1000, 2))
 
 @app.post("/query_ppa_knowledge_base", response_model=QueryResponse)
 async def query_ppa_knowledge_base(request: QueryRequest) -> QueryResponse:
     """
     Query the PPA knowledge base with the provided query and return top_k results.
     """
+    await wait_until_ready()
+
     try:
        
         user_query = request.query
         top_k = request.top_k
 
-        print(f"\nReceived new user query:\n{user_query}\n")
+        logger.info("Received user query", query=user_query, top_k=top_k)
 
-        # Extract metadata details from the user's query
-        metadata_details = genai_helper.extract_metadata_details_from_user_query_task(
-            user_query=user_query
+        # Identical queries share cached results, and concurrent ones share a single upstream computation
+        cached_results = await result_cache.get_or_compute(
+            query=user_query,
+            top_k=top_k,
+            compute=lambda: run_ppa_knowledge_base_query(user_query=user_query, top_k=top_k)
         )
 
-        # Generate a vector embedding for the user's query
-        vector_embeddings = genai_helper.generate_embeddings(
-            model="gemini-embedding-001", 
-            contents=[user_query],
-            title=metadata_details['project_name']
+        results = {**cached_results, "query": user_query}
+        
+        return QueryResponse(
+            results=results,
+            message="Query processed successfully"
         )
 
-        assert len(vector_embeddings.embeddings) > 0, "No vector embeddings returned from Google Vertex AI."
+    except Overloaded:
+        raise
 
-        embeddings = list(map(helper_utils.get_embedding_values,  vector_embeddings.embeddings))
-        _, embed_val = embeddings[0]
+    except Exception as e:
+        error_message = e.with_traceback(e.__traceback__)
+        raise HTTPException(status_code=500, detail=f"\nInternal server error:\n{error_message}\n")
 
-        # Query the Qdrant PPA knowledge base with the user's query
-        document_results = qdrant_helper.query_vector_store(
-            collection_name="ppa_knowledge_base", 
-            query_vector=embed_val,
-            top_k=top_k
-        )
+@app.post("/query_ppa_knowledge_base/batch", response_model=QueryResponse)
+async def query_ppa_knowledge_base_batch(request: BatchQueryRequest) -> QueryResponse:
+    """
+    Query the PPA knowledge base with a list of queries and return the top_k results of each, in input order.
+    """
+    await wait_until_ready()
 
-        # Format the retrieved document context
-        retrieved_docs = "\n".join(
-        [f"""
-        Document Result Number: {idx + 1}
-        Project Code: {doc.payload['metadata']['project_code']}
-        Project Name: {doc.payload['metadata']['project_name']}
-        Filename: {doc.payload['metadata']['filename']}
+    try:
 
-        Section Summary: {doc.payload['metadata']['summary']}
+        logger.info("Received batch of user queries", queries=len(request.queries), top_k=request.top_k)
 
-        Section Content: \n{doc.payload['content']}\n
-        """ 
-        for idx, doc in enumerate(document_results) ]
-        ) 
-        
-        results = {
-            "query": user_query,
-            "top_k": top_k,
-            "documents": retrieved_docs
+        # Only cache misses are embedded and searched, and repeated queries only once
+        cache_lookups = {
+            user_query: result_cache.lookup(query=user_query, top_k=request.top_k)
+            for user_query in dict.fromkeys(request.queries)
         }
-        
+        missing_queries = [user_query for user_query, (_, cached_results) in cache_lookups.items() if cached_results is None]
+
+        if missing_queries:
+
+            computed_results = await run_ppa_knowledge_base_batch_query(user_queries=missing_queries, top_k=request.top_k)
+
+            for user_query, query_results in zip(missing_queries, computed_results):
+                cache_key, _ = cache_lookups[user_query]
+                result_cache.put(cache_key=cache_key, result=query_results)
+                cache_lookups[user_query] = (cache_key, query_results)
+
+        results = [{**cache_lookups[user_query][1], "query": user_query} for user_query in request.queries]
+
         return QueryResponse(
             results=results,
-            message="Query processed successfully"
+            message="Batch query processed successfully"
         )
-    
+
+    except Overloaded:
+        raise
+
     except Exception as e:
         error_message = e.with_traceback(e.__traceback__)
         raise HTTPException(status_code=500, detail=f"\nInternal server error:\n{error_message}\n")
 
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    return {"message": "PPA Knowledge Base API is running"}
+def server_sent_event(event:str, data:dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def generate_answer(user_query:str, retrieved_documents:list, text_chunks:asyncio.Queue):
+
+    # Tokens are buffered in the queue, so the LLM slot is released when generation ends rather than when a slow client has read them
+    try:
+        with stage_timer("answer", "generation", logger=logger):
+            async with upstream_limiters["vertex_llm"].slot(bounded=False):
+
+                generation_started_at = time.perf_counter()
+                first_token = True
+
+                text_stream = genai_helper.ppa_query_task_stream_async(
+                    user_query=user_query,
+                    retrieved_documents=retrieved_documents
+                )
+
+                async with aclosing(text_stream):
+                    async for text_chunk in text_stream:
+
+                        if first_token:
+                            STAGE_DURATION_SECONDS.observe(time.perf_counter() - generation_started_at, pipeline="answer", stage="first_token")
+                            first_token = False
+
+                        text_chunks.put_nowait(text_chunk)
+    finally:
+        text_chunks.put_nowait(None)
+
+async def stream_ppa_answer(user_query:str, top_k:int):
+
+    generation = None
+
+    try:
+
+        cached_results = await result_cache.get_or_compute(
+            query=user_query,
+            top_k=top_k,
+            compute=lambda: run_ppa_knowledge_base_query(user_query=user_query, top_k=top_k)
+        )
+
+        yield server_sent_event("retrieval", {"query": user_query, "top_k": top_k, "trace_id": trace_id_var.get()})
+
+        text_chunks = asyncio.Queue()
+        generation = asyncio.create_task(generate_answer(user_query=user_query, retrieved_documents=cached_results["documents"], text_chunks=text_chunks))
+
+        while (text_chunk := await text_chunks.get()) is not None:
+            yield server_sent_event("token", {"text": text_chunk})
+
+        # Surfaces the error of a failed generation
+        await generation
+
+        yield server_sent_event("done", {"message": "Answer generated successfully"})
+
+    except Overloaded as e:
+        yield server_sent_event("error", {"detail": str(e), "reason": e.reason, "upstream": e.upstream, "retry_after": e.retry_after})
+
+    except Exception as e:
+        # The response has already started, so errors are reported in-band
+        logger.exception("Streamed answer failed", query=user_query)
+        yield server_sent_event("error", {"detail": f"Internal server error: {e}"})
+
+    finally:
+        # A client that disconnects mid-stream stops the generation
+        if generation is not None and not generation.done():
+            generation.cancel()
+
+@app.post("/query_ppa_knowledge_base/answer")
+async def answer_ppa_query(request: QueryRequest) -> StreamingResponse:
+    """
+    Retrieve the top_k documents for the query and stream the LLM's answer back as server-sent events.
+    """
+    await wait_until_ready()
+
+    # Degraded or saturated upstreams are rejected before the stream starts, while a status code can still be sent
+    for upstream_limiter in upstream_limiters.values():
+        upstream_limiter.check()
+
+    logger.info("Received user query for a streamed answer", query=request.query, top_k=request.top_k)
+
+    return StreamingResponse(
+        stream_ppa_answer(user_query=request.query, top_k=request.top_k),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+
+    for event, value in result_cache.stats().items():
+        if event in ("hits", "misses", "coalesced"):
+            CACHE_EVENTS.set_total(value, cache="result", event=event)
+
+    if embedding_cache is not None:
+        for event, value in embedding_cache.stats().items():
+            if event in ("memory_hits", "disk_hits", "misses"):
+                CACHE_EVENTS.set_total(value, cache="embedding", event=event)
+
+    for model, model_metrics in rate_limiter.stats().items():
+        for metric, value in model_metrics.items():
+            if metric == "current_requests_per_minute":
+                VERTEX_AI_REQUESTS_PER_MINUTE.set(value, model=model)
+            else:
+                VERTEX_AI_REQUESTS.set_total(value, model=model, metric=metric)
+
+    admission_stats = {name: upstream_limiter.stats() for name, upstream_limiter in upstream_limiters.items()}
+    if client_rate_limiter is not None:
+        admission_stats["client_rate_limit"] = client_rate_limiter.stats()
+
+    for scope, scope_metrics in admission_stats.items():
+        for metric, value in scope_metrics.items():
+            if metric in ADMISSION_GAUGE_METRICS:
+                ADMISSION_CONTROL.set(value, scope=scope, metric=metric)
+            else:
+                ADMISSION_EVENTS.set_total(value, scope=scope, event=metric)
+
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe, the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe, the API clients are initialized and queries can be served"""
+
+    if startup_task is None or not startup_task.done():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    if startup_task.cancelled() or startup_task.exception() is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": str(startup_task.exception()) if not startup_task.cancelled() else "cancelled"})
+
+    return {
+        "status": "ready",
+        "vector_store_backend": vector_store_backend,
+        "result_cache": result_cache.stats()
+    }
 
 if __name__ == "__main__":
     